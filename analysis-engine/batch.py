@@ -0,0 +1,292 @@
+"""Batch analysis of many files at once, linking accounts and rings across them."""
+import glob, hashlib, os, time
+from concurrent.futures import as_completed
+import numpy as np
+import pandas as pd
+
+from cache import CACHE
+from ingest import read_transactions, _concat, IngestError
+from output_builder import build_output
+from pipeline import STAGES, CONCURRENCY, analyze_file, output_key, run_stages, stage_keys
+from profiling import span
+from ring_consolidation import _find
+from subgraph import register
+from workers import worker_pool
+
+BATCH_ROOT = os.environ.get('BATCH_ROOT')                     # directory batches only read below this
+MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 256))
+HASH_CHUNK = 1 << 20
+
+
+class BatchError(ValueError):
+    """A batch that cannot run as asked: bad directory, pattern or file count."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def directory_files(directory, pattern='*.csv'):
+    """(path, name) of the files matching ``pattern`` in ``directory``, which must lie under ``BATCH_ROOT``."""
+    if not BATCH_ROOT:
+        raise BatchError('Directory batches are disabled; set BATCH_ROOT', 403)
+    if os.sep in pattern or (os.altsep and os.altsep in pattern):
+        raise BatchError(f'pattern must match file names, not paths: {pattern!r}')
+    root = os.path.realpath(BATCH_ROOT)
+    path = os.path.realpath(os.path.join(root, directory))
+    if os.path.commonpath([root, path]) != root:
+        raise BatchError(f'{directory!r} is outside BATCH_ROOT', 403)
+    if not os.path.isdir(path):
+        raise BatchError(f'No such directory: {directory!r}', 404)
+    files = []
+    for f in sorted(glob.glob(os.path.join(glob.escape(path), pattern))):
+        real = os.path.realpath(f)
+        if os.path.isfile(real) and os.path.commonpath([root, real]) == root:
+            files.append((real, os.path.basename(f)))
+    return files
+
+
+def _digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ── Worker tasks: run in the shared pool, one file each ──────────
+def _analyze_one(path, filename, digest, concurrency):
+    """(output, cacheable stage results, digest) of one file, or an ``error`` dict.
+
+    The cache is only read here: a forked worker has no cache writer thread,
+    so the parent stores the results (see ``_keep``).
+    """
+    digest = digest or _digest(path)
+    try:
+        out, r = analyze_file(path, filename, digest, concurrency, store=False)
+    except IngestError as e:
+        return {'error': e.to_dict()}
+    stages = None if r is None else {s.name: r[s.name] for s in STAGES if s.cached}
+    return {'out': out, 'digest': digest, 'stages': stages}
+
+
+def _parse_one(path, filename, digest):
+    """(transactions, digest) of one file, or an ``error`` dict."""
+    digest = digest or _digest(path)
+    try:
+        return {'df': read_transactions(path, filename), 'digest': digest}
+    except IngestError as e:
+        return {'error': e.to_dict()}
+
+
+def _run(task, files, *args):
+    """``task(path, name, digest, *args)`` for every file on the worker pool; results in input order."""
+    pool = worker_pool()
+    futures = {pool.submit(task, path, name, digest, *args): i for i, (path, name, digest) in enumerate(files)}
+    results = [None] * len(files)
+    try:
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    finally:
+        for fut in futures:
+            fut.cancel()
+    return results
+
+
+def analyze_batch(files, merge=False, concurrency=CONCURRENCY):
+    """Analyze ``files`` — (path, name, sha256 hex digest or None) — as one batch.
+
+    Returns the per-file results, the ``combined`` cross-file view and a
+    summary; in merge mode also the merged ``analysis``. Every analysis is
+    registered for paging and subgraph queries.
+    """
+    if not files:
+        raise BatchError('No files in the batch')
+    if len(files) > MAX_FILES:
+        raise BatchError(f'{len(files)} files; at most {MAX_FILES} per batch')
+    start = time.time()
+    with span('batch', items=len(files)):
+        result = (_merged if merge else _separate)(files, concurrency)
+    failed = sum('error' in f for f in result['files'])
+    result['summary'] = {**result['summary'], 'files': len(files), 'failed_files': failed,
+                         'cross_file_accounts': len(result['combined']['accounts']),
+                         'cross_file_rings': len(result['combined']['rings']),
+                         'processing_time_seconds': round(time.time() - start, 2)}
+    return result
+
+
+def _batch_id(mode, digests):
+    return hashlib.sha256('\n'.join([mode, *sorted(digests)]).encode()).hexdigest()
+
+
+# ── Separate: one analysis per file, linked afterwards ───────────
+def _keep(res):
+    """Store a worker's results as ``analyze_file`` would have; returns the file's graph, or None."""
+    keys = stage_keys(STAGES, res['digest']) if CACHE is not None else None
+    if res['stages'] is None:   # cached output: the graph may still be cached too
+        return CACHE.get(keys['graph']) if keys is not None else None
+    if keys is not None:
+        for name, value in res['stages'].items():
+            CACHE.put(keys[name], value)
+        CACHE.put(output_key(keys), res['out'])
+    return res['stages']['graph']
+
+
+def _separate(files, concurrency):
+    results = _run(_analyze_one, files, concurrency)
+    per_file, ok = [], []
+    for (_, name, _), res in zip(files, results):
+        if 'error' in res:
+            per_file.append({'file': name, 'error': res['error']})
+            continue
+        G = _keep(res)
+        out = register(res['out'], {'graph': G}, res['digest'])
+        if G is None:   # output cached, graph evicted: only the flagged accounts are known
+            transactions = None
+            accounts = np.array([a['account_id'] for a in out['suspicious_accounts']], dtype=object)
+        else:
+            transactions, accounts = int(G.tx_src.size), G.accounts
+        per_file.append({'file': name, 'transactions': transactions, **out})
+        ok.append((name, out, accounts))
+    return {'batch_id': _batch_id('separate', [r['digest'] for r in results if 'error' not in r])[:16],
+            'mode': 'separate', 'files': per_file,
+            'combined': {'accounts': _shared_accounts(ok), 'rings': _linked_rings(ok)},
+            'summary': {'transactions': sum(f.get('transactions') or 0 for f in per_file)}}
+
+
+def _shared_accounts(ok):
+    """Accounts flagged in some file and present in at least two."""
+    flagged = {}
+    for name, out, _ in ok:
+        for a in out['suspicious_accounts']:
+            flagged.setdefault(a['account_id'], []).append(
+                {'file': name, 'suspicion_score': a['suspicion_score'], 'ring_id': a['ring_id'],
+                 'detected_patterns': a['detected_patterns']})
+    if len(ok) < 2 or not flagged:
+        return []
+    names = pd.Index(list(flagged))
+    present = np.column_stack([names.isin(accounts) for _, _, accounts in ok])
+    rows = []
+    for i in np.flatnonzero(present.sum(axis=1) >= 2).tolist():
+        hits = flagged[names[i]]
+        rows.append({'account_id': names[i], 'files': [ok[j][0] for j in np.flatnonzero(present[i]).tolist()],
+                     'max_score': max(h['suspicion_score'] for h in hits), 'flagged_in': hits})
+    rows.sort(key=lambda a: (-len(a['files']), -a['max_score'], a['account_id']))
+    return rows
+
+
+def _linked_rings(ok):
+    """Rings of different files joined (union-find) through shared member accounts."""
+    rings = [(f, ring) for f, (_, out, _) in enumerate(ok) for ring in out['fraud_rings']]
+    parent, owner = list(range(len(rings))), {}
+    for i, (_, ring) in enumerate(rings):
+        for acc in ring['member_accounts']:
+            j = owner.setdefault(acc, i)
+            if j != i:
+                parent[_find(parent, i)] = _find(parent, j)
+    groups = {}
+    for i in range(len(rings)):
+        groups.setdefault(_find(parent, i), []).append(i)
+    links = []
+    for members in groups.values():
+        files = sorted({rings[i][0] for i in members})
+        if len(files) < 2:
+            continue
+        seen = {}
+        for i in members:
+            for acc in rings[i][1]['member_accounts']:
+                seen.setdefault(acc, set()).add(rings[i][0])
+        links.append({
+            'files': [ok[f][0] for f in files],
+            'rings': [{'file': ok[rings[i][0]][0], 'ring_id': rings[i][1]['ring_id'],
+                       'risk_score': rings[i][1]['risk_score']} for i in members],
+            'member_accounts': sorted(seen),
+            'shared_accounts': sorted(acc for acc, fs in seen.items() if len(fs) > 1),
+            'total_flow': round(sum(rings[i][1]['total_flow'] for i in members), 2),
+        })
+    links.sort(key=lambda l: (-len(l['files']), -len(l['member_accounts']), l['member_accounts']))
+    return [{'link_id': f'LINK_{n:03d}', **l} for n, l in enumerate(links, 1)]
+
+
+# ── Merged: one deduplicated graph over every file ───────────────
+def _merged(files, concurrency):
+    start = time.time()
+    results = _run(_parse_one, files)
+    per_file, frames, names, digests = [], [], [], []
+    for (_, name, _), res in zip(files, results):
+        if 'error' in res:
+            per_file.append({'file': name, 'error': res['error']})
+            continue
+        per_file.append({'file': name, 'transactions': len(res['df'])})
+        frames.append(res['df'])
+        names.append(name)
+        digests.append(res['digest'])
+    batch_id = _batch_id('merged', digests)
+
+    with span('batch_merge') as sp:
+        df = _concat(frames)
+        source = np.repeat(np.arange(len(frames)), [len(f) for f in frames])
+        dup = df['transaction_id'].duplicated().to_numpy()
+        dropped = np.bincount(source[dup], minlength=len(frames))
+        if dup.any():
+            df, source = df[~dup].reset_index(drop=True), source[~dup]
+        sp.items = len(df)
+    ok = [f for f in per_file if 'error' not in f]
+    for f, n in zip(ok, dropped.tolist()):
+        f['duplicates'] = n
+
+    if len(df):
+        r = run_stages(STAGES, {'df': df}, concurrency)
+        out = build_output(r['lifecycle'], r['rings']['rings'], r['df'], time.time() - start,
+                           total_accounts=r['graph'].number_of_nodes())
+    else:
+        r, out = None, build_output({}, [], None, time.time() - start, total_accounts=0)
+    out = register(out, r, batch_id)
+
+    accounts, rings = _provenance(df, source, names, out)
+    counts = {}
+    for files_of in accounts.values():
+        for f in files_of:
+            counts[f] = counts.get(f, 0) + 1
+    for f in ok:
+        f['flagged_accounts'] = counts.get(f['file'], 0)
+    return {
+        'batch_id': batch_id[:16], 'mode': 'merged', 'files': per_file, 'analysis': out,
+        'combined': {
+            'accounts': [{'account_id': a['account_id'], 'files': accounts[a['account_id']],
+                          'suspicion_score': a['suspicion_score'], 'ring_id': a['ring_id']}
+                         for a in out['suspicious_accounts'] if len(accounts[a['account_id']]) > 1],
+            'rings': [{'ring_id': ring['ring_id'], 'files': rings[ring['ring_id']],
+                       'member_accounts': ring['member_accounts'], 'risk_score': ring['risk_score']}
+                      for ring in out['fraud_rings'] if len(rings[ring['ring_id']]) > 1],
+        },
+        'summary': {'transactions': len(df), 'duplicate_transactions': int(dropped.sum())},
+    }
+
+
+def _provenance(df, source, names, out):
+    """Source files of each flagged account's transactions, and of each ring's internal transfers."""
+    flagged = [a['account_id'] for a in out['suspicious_accounts']]
+    members = {acc for ring in out['fraud_rings'] for acc in ring['member_accounts']}
+    if not flagged and not members:
+        return {}, {}
+    sender, receiver = df['sender_id'].astype(str), df['receiver_id'].astype(str)
+    s_in, r_in = sender.isin(flagged).to_numpy(), receiver.isin(flagged).to_numpy()
+    pairs = pd.DataFrame({'account': np.concatenate((sender[s_in].to_numpy(), receiver[r_in].to_numpy())),
+                          'file': np.concatenate((source[s_in], source[r_in]))}).drop_duplicates()
+    accounts = {a: [] for a in flagged}
+    for acc, f in pairs.sort_values('file', kind='stable').itertuples(index=False):
+        accounts[acc].append(names[f])
+
+    # Account → ring pairs (a consolidated hub can sit in several rings), joined on both ends of each
+    # transfer: one pass over the transactions instead of one per ring
+    membership = pd.DataFrame([(acc, k) for k, ring in enumerate(out['fraud_rings'])
+                               for acc in ring['member_accounts']], columns=['account', 'ring']).drop_duplicates()
+    both = (sender.isin(members) & receiver.isin(members)).to_numpy()
+    transfers = pd.DataFrame({'sender': sender[both].to_numpy(), 'receiver': receiver[both].to_numpy(),
+                              'file': source[both]})
+    inside = (transfers.merge(membership.rename(columns={'account': 'sender'}), on='sender')
+              .merge(membership.rename(columns={'account': 'receiver'}), on=['receiver', 'ring']))
+    files = inside[['ring', 'file']].drop_duplicates().sort_values(['ring', 'file']).groupby('ring')['file'].agg(list)
+    rings = {ring['ring_id']: [names[f] for f in files.get(k, [])] for k, ring in enumerate(out['fraud_rings'])}
+    return accounts, rings
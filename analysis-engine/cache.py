@@ -0,0 +1,142 @@
+import hashlib, logging, os, pickle, stat, tempfile, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+ENABLED = os.environ.get('RESULT_CACHE', '1') != '0'
+MEMORY_BYTES = int(os.environ.get('RESULT_CACHE_MEMORY_MB', 512)) << 20
+DISK_BYTES = int(os.environ.get('RESULT_CACHE_DISK_MB', 2048)) << 20
+UID = os.getuid() if hasattr(os, 'getuid') else None   # None: no POSIX ownership to check
+# Per-user by default: the shared temp directory is world-writable, and the disk tier unpickles what it finds
+DIRECTORY = os.environ.get('RESULT_CACHE_DIR', os.path.join(
+    tempfile.gettempdir(), 'mulenet-cache' if UID is None else f'mulenet-cache-{UID}'))
+
+log = logging.getLogger('mulenet')
+
+
+def _owned(st, loose):
+    """Whether a stat result is ours and grants none of the ``loose`` permission bits to others."""
+    return UID is None or (st.st_uid == UID and not st.st_mode & loose)
+
+
+@lru_cache(maxsize=None)
+def source_digest(module):
+    """Digest of a module's source file, so editing a threshold in code invalidates its entries."""
+    with open(module.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def settings(module, *names):
+    """Cache-key part for ``module``: its source digest plus the current values of ``names``."""
+    return (module.__name__, source_digest(module), tuple((n, repr(getattr(module, n))) for n in names))
+
+
+def make_key(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-tier content-addressed cache: an LRU of live objects over a size-bounded pickle directory.
+
+    Keys are hex digests (see ``make_key``). ``put`` pickles and writes on a
+    background thread, so storing a large graph never delays a response;
+    entries larger than the memory budget go to disk only. The disk tier
+    evicts least recently read files once it exceeds ``disk_bytes``. It only
+    uses a directory owned by this user with mode 0700 and is switched off
+    otherwise, and it never unpickles a file someone else owns or could write.
+    """
+
+    def __init__(self, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES, directory=DIRECTORY):
+        self.memory_bytes, self.disk_bytes, self.directory = memory_bytes, disk_bytes, directory
+        self.hits = self.misses = 0
+        self._memory = OrderedDict()  # key → (value, size)
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-writer')
+        if disk_bytes and not self._private_directory():
+            log.warning('result cache: %s is not a private directory of this user; disk tier off', directory)
+            self.disk_bytes = 0
+
+    def _private_directory(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        st = os.lstat(self.directory)
+        if not stat.S_ISDIR(st.st_mode) or not _owned(st, 0):
+            return False
+        if st.st_mode & 0o077:
+            os.chmod(self.directory, 0o700)   # ours, e.g. created under a loose umask
+        return True
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key][0]
+        blob = self._read(self._path(key)) if self.disk_bytes else None
+        if blob is None:
+            self.misses += 1
+            return None
+        value = pickle.loads(blob)
+        self._remember(key, value, len(blob))
+        self.hits += 1
+        return value
+
+    def _read(self, path):
+        """The file's bytes, or None when it is missing or not safe to unpickle."""
+        try:
+            with open(path, 'rb') as f:
+                if not _owned(os.fstat(f.fileno()), 0o022):
+                    return None
+                blob = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return blob
+
+    def put(self, key, value):
+        self._writer.submit(self._store, key, value)
+
+    def flush(self):
+        """Block until queued writes are done."""
+        self._writer.submit(lambda: None).result()
+
+    def _store(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, value, len(blob))
+        if self.disk_bytes and len(blob) <= self.disk_bytes:
+            tmp = self._path(key) + '.tmp'
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, self._path(key))
+            self._evict_disk()
+
+    def _remember(self, key, value, size):
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_used -= self._memory.pop(key)[1]
+            self._memory[key] = (value, size)
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                self._memory_used -= self._memory.popitem(last=False)[1][1]
+
+    def _evict_disk(self):
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith('.pkl')]
+        used = sum(e.stat().st_size for e in entries)
+        for e in sorted(entries, key=lambda e: e.stat().st_mtime):
+            if used <= self.disk_bytes:
+                break
+            used -= e.stat().st_size
+            os.unlink(e.path)
+
+    def stats(self):
+        with self._lock:
+            return {'memory_entries': len(self._memory), 'memory_bytes': self._memory_used,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+CACHE = ResultCache() if ENABLED else None
@@ -0,0 +1,165 @@
+import math, os, time, zlib
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from profiling import span
+from workers import process_pool
+
+MODE = os.environ.get('CENTRALITY_MODE', 'exact')  # 'exact' | 'approx' (opt-in sampling)
+EPSILON = float(os.environ.get('CENTRALITY_EPSILON', 0.02))  # max abs error on normalized scores
+DELTA = float(os.environ.get('CENTRALITY_DELTA', 0.1))       # ... with probability 1 - DELTA
+WORKERS = int(os.environ.get('CENTRALITY_WORKERS', os.cpu_count() or 1))
+SMALL_COMPONENT = 64          # components up to this size use plain per-source Brandes
+PARALLEL_MIN_WORK = 5_000_000  # sources × edges below which we stay in-process
+BATCH_CELLS = 4_000_000        # cap on nodes × batch-size for the dense BFS frontier
+
+
+def _brandes_small(indptr, indices, sources):
+    """Classic Brandes over a tiny component; returns raw dependency sums."""
+    n = len(indptr) - 1
+    bc = np.zeros(n)
+    for s in sources:
+        sigma, dist, preds, order = [0] * n, [-1] * n, [[] for _ in range(n)], []
+        sigma[s], dist[s] = 1, 0
+        queue = [s]
+        for v in queue:
+            order.append(v)
+            for w in indices[indptr[v]:indptr[v + 1]]:
+                if dist[w] < 0:
+                    dist[w] = dist[v] + 1
+                    queue.append(w)
+                if dist[w] == dist[v] + 1:
+                    sigma[w] += sigma[v]
+                    preds[w].append(v)
+        delta = [0.0] * n
+        for w in reversed(order):
+            for v in preds[w]:
+                delta[v] += sigma[v] / sigma[w] * (1 + delta[w])
+            if w != s:
+                bc[w] += delta[w]
+    return bc
+
+
+def _check(deadline):
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError('betweenness deadline passed')
+
+
+def _brandes_batched(indptr, indices, sources, deadline=None):
+    """Algebraic Brandes: BFS for a batch of sources at once via sparse matmuls."""
+    n = len(indptr) - 1
+    A = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n, n))
+    AT = A.T.tocsr()
+    bc = np.zeros(n)
+    batch = max(1, min(len(sources), BATCH_CELLS // n))
+    for lo in range(0, len(sources), batch):
+        _check(deadline)
+        src = np.asarray(sources[lo:lo + batch])
+        cols = np.arange(len(src))
+        depth = np.full((n, len(src)), -1, dtype=np.int32)
+        depth[src, cols] = 0
+        sigma = np.zeros((n, len(src)))
+        sigma[src, cols] = 1
+        frontier, d = sigma.copy(), 0
+        while True:
+            _check(deadline)
+            nxt = AT @ frontier
+            fresh = (nxt > 0) & (depth < 0)
+            if not fresh.any():
+                break
+            d += 1
+            nxt[~fresh] = 0
+            depth[fresh] = d
+            sigma += nxt
+            frontier = nxt
+        delta = np.zeros_like(sigma)
+        for lvl in range(d, 0, -1):
+            _check(deadline)
+            T = np.where(depth == lvl, (1 + delta) / np.where(sigma > 0, sigma, 1), 0)
+            delta += np.where(depth == lvl - 1, sigma * (A @ T), 0)
+        delta[src, cols] = 0
+        bc += delta.sum(axis=1)
+    return bc
+
+
+def _run(task):
+    indptr, indices, sources, deadline = task
+    if len(indptr) - 1 <= SMALL_COMPONENT:
+        return _brandes_small(indptr, indices, sources)
+    return _brandes_batched(indptr, indices, sources, deadline)
+
+
+def _pivots(n_comp, n, epsilon, delta):
+    """Sources needed so every node's estimate is within epsilon w.p. 1 - delta.
+
+    Each sampled source contributes at most ``n_comp (n_comp-2) / ((n-1)(n-2))``
+    to a normalized score; Hoeffding plus a union bound over the component.
+    """
+    r = n_comp * (n_comp - 2) / ((n - 1) * (n - 2))
+    return math.ceil(r * r * math.log(2 * n_comp / delta) / (2 * epsilon * epsilon))
+
+
+def _compute(G, mode, epsilon, delta, workers, seed, population=None, deadline=None):
+    n = G.number_of_nodes()
+    bc = np.zeros(n)
+    if n <= 2:
+        return bc
+    n_norm = max(population or n, 3)
+    keep = G.edge_src != G.edge_dst
+    src, dst = G.edge_src[keep], G.edge_dst[keep]
+    adj = csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    n_comp, labels = connected_components(adj, directed=True, connection='weak')
+    order = np.argsort(labels, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=n_comp))))
+
+    # One task per (component, source chunk); scale records the pivot correction
+    tasks, targets, scales, work = [], [], [], 0
+    for c in range(n_comp):
+        nodes = order[bounds[c]:bounds[c + 1]]
+        if len(nodes) < 3:
+            continue  # no node can lie strictly between two others
+        sub = adj[nodes][:, nodes].tocsr()
+        k = len(nodes) if mode == 'exact' else min(len(nodes), _pivots(len(nodes), n_norm, epsilon, delta))
+        if k == len(nodes):
+            sources = np.arange(len(nodes))
+        else:
+            # Seeded by the component's first account, so a component samples
+            # the same pivots whichever graph (or shard) it is part of
+            rng = np.random.default_rng([seed, zlib.crc32(str(G.accounts[nodes[0]]).encode())])
+            sources = np.sort(rng.choice(len(nodes), k, replace=False))
+        chunks = max(1, min(workers, k * sub.nnz // PARALLEL_MIN_WORK))
+        for part in np.array_split(sources, chunks):
+            tasks.append((sub.indptr, sub.indices, part.tolist(), deadline))
+            targets.append(nodes)
+            scales.append(len(nodes) / k)
+            work += len(part) * max(sub.nnz, 1)
+
+    if workers > 1 and work >= PARALLEL_MIN_WORK and len(tasks) > 1:
+        with process_pool(min(workers, len(tasks))) as pool:
+            parts = list(pool.map(_run, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        parts = []
+        for t in tasks:
+            _check(deadline)
+            parts.append(_run(t))
+    for nodes, scale, part in zip(targets, scales, parts):
+        bc[nodes] += part * scale
+    return bc / ((n_norm - 1) * (n_norm - 2))
+
+
+def betweenness(G, mode=MODE, epsilon=EPSILON, delta=DELTA, workers=WORKERS, seed=0, population=None,
+                deadline=None):
+    """Normalized betweenness centrality aligned with ``G.accounts``.
+
+    Memoized on the graph, so every consumer in one analysis shares a single
+    computation. ``mode='approx'`` samples k pivots per weakly connected
+    component (exact whenever k would cover the component anyway).
+    ``population`` normalizes by a larger graph's node count, for a shard
+    holding some of its weakly connected components. Past ``deadline`` (a
+    ``time.time()``) it raises TimeoutError and memoizes nothing.
+    """
+    key = ('betweenness', mode, epsilon, delta, seed) + ((population,) if population else ())
+    if key not in G.cache:
+        with span(f'centrality.{mode}', items=G.number_of_nodes()):
+            G.cache[key] = _compute(G, mode, epsilon, delta, workers, seed, population, deadline)
+    return G.cache[key]
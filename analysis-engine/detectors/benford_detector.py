@@ -1,59 +1,104 @@
 import numpy as np
-from scipy import stats
-import pandas as pd
+from scipy.special import chdtrc
+from account_index import build_account_index
+from profiling import span
 
+# Expected digit frequencies per test: bins, minimum digit count to test
 BENFORD = np.array([np.log10(1 + 1 / d) for d in range(1, 10)])
+BENFORD_SECOND = np.array([sum(np.log10(1 + 1 / (10 * d1 + d2)) for d1 in range(1, 10)) for d2 in range(10)])
+BENFORD_FIRST_TWO = np.array([np.log10(1 + 1 / d) for d in range(10, 100)])
+DIGIT_TESTS = {
+    'first': (BENFORD, 10),
+    'second': (BENFORD_SECOND, 10),
+    'first_two': (BENFORD_FIRST_TWO, 100),
+}
+MIN_TXS = 20          # accounts with fewer transactions are assumed compliant
+TESTS = ('first',)    # first-digit drives the score; the others are opt-in
+
+
+def _mantissa(amounts):
+    """Scale |amount| into [1, 10) with log10 math; NaN for zero/non-finite."""
+    x = np.abs(np.asarray(amounts, dtype=np.float64))
+    valid = np.isfinite(x) & (x > 0)
+    m = np.full(len(x), np.nan)
+    xv = x[valid]
+    m[valid] = xv / 10.0 ** np.floor(np.log10(xv))
+    # Guard against the last-ulp error in the power (e.g. 0.3 → 2.9999…)
+    m = m * (1 + 1e-12)
+    m = np.where(m >= 10, m / 10, np.where(m < 1, m * 10, m))
+    return m
+
+
+def digit_bins(amounts, test='first'):
+    """Bin index per amount for ``test`` (first 1-9, second 0-9, first_two 10-99), -1 if none."""
+    m = _mantissa(amounts)
+    ok = ~np.isnan(m)
+    two = np.floor(np.where(ok, m, 1) * 10).astype(np.int64)  # first two digits, 10..99
+    if test == 'first':
+        bins = two // 10 - 1
+    elif test == 'second':
+        bins = two % 10
+    elif test == 'first_two':
+        bins = two - 10
+    else:
+        raise ValueError(f'Unknown Benford test: {test}')
+    return np.where(ok, bins, -1)
+
 
 def _lead_vectorized(amounts):
-    """Extract leading digits from an array of amounts using string ops."""
-    digits = []
-    for a in amounts:
-        for ch in str(abs(float(a))):
-            if ch.isdigit() and ch != '0':
-                digits.append(int(ch))
-                break
-        else:
-            digits.append(0)
-    return digits
-
-def benford_analysis(df, txs_by_account=None):
+    """Leading digit (1-9) of each amount, 0 for zero/non-finite amounts."""
+    return np.maximum(digit_bins(amounts, 'first') + 1, 0)
+
+
+def digit_test(G, test='first', index=None):
+    """Batched chi-square of every account's digit histogram against Benford.
+
+    Each transaction counts once for its sender and once for its receiver.
+    Returns (tx count, digit count, p-value) arrays aligned with
+    ``G.accounts``; p is NaN where the account has too few digits to test.
+    """
+    if index is None:
+        index = build_account_index(G)
+    expected, min_digits = DIGIT_TESTS[test]
+    k, n_acc = len(expected), G.number_of_nodes()
+    acc = index.all.account.astype(np.int64)
+    bins = digit_bins(index.all.amount, test)
+
+    tx_count = index.all.count
+    keep = bins >= 0
+    obs = np.bincount(acc[keep] * k + bins[keep], minlength=n_acc * k).reshape(n_acc, k).astype(np.float64)
+    n = obs.sum(axis=1)
+
+    pval = np.full(n_acc, np.nan)
+    tested = (tx_count >= MIN_TXS) & (n >= min_digits)
+    with span(f'benford.chi_square_{test}', items=int(tested.sum())):
+        if tested.any():
+            exp = np.maximum(expected * n[tested, None], 0.5)
+            chi = ((obs[tested] - exp) ** 2 / exp).sum(axis=1)
+            pval[tested] = chdtrc(k - 1, chi)   # chi-square survival function
+    return tx_count, n, pval
+
+
+def benford_analysis(G, df, index=None, tests=TESTS):
+    """Benford results for every account with enough data to test.
+
+    Accounts that are not listed are compliant with no score change.
+    Extra ``tests`` beyond ``'first'`` are reported under ``tests`` per account.
+    """
+    _, _, pval = digit_test(G, 'first', index)
+    extra = {t: digit_test(G, t, index)[2] for t in tests if t != 'first'}
     results = {}
-    all_accounts = set(df['sender_id'].tolist() + df['receiver_id'].tolist())
-
-    # Pre-compute transactions per account if not provided
-    if txs_by_account is None:
-        sender_groups = df.groupby('sender_id')
-        receiver_groups = df.groupby('receiver_id')
-        txs_by_account = {}
-        for acc in all_accounts:
-            parts = []
-            if acc in sender_groups.groups:
-                parts.append(sender_groups.get_group(acc))
-            if acc in receiver_groups.groups:
-                parts.append(receiver_groups.get_group(acc))
-            txs_by_account[acc] = pd.concat(parts) if parts else pd.DataFrame()
-
-    for acc in all_accounts:
-        txs = txs_by_account.get(acc, pd.DataFrame())
-        if len(txs) < 20:
-            results[acc] = {'compliant': True, 'p_value': 1.0, 'score_delta': 0, 'pattern': None}
-            continue
-        digits = _lead_vectorized(txs['amount'].values)
-        obs = np.zeros(9)
-        for d in digits:
-            if 1 <= d <= 9:
-                obs[d - 1] += 1
-        n = sum(obs)
-        if n < 10:
-            results[acc] = {'compliant': True, 'p_value': 1.0, 'score_delta': 0, 'pattern': None}
-            continue
-        exp = np.maximum(BENFORD * n, 0.5)
-        _, pval = stats.chisquare(obs, exp)
-        violating = pval < 0.05
-        results[acc] = {
+    for i in np.flatnonzero(~np.isnan(pval)).tolist():
+        p = float(pval[i])
+        violating = p < 0.05
+        results[G.accounts[i]] = {
             'compliant': not violating,
-            'p_value': round(pval, 4),
+            'p_value': round(p, 4),
             'score_delta': 15 if violating else -15,
             'pattern': 'benford_violation' if violating else None
         }
+        if extra:
+            results[G.accounts[i]]['tests'] = {
+                t: {'p_value': round(float(pv[i]), 4), 'compliant': bool(pv[i] >= 0.05)}
+                for t, pv in extra.items() if not np.isnan(pv[i])}
     return results
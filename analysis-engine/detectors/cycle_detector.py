@@ -1,41 +1,222 @@
-import networkx as nx
+import os, time
+from bisect import bisect_left
+from contextlib import nullcontext
+from concurrent.futures import as_completed
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from profiling import span
+from workers import process_pool
 
-MAX_RINGS = 50  # Stop after finding this many rings
+MIN_LEN, MAX_LEN = 3, 5    # ring sizes we report
+WINDOW_HRS = 72            # first → last hop of a ring must fit in this window
+WORKERS = int(os.environ.get('CYCLE_WORKERS', os.cpu_count() or 1))
+PARALLEL_MIN_EDGES = 5000  # components smaller than this are enumerated inline
+CHECK_EVERY = 1024         # DFS steps between deadline checks
 
-def detect_cycles(G, df):
-    results, rings, counter = {}, [], 1
-    # Johnson's Algorithm with length_bound to cap at 5-node cycles
-    # Also stop early after MAX_RINGS to avoid runaway on dense graphs
-    try:
-        for cycle in nx.simple_cycles(G, length_bound=5):
-            if len(cycle) < 3:
+
+def _check(deadline):
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError('cycle search deadline passed')
+
+
+def _components(G, edges=None):
+    """Strongly connected components that can hold a ring, largest first.
+
+    ``edges`` (a boolean mask) limits the search to the components of that
+    subgraph; their payloads still carry every edge between members.
+    """
+    n = G.number_of_nodes()
+    src, dst = (G.edge_src, G.edge_dst) if edges is None else (G.edge_src[edges], G.edge_dst[edges])
+    adj = csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    _, labels = connected_components(adj, directed=True, connection='strong')
+    sizes = np.bincount(labels)
+    order = np.argsort(labels, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+    comps = [order[bounds[c]:bounds[c + 1]] for c in np.flatnonzero(sizes >= MIN_LEN)]
+    return sorted(comps, key=len, reverse=True), labels
+
+
+def _payload(G, nodes, labels):
+    """Local adjacency for one component: per node, [(v, hop timestamps, hop amounts)]."""
+    local = {int(u): i for i, u in enumerate(nodes)}
+    comp = labels[nodes[0]]
+    adj = []
+    for u in nodes:
+        out = []
+        for e in range(G.out_ptr[u], G.out_ptr[u + 1]):
+            v = G.edge_dst[e]
+            if labels[v] == comp:
+                sl = G.edge_slice(e)
+                out.append((local[int(v)], G.tx_ts[sl].tolist(), G.tx_amount[sl].tolist()))
+        adj.append(out)
+    return nodes.tolist(), adj
+
+
+def _component_cycles(payload, window_ns=WINDOW_HRS * 3_600_000_000_000,
+                      min_len=MIN_LEN, max_len=MAX_LEN, deadline=None):
+    """Enumerate time-respecting simple cycles inside one component.
+
+    Every hop must use a transaction at or after the previous hop's, and the
+    whole ring must close within ``window_ns`` of its first transaction. Each
+    hop greedily takes the earliest admissible transaction, which never rules
+    out a completion that a later one would allow. Past ``deadline`` (a
+    ``time.time()`` value) it raises TimeoutError.
+    """
+    nodes, adj = payload
+    found, seen, steps = [], set(), [0]
+    for root in range(len(nodes)):
+        _check(deadline)
+        on_path = {root}
+        path, stamps, amounts = [root], [], []
+
+        def dfs(u, t_prev, t0):
+            steps[0] += 1
+            if steps[0] % CHECK_EVERY == 0:
+                _check(deadline)
+            for v, ts, amt in adj[u]:
+                j = bisect_left(ts, t_prev)
+                if j == len(ts) or ts[j] - t0 > window_ns:
+                    continue
+                if v == root:
+                    if len(path) >= min_len:
+                        k = path.index(min(path))
+                        key = tuple(path[k:] + path[:k])
+                        if key not in seen:
+                            seen.add(key)
+                            found.append(([nodes[i] for i in path], stamps + [ts[j]], amounts + [amt[j]]))
+                    continue
+                if v in on_path or len(path) == max_len:
+                    continue
+                path.append(v); on_path.add(v); stamps.append(ts[j]); amounts.append(amt[j])
+                dfs(v, ts[j], t0)
+                path.pop(); on_path.discard(v); stamps.pop(); amounts.pop()
+
+        for v, ts, amt in adj[root]:
+            if v == root:
                 continue
-            length = len(cycle)
-            ring_id = f'RING_{counter:03d}'; counter += 1
-            times, total_amount = [], 0
-            for i in range(length):
-                src, dst = cycle[i], cycle[(i + 1) % length]
-                if G.has_edge(src, dst):
-                    times.append(G[src][dst]['transactions'][0]['timestamp'])
-                    total_amount += G[src][dst]['total_amount']
-            span_hrs = (max(times) - min(times)).total_seconds() / 3600 if len(times) >= 2 else 48
-            vel_mult = max(1.0, 3.0 - span_hrs / 8.0)
-            base_score = min(35 * vel_mult, 50)
-            pattern = f'cycle_length_{length}'
-            for acc in cycle:
-                if acc not in results:
-                    results[acc] = {'patterns': [], 'ring_ids': [], 'scores': []}
-                results[acc]['patterns'].append(pattern)
-                results[acc]['ring_ids'].append(ring_id)
-                results[acc]['scores'].append(base_score)
-            rings.append({
-                'ring_id': ring_id,
-                'member_accounts': cycle,
-                'pattern_type': 'cycle',
-                'risk_score': round(min(base_score * 1.2, 100), 1)
-            })
-            if counter > MAX_RINGS:
-                break
-    except Exception as e:
-        print(f'Cycle detection capped: {e}')
+            path.append(v); on_path.add(v)
+            for t0, a0 in zip(ts, amt):  # every transaction can open the ring
+                stamps.append(t0); amounts.append(a0)
+                dfs(v, t0, t0)
+                stamps.pop(); amounts.pop()
+            path.pop(); on_path.discard(v)
+    return found
+
+
+def _summarise(G, members, stamps, amounts):
+    span_hrs = (stamps[-1] - stamps[0]) / 3.6e12
+    return {
+        'members': [G.accounts[i] for i in members],
+        'length': len(members),
+        'first_ts': stamps[0],
+        'last_ts': stamps[-1],
+        'span_hours': span_hrs,
+        'velocity_multiplier': max(1.0, 3.0 - span_hrs / 8.0),
+        'total_amount': float(sum(amounts)),
+        # Mean fraction of the amount retained per hop (layering skims a cut)
+        'amount_decay': float((amounts[-1] / amounts[0]) ** (1 / (len(amounts) - 1))) if amounts[0] > 0 else 1.0,
+    }
+
+
+def touching_edges(G, rows, window_hrs=WINDOW_HRS, max_len=MAX_LEN):
+    """Boolean edge mask covering every ring that can use one of the transactions ``rows``.
+
+    Such a ring only uses transactions within ``window_hrs`` of the new one,
+    and each of its members is at most ``max_len - 1`` hops downstream of
+    the new transaction's receiver and upstream of its sender.
+    """
+    live = np.zeros(len(G.edge_src), dtype=bool)
+    if len(rows) == 0:
+        return live
+    window = np.int64(window_hrs * 3_600_000_000_000)
+    ts = G.tx_ts[rows]
+    live = (G.edge_last_ts >= ts.min() - window) & (G.edge_first_ts <= ts.max() + window)
+    src, dst = G.edge_src[live], G.edge_dst[live]
+    fwd = np.zeros(len(G), dtype=bool)
+    bwd = np.zeros(len(G), dtype=bool)
+    fwd[G.tx_dst[rows]] = True
+    bwd[G.tx_src[rows]] = True
+    for _ in range(max_len - 1):
+        fwd[dst[fwd[src]]] = True
+        bwd[src[bwd[dst]]] = True
+    region = fwd & bwd
+    live[live] = region[src] & region[dst]
+    return live
+
+
+def iter_cycles(G, window_hrs=WINDOW_HRS, min_len=MIN_LEN, max_len=MAX_LEN, workers=WORKERS, edges=None,
+                deadline=None):
+    """Stream ring records component by component, with no cap on the count.
+
+    ``edges`` restricts the search as in ``_components``: rings inside the
+    mask are all found, others may be. Past ``deadline`` every component
+    search, including those on the pool, stops with TimeoutError.
+    """
+    with span('cycles.components') as s:
+        comps, labels = _components(G, edges)
+        s.items = len(comps)
+    window_ns = int(window_hrs * 3_600_000_000_000)
+    big = [c for c in comps if G.out_ptr[c + 1].sum() - G.out_ptr[c].sum() >= PARALLEL_MIN_EDGES]
+    small = comps[len(big):]
+    parallel = workers > 1 and len(big) > 1
+    with process_pool(min(workers, len(big))) if parallel else nullcontext() as pool:
+        futures = [pool.submit(_component_cycles, _payload(G, c, labels), window_ns, min_len, max_len, deadline)
+                   for c in big] if parallel else []
+        try:
+            for c in ([] if parallel else big) + small:
+                for found in _component_cycles(_payload(G, c, labels), window_ns, min_len, max_len, deadline):
+                    yield _summarise(G, *found)
+            for fut in as_completed(futures):
+                for found in fut.result():
+                    yield _summarise(G, *found)
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+
+def detect_cycles(G, df, window_hrs=WINDOW_HRS, workers=WORKERS, max_len=MAX_LEN, deadline=None):
+    return assemble_rings(iter_cycles(G, window_hrs=window_hrs, max_len=max_len, workers=workers,
+                                      deadline=deadline))
+
+
+def cycle_candidates(G):
+    """Accounts in a strongly connected component large enough to hold a ring."""
+    comps, _ = _components(G)
+    mask = np.zeros(G.number_of_nodes(), dtype=bool)
+    for c in comps:
+        mask[c] = True
+    return mask
+
+
+def assemble_rings(found):
+    """Number cycle records (as yielded by iter_cycles) and index them by account.
+
+    ``rings`` holds one record per cycle; ring_consolidation merges the
+    overlapping ones into the rings that are reported.
+    """
+    results, rings = {}, []
+    # Number cycles by first transaction so IDs don't depend on worker timing
+    found = sorted(found, key=lambda c: (c['first_ts'], c['members']))
+    for counter, cyc in enumerate(found, 1):
+        cycle_id = f'CYCLE_{counter:03d}'
+        base_score = min(35 * cyc['velocity_multiplier'], 50)
+        pattern = f'cycle_length_{cyc["length"]}'
+        for acc in cyc['members']:
+            if acc not in results:
+                results[acc] = {'patterns': [], 'cycle_ids': [], 'scores': []}
+            results[acc]['patterns'].append(pattern)
+            results[acc]['cycle_ids'].append(cycle_id)
+            results[acc]['scores'].append(base_score)
+        rings.append({
+            'ring_id': cycle_id,
+            'member_accounts': cyc['members'],
+            'pattern_type': 'cycle',
+            'risk_score': round(min(base_score * 1.2, 100), 1),
+            'first_ts': int(cyc['first_ts']),
+            'last_ts': int(cyc['last_ts']),
+            'span_hours': round(cyc['span_hours'], 2),
+            'total_amount': round(cyc['total_amount'], 2),
+            'amount_decay': round(cyc['amount_decay'], 4),
+        })
     return {'accounts': results, 'rings': rings}
@@ -1,59 +1,80 @@
-import networkx as nx
 import numpy as np
 from collections import defaultdict
+from account_index import build_account_index
+from feature_store import build_feature_store
+from profiling import span
 
-def detect_shells(G, df, money_in=None, money_out=None,
-                  recv_by_account=None, sent_by_account=None):
+VELOCITY_SECS = 6 * 3600  # received AND forwarded within 6 hours
+MAX_EVIDENCE_PAIRS = 5    # example receive→send pairs kept per flagged account
+FEATURES = ('betweenness', 'tx_count', 'pass_through')
+
+
+def _pass_through_pairs(index):
+    """Match every send to the latest receive at or before it by the same account.
+
+    Exact and O(n log n): both sides of the account index are sorted by
+    (account, timestamp) and matched with one searchsorted, so no account is
+    sampled or truncated. Returns (account, receive row, send row, lag
+    seconds) for matches within VELOCITY_SECS, grouped by account.
+    """
+    recv, send = index.incoming, index.outgoing
+    r_acc, r_t = recv.account.astype(np.int64), recv.ts // 10**9
+    s_acc, s_t = send.account.astype(np.int64), send.ts // 10**9
+
+    ranks = np.unique(np.concatenate((r_t, s_t)), return_inverse=True)[1]
+    span = np.int64(ranks.max() + 1) if len(ranks) else np.int64(1)
+    j = np.searchsorted(r_acc * span + ranks[:len(r_t)],
+                        s_acc * span + ranks[len(r_t):], side='right') - 1
+    ok = j >= 0
+    ok[ok] = r_acc[j[ok]] == s_acc[ok]
+    lag = np.where(ok, s_t - r_t[np.maximum(j, 0)], -1)
+    hit = ok & (lag <= VELOCITY_SECS)
+    return s_acc[hit], recv.rows[j[hit]], send.rows[hit], lag[hit]
+
+
+def _velocity_evidence(G, recv_rows, send_rows, lags):
+    p50, p90 = np.percentile(lags, [50, 90])
+    return {
+        'matched_pairs': len(lags),
+        'lag_seconds': {'min': int(lags.min()), 'p50': float(p50),
+                        'p90': float(p90), 'max': int(lags.max())},
+        'examples': [{'receive_tx': G.tx_id[r], 'send_tx': G.tx_id[s], 'lag_seconds': int(l)}
+                     for r, s, l in zip(recv_rows[:MAX_EVIDENCE_PAIRS],
+                                        send_rows[:MAX_EVIDENCE_PAIRS],
+                                        lags[:MAX_EVIDENCE_PAIRS])],
+    }
+
+
+def shell_candidates(features):
+    """Accounts the betweenness test could flag: few transactions, nearly all passed on."""
+    tx_count, pt_ratio = features.get('tx_count', 'pass_through')
+    return (tx_count <= 5) & (pt_ratio > 0.85)
+
+
+def detect_shells(G, df, features=None, index=None, betweenness=None):
+    """Shell and high-velocity accounts; ``betweenness`` replaces the store's column (e.g. a coarser one)."""
     res = defaultdict(lambda: {'patterns': [], 'scores': []})
+    if index is None:
+        index = build_account_index(G)
+    if features is None:
+        features = build_feature_store(G, index)
+
+    # Betweenness is shared with the GNN features through the store
+    bc = features['betweenness'] if betweenness is None else betweenness
+    for i in np.flatnonzero((bc > 0.05) & shell_candidates(features)).tolist():
+        node = G.accounts[i]
+        res[node]['patterns'].append('shell_account')
+        res[node]['scores'].append(15)
 
-    # Pre-compute if not provided
-    if money_in is None:
-        money_in = df.groupby('receiver_id')['amount'].sum().to_dict()
-    if money_out is None:
-        money_out = df.groupby('sender_id')['amount'].sum().to_dict()
-    if recv_by_account is None:
-        recv_by_account = dict(tuple(df.groupby('receiver_id')))
-    if sent_by_account is None:
-        sent_by_account = dict(tuple(df.groupby('sender_id')))
-
-    # Betweenness centrality: O(V*E)
-    bc = nx.betweenness_centrality(G, normalized=True)
-
-    # Pre-compute tx counts per node
-    recv_counts = df.groupby('receiver_id').size().to_dict()
-    send_counts = df.groupby('sender_id').size().to_dict()
-
-    for node in G.nodes():
-        mi = money_in.get(node, 0)
-        mo = money_out.get(node, 0)
-        tx_count = recv_counts.get(node, 0) + send_counts.get(node, 0)
-        pt_ratio = mo / mi if mi > 0 else 0
-
-        if bc.get(node, 0) > 0.05 and tx_count <= 5 and pt_ratio > 0.85:
-            res[node]['patterns'].append('shell_account')
-            res[node]['scores'].append(15)
-
-        # High velocity: received AND forwarded within 6 hours
-        # Vectorized with NumPy broadcasting
-        recv_df = recv_by_account.get(node)
-        send_df = sent_by_account.get(node)
-
-        if recv_df is not None and send_df is not None and len(recv_df) > 0 and len(send_df) > 0:
-            recv_s = recv_df['timestamp'].values.astype('int64') // 10**9
-            send_s = send_df['timestamp'].values.astype('int64') // 10**9
-            # Limit array sizes for very high-volume nodes (merchants)
-            if len(recv_s) <= 500 and len(send_s) <= 500:
-                diffs = send_s[:, None] - recv_s[None, :]
-                if np.any((diffs >= 0) & (diffs <= 21600)):
-                    res[node]['patterns'].append('high_velocity')
-                    res[node]['scores'].append(5)
-            else:
-                # For high-volume nodes, sample to keep fast
-                r_sample = np.sort(recv_s)[-100:]
-                s_sample = np.sort(send_s)[:100]
-                diffs = s_sample[:, None] - r_sample[None, :]
-                if np.any((diffs >= 0) & (diffs <= 21600)):
-                    res[node]['patterns'].append('high_velocity')
-                    res[node]['scores'].append(5)
+    # High velocity: received AND forwarded within 6 hours, all accounts at once
+    with span('shells.high_velocity', items=len(index.outgoing.rows)):
+        acc, recv_rows, send_rows, lags = _pass_through_pairs(index)
+    starts = np.flatnonzero(np.r_[True, acc[1:] != acc[:-1]]) if len(acc) else []
+    for lo, hi in zip(starts, list(starts[1:]) + [len(acc)]):
+        node = G.accounts[acc[lo]]
+        res[node]['patterns'].append('high_velocity')
+        res[node]['scores'].append(5)
+        res[node]['evidence'] = {'high_velocity': _velocity_evidence(
+            G, recv_rows[lo:hi], send_rows[lo:hi], lags[lo:hi])}
 
     return dict(res)
@@ -1,60 +1,89 @@
-import pandas as pd
-from collections import defaultdict
+import numpy as np
+from account_index import build_account_index
+from profiling import span
 
 WINDOW_HRS = 72
 FAN_THRESH = 10
 THRESHOLDS = [10000, 25000, 50000, 100000, 200000, 500000]
 
-def detect_smurfing(G, df, recv_by_account=None, sent_by_account=None):
-    res = defaultdict(lambda: {'patterns': [], 'scores': []})
-
-    # Use pre-grouped data if available
-    if recv_by_account is None:
-        recv_by_account = dict(tuple(df.groupby('receiver_id')))
-    if sent_by_account is None:
-        sent_by_account = dict(tuple(df.groupby('sender_id')))
-
-    window = pd.Timedelta(hours=WINDOW_HRS)
-
-    for account in G.nodes():
-        # --- Fan-in: many unique senders → one account within 72h ---
-        rcv = recv_by_account.get(account)
-        if rcv is not None and len(rcv) >= FAN_THRESH:
-            rcv_sorted = rcv.sort_values('timestamp')
-            senders = rcv_sorted['sender_id'].values
-            timestamps = rcv_sorted['timestamp'].values
-            left = 0
-            for right in range(len(timestamps)):
-                while timestamps[right] - timestamps[left] > window:
-                    left += 1
-                if len(set(senders[left:right + 1])) >= FAN_THRESH:
-                    res[account]['patterns'].append('fan_in')
-                    res[account]['scores'].append(20)
-                    break
 
-        # --- Fan-out: one account → many unique receivers within 72h ---
-        snt = sent_by_account.get(account)
-        if snt is not None and len(snt) >= FAN_THRESH:
-            snt_sorted = snt.sort_values('timestamp')
-            receivers = snt_sorted['receiver_id'].values
-            timestamps = snt_sorted['timestamp'].values
-            left = 0
-            for right in range(len(timestamps)):
-                while timestamps[right] - timestamps[left] > window:
-                    left += 1
-                if len(set(receivers[left:right + 1])) >= FAN_THRESH:
-                    res[account]['patterns'].append('fan_out')
-                    res[account]['scores'].append(20)
+def _window_starts(acc, ts, window):
+    """First row still inside each row's trailing window; rows sorted by (acc, ts)."""
+    ranks = np.unique(np.concatenate((ts, ts - window)), return_inverse=True)[1]
+    span = np.int64(ranks.max() + 1)
+    acc = acc.astype(np.int64)
+    key = acc * span + ranks[:len(ts)]
+    return np.searchsorted(key, acc * span + ranks[len(ts):], side='left')
+
+
+def _fan_accounts(side, n, window):
+    """Accounts with >= FAN_THRESH distinct counterparties inside some window.
+
+    Every account is handled in one pass over one side of the account index,
+    whose rows are already sorted by (account, timestamp). A vectorized row
+    count per window first discards accounts that can never reach the
+    threshold; the rest get an exact scan that keeps incremental
+    distinct-counterparty counts as the window slides.
+    """
+    flagged = np.zeros(n, dtype=bool)
+    acc, cp, ts = side.account, side.counterparty, side.ts
+    if len(acc) == 0:
+        return flagged
+    left = _window_starts(acc, ts, window)
+    rows_in_window = np.arange(len(acc)) - left + 1
+
+    candidates = np.unique(acc[rows_in_window >= FAN_THRESH])
+    if len(candidates) == 0:
+        return flagged
+    cp, left = cp.tolist(), left.tolist()
+    for a, start, stop in zip(candidates.tolist(), side.ptr[candidates].tolist(),
+                              side.ptr[candidates + 1].tolist()):
+        counts, lo, distinct = {}, start, 0
+        for right in range(start, stop):
+            while lo < left[right]:  # slide the window's left edge forward
+                c = cp[lo]
+                counts[c] -= 1
+                if counts[c] == 0:
+                    distinct -= 1
+                lo += 1
+            c = cp[right]
+            counts[c] = counts.get(c, 0) + 1
+            if counts[c] == 1:
+                distinct += 1
+                if distinct >= FAN_THRESH:
+                    flagged[a] = True
                     break
+    return flagged
+
+
+def detect_smurfing(G, df, index=None):
+    if index is None:
+        index = build_account_index(G)
+    n = G.number_of_nodes()
+    window = np.int64(WINDOW_HRS * 3_600_000_000_000)
+
+    # --- Fan-in: many unique senders → one account within 72h ---
+    with span('smurfing.fan_in_window_scan', items=len(index.incoming.rows)):
+        fan_in = _fan_accounts(index.incoming, n, window)
+    # --- Fan-out: one account → many unique receivers within 72h ---
+    with span('smurfing.fan_out_window_scan', items=len(index.outgoing.rows)):
+        fan_out = _fan_accounts(index.outgoing, n, window)
+
+    # --- Structuring: amounts just below reporting thresholds ---
+    th = np.asarray(THRESHOLDS, dtype=np.float64)
+    amt = index.all.amount[:, None]
+    below = ((amt >= th * 0.95) & (amt < th)).any(axis=1)
+    structuring = np.zeros(n, dtype=bool)
+    structuring[index.all.account[below]] = True
 
-        # --- Structuring: amounts just below reporting thresholds ---
-        rcv_amts = rcv['amount'].values if rcv is not None else []
-        snt_amts = snt['amount'].values if snt is not None else []
-        all_amounts = list(rcv_amts) + list(snt_amts)
-        for amt in all_amounts:
-            if any(t * 0.95 <= amt < t for t in THRESHOLDS):
-                res[account]['patterns'].append('below_threshold_amounts')
-                res[account]['scores'].append(10)
-                break
-
-    return dict(res)
+    res = {}
+    for i in np.flatnonzero(fan_in | fan_out | structuring).tolist():
+        patterns, scores = [], []
+        if fan_in[i]:
+            patterns.append('fan_in'); scores.append(20)
+        if fan_out[i]:
+            patterns.append('fan_out'); scores.append(20)
+        if structuring[i]:
+            patterns.append('below_threshold_amounts'); scores.append(10)
+        res[G.accounts[i]] = {'patterns': patterns, 'scores': scores}
+    return res
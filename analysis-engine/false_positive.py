@@ -1,31 +1,26 @@
-def apply_whitelist(G, df, recv_by_account=None, sent_by_account=None):
-    whitelist = set()
+import numpy as np
+from feature_store import build_feature_store
 
-    # Pre-group if not provided
-    if recv_by_account is None:
-        recv_by_account = dict(tuple(df.groupby('receiver_id')))
-    if sent_by_account is None:
-        sent_by_account = dict(tuple(df.groupby('sender_id')))
+FEATURES = ('in_count', 'in_amount_mean', 'in_amount_std', 'in_counterparties',
+            'out_count', 'out_amount_mean', 'out_amount_std', 'out_counterparties')
 
-    for node in G.nodes():
-        in_txs = recv_by_account.get(node, None)
-        out_txs = sent_by_account.get(node, None)
+def whitelist_mask(G, features=None):
+    """Boolean column over G.accounts: True for merchant/payroll-like accounts."""
+    if features is None:
+        features = build_feature_store(G)
+    n_in, mean, std, senders, n_out, mean_o, std_o, receivers = features.get(*FEATURES)
 
-        # MERCHANT: many diverse customers paying similar amounts
-        if in_txs is not None and len(in_txs) >= 20:
-            mean = in_txs['amount'].mean()
-            cv = in_txs['amount'].std() / mean if mean > 0 else 0
-            div = in_txs['sender_id'].nunique() / len(in_txs)
-            if div > 0.6 and 0.1 < cv < 2.5:
-                whitelist.add(node)
-                continue
+    # MERCHANT: many diverse customers paying similar amounts
+    cv = np.divide(std, mean, out=np.zeros(len(mean)), where=mean > 0)
+    div = np.divide(senders, n_in, out=np.zeros(len(mean)), where=n_in > 0)
+    merchant = (n_in >= 20) & (div > 0.6) & (cv > 0.1) & (cv < 2.5)
 
-        # PAYROLL: equal outflows to many unique recipients
-        if out_txs is not None and len(out_txs) >= 10:
-            mean_o = out_txs['amount'].mean()
-            cv_o = out_txs['amount'].std() / mean_o if mean_o > 0 else 1
-            if cv_o < 0.15 and out_txs['receiver_id'].nunique() > 8:
-                whitelist.add(node)
-                continue
+    # PAYROLL: equal outflows to many unique recipients
+    cv_o = np.divide(std_o, mean_o, out=np.ones(len(mean_o)), where=mean_o > 0)
+    payroll = (n_out >= 10) & (cv_o < 0.15) & (receivers > 8)
+    return merchant | payroll
 
-    return whitelist
+def apply_whitelist(G, df, index=None, features=None):
+    if features is None:
+        features = build_feature_store(G, index)
+    return set(G.accounts[whitelist_mask(G, features)].tolist())
@@ -0,0 +1,142 @@
+import threading
+import numpy as np
+from account_index import build_account_index
+from centrality import betweenness
+from profiling import span
+
+_FEATURES = {}  # name → fn(store) returning an array aligned with G.accounts
+
+
+def feature(name):
+    """Register a per-account feature computed from a FeatureStore."""
+    def register(fn):
+        _FEATURES[name] = fn
+        return fn
+    return register
+
+
+class FeatureStore:
+    """Lazily computed, memoized per-account features for one analysis.
+
+    Consumers declare the feature names they need and get NumPy columns
+    aligned with ``G.accounts``. Each feature is computed at most once, on
+    first use, and its wall time is recorded in ``timings``. Safe to share
+    between concurrently running stages: each feature has its own lock.
+    """
+
+    def __init__(self, G, index=None):
+        self.G = G
+        self.index = index if index is not None else build_account_index(G)
+        self.timings = {}
+        self._values = {}
+        self._locks = {}
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            if name not in _FEATURES:
+                raise KeyError(f'Unknown feature: {name}')
+            with self._locks.setdefault(name, threading.Lock()):
+                if name not in self._values:
+                    with span(f'feature.{name}', items=len(self.G)) as s:
+                        self._values[name] = _FEATURES[name](self)
+                    self.timings[name] = s.wall
+        return self._values[name]
+
+    def preset(self, **columns):
+        """Install columns computed elsewhere (e.g. maintained incrementally)."""
+        for name, values in columns.items():
+            if name not in _FEATURES:
+                raise KeyError(f'Unknown feature: {name}')
+            self._values[name] = values
+            self.timings[name] = 0.0
+
+    def get(self, *names):
+        """Columns for ``names``, in order."""
+        return tuple(self[name] for name in names)
+
+    def require(self, names):
+        """Columns for ``names`` keyed by name."""
+        return {name: self[name] for name in names}
+
+
+def build_feature_store(G, index=None):
+    """FeatureStore for ``G``, built once and memoized on the graph."""
+    if 'features' not in G.cache:
+        G.cache['features'] = FeatureStore(G, index)
+    return G.cache['features']
+
+
+# ── Feature definitions ─────────────────────────────────────────
+@feature('money_in')
+def _money_in(fs):
+    return np.bincount(fs.G.tx_dst, weights=fs.G.tx_amount, minlength=len(fs.G))
+
+@feature('money_out')
+def _money_out(fs):
+    return np.bincount(fs.G.tx_src, weights=fs.G.tx_amount, minlength=len(fs.G))
+
+@feature('pass_through')
+def _pass_through(fs):
+    mi, mo = fs['money_in'], fs['money_out']
+    return np.divide(mo, mi, out=np.zeros(len(mi)), where=mi > 0)
+
+@feature('in_count')
+def _in_count(fs):
+    return fs.index.incoming.count
+
+@feature('out_count')
+def _out_count(fs):
+    return fs.index.outgoing.count
+
+@feature('tx_count')
+def _tx_count(fs):
+    return fs['in_count'] + fs['out_count']
+
+@feature('in_counterparties')
+def _in_counterparties(fs):
+    return fs.G.in_degree
+
+@feature('out_counterparties')
+def _out_counterparties(fs):
+    return fs.G.out_degree
+
+@feature('first_ts')
+def _first_ts(fs):
+    side = fs.index.all
+    return side.ts[side.ptr[:-1]] if len(side.ts) else np.zeros(0, dtype=np.int64)
+
+@feature('last_ts')
+def _last_ts(fs):
+    side = fs.index.all
+    return side.ts[side.ptr[1:] - 1] if len(side.ts) else np.zeros(0, dtype=np.int64)
+
+@feature('betweenness')
+def _betweenness(fs):
+    return betweenness(fs.G)
+
+def _mean(fs, side):
+    s = getattr(fs.index, side)
+    total = np.bincount(s.account, weights=s.amount, minlength=len(fs.G))
+    return np.divide(total, s.count, out=np.zeros(len(total)), where=s.count > 0)
+
+def _std(fs, side, mean):
+    """Sample std (ddof=1), two-pass around the per-account mean; NaN below 2 rows."""
+    s = getattr(fs.index, side)
+    sq = np.bincount(s.account, weights=(s.amount - mean[s.account]) ** 2, minlength=len(fs.G))
+    return np.sqrt(np.divide(sq, s.count - 1, out=np.full(len(sq), np.nan), where=s.count > 1))
+
+@feature('in_amount_mean')
+def _in_amount_mean(fs):
+    return _mean(fs, 'incoming')
+
+@feature('in_amount_std')
+def _in_amount_std(fs):
+    return _std(fs, 'incoming', fs['in_amount_mean'])
+
+@feature('out_amount_mean')
+def _out_amount_mean(fs):
+    return _mean(fs, 'outgoing')
+
+@feature('out_amount_std')
+def _out_amount_std(fs):
+    return _std(fs, 'outgoing', fs['out_amount_mean'])
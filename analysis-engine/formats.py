@@ -0,0 +1,181 @@
+"""Response encodings (json, ndjson, arrow, parquet) and cursor paging for analysis output."""
+import base64, io, json, os
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+PAGE_LIMIT = int(os.environ.get('OUTPUT_PAGE_LIMIT', 100_000))   # max rows per page
+CHUNK_ROWS = 5000        # rows per NDJSON chunk / Arrow record batch
+
+MEDIA = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+_ALIASES = {'application/x-parquet': 'parquet', 'application/vnd.apache.arrow.file': 'arrow',
+            '*/*': 'json', 'application/*': 'json'}
+_FORMATS = {**{v: k for k, v in MEDIA.items()}, **_ALIASES}
+
+# Columns of the tabular formats; list columns hold strings, evidence is JSON text
+ACCOUNT_COLUMNS = ('account_id', 'suspicion_score', 'detected_patterns', 'ring_id', 'lifecycle_stage', 'evidence',
+                   'score_status')
+RING_COLUMNS = ('ring_id', 'member_accounts', 'pattern_type', 'risk_score', 'cycle_count', 'edge_count',
+                'total_flow', 'span_hours')
+
+
+class FormatError(ValueError):
+    """Unknown or unavailable format, or a malformed cursor."""
+
+    def __init__(self, message, status=406):
+        super().__init__(message)
+        self.status = status
+
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = MEDIA['json']
+
+    def render(self, content):
+        return dumps(content)
+
+
+def negotiate(fmt=None, accept=None):
+    """Format name from an explicit ``fmt`` or the highest-q known type in ``accept``; json by default."""
+    if fmt:
+        if fmt not in MEDIA:
+            raise FormatError(f'Unknown format {fmt!r}; one of {", ".join(MEDIA)}', 400)
+        name = fmt
+    else:
+        offers = []
+        for n, part in enumerate((accept or '').split(',')):
+            media, *params = [p.strip() for p in part.split(';')]
+            q = next((p[2:] for p in params if p.startswith('q=')), '1')
+            try:
+                q = float(q)
+            except ValueError:
+                q = 0.0
+            if q > 0 and media.lower() in _FORMATS:
+                offers.append((-q, n, _FORMATS[media.lower()]))
+        name = min(offers)[2] if offers else 'json'
+    if name in ('arrow', 'parquet') and pa is None:
+        raise FormatError(f'{name} output needs pyarrow, which is not installed')
+    return name
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise FormatError(f'Bad cursor: {cursor!r}', 400)
+    if offset < 0:
+        raise FormatError(f'Bad cursor: {cursor!r}', 400)
+    return offset
+
+
+def page(rows, limit=None, cursor=None):
+    """(rows of the page, next cursor or None)."""
+    start = decode_cursor(cursor)
+    if limit is None and not start:
+        return rows, None
+    end = len(rows) if limit is None else min(start + limit, len(rows))
+    return rows[start:end], encode_cursor(end) if end < len(rows) else None
+
+
+def paged_output(out, limit=None):
+    """``out`` with both lists cut to their top ``limit``, plus ``next_cursor`` for each when there is more."""
+    if limit is None:
+        return out
+    accounts, next_accounts = page(out['suspicious_accounts'], limit)
+    rings, next_rings = page(out['fraud_rings'], limit)
+    return {**out, 'suspicious_accounts': accounts, 'fraud_rings': rings,
+            'next_cursor': {'accounts': next_accounts, 'rings': next_rings}}
+
+
+def _columns(rows, columns):
+    cols = {c: [r.get(c) for r in rows] for c in columns}
+    if 'evidence' in cols:
+        cols['evidence'] = [json.dumps(e) if e is not None else None for e in cols['evidence']]
+    return cols
+
+
+def _table(rows, columns, metadata):
+    schema = _schema(columns).with_metadata(metadata)
+    return pa.Table.from_pydict(_columns(rows, columns), schema=schema)
+
+
+def _schema(columns):
+    types = {'suspicion_score': pa.float64(), 'risk_score': pa.float64(), 'total_flow': pa.float64(),
+             'span_hours': pa.float64(), 'cycle_count': pa.int64(), 'edge_count': pa.int64(),
+             'detected_patterns': pa.list_(pa.string()), 'member_accounts': pa.list_(pa.string())}
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def _ndjson(rows):
+    for i in range(0, len(rows), CHUNK_ROWS):
+        yield b''.join(dumps(r) + b'\n' for r in rows[i:i + CHUNK_ROWS])
+
+
+def _arrow(rows, columns, metadata):
+    sink = io.BytesIO()
+    schema = _schema(columns).with_metadata(metadata)
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.getvalue()
+        for i in range(0, len(rows), CHUNK_ROWS):
+            sink.seek(0)
+            sink.truncate()
+            writer.write_batch(pa.RecordBatch.from_pydict(_columns(rows[i:i + CHUNK_ROWS], columns), schema=schema))
+            yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    yield sink.getvalue()   # end-of-stream marker
+
+
+def render_rows(rows, fmt, kind='accounts', limit=None, cursor=None, headers=None):
+    """One list (``kind`` accounts or rings) of an analysis as a paged ``fmt`` response."""
+    rows, next_cursor = page(rows, limit, cursor)
+    headers = {**(headers or {}), 'X-Row-Count': str(len(rows))}
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    if fmt == 'json':
+        return FastJSONResponse({kind: rows, 'next_cursor': next_cursor}, headers=headers)
+    if fmt == 'ndjson':
+        return StreamingResponse(_ndjson(rows), media_type=MEDIA['ndjson'], headers=headers)
+    columns = ACCOUNT_COLUMNS if kind == 'accounts' else RING_COLUMNS
+    metadata = {k.lower(): v for k, v in headers.items()}
+    if fmt == 'arrow':
+        return StreamingResponse(_arrow(rows, columns, metadata), media_type=MEDIA['arrow'], headers=headers)
+    buf = io.BytesIO()
+    pq.write_table(_table(rows, columns, metadata), buf)
+    return Response(buf.getvalue(), media_type=MEDIA['parquet'], headers=headers)
+
+
+def render(out, fmt='json', limit=None):
+    """An analysis (``build_output`` shape) as ``fmt``; tabular formats carry its suspicious accounts."""
+    if fmt == 'json':
+        return FastJSONResponse(paged_output(out, limit))
+    headers = {'X-Total-Count': str(len(out['suspicious_accounts']))}
+    if 'analysis_id' in out:
+        headers['X-Analysis-Id'] = out['analysis_id']
+    return render_rows(out['suspicious_accounts'], fmt, 'accounts', limit, None, headers)
@@ -1,27 +1,230 @@
-import torch, numpy as np
+"""GraphSAGE embedding score: closeness of each scored account to the centroid of all of them.
+
+``GNN_MODE`` picks how the model is obtained:
+
+- ``infer`` (default): load the persisted weights and only run inference;
+  without usable weights the GNN is skipped and scores stay algorithmic.
+- ``finetune``: warm-start from the persisted weights, train, save.
+- ``train``: train from scratch, save.
+
+Training is unsupervised link prediction on mini-batches of edges, each
+with a neighbour-sampled subgraph (``FANOUT`` in-neighbours per hop), so
+memory is bounded by the batch, not the graph; it stops early once a fixed
+validation batch stops improving. Inference runs layer by layer over
+chunks of destination nodes for the same reason. Pretrain offline with
+``python -m gnn.anomaly_scorer transactions.csv``.
+"""
+import copy, logging, os, tempfile, threading, time
+import numpy as np
+import torch
 import torch.nn.functional as F
-from torch_geometric.utils import negative_sampling
 from .graph_sage import GraphSAGE
-from .feature_builder import build_pyg_graph
- 
-def compute_gnn_scores(G, df, scored, epochs=80):
-    data, idx = build_pyg_graph(G, df, scored)
-    model     = GraphSAGE(in_ch=data.x.shape[1])
-    opt       = torch.optim.Adam(model.parameters(), lr=0.005)
-    model.train()
-    for _ in range(epochs):
-        opt.zero_grad()
-        z = model(data.x, data.edge_index)
-        pos = (z[data.edge_index[0]]*z[data.edge_index[1]]).sum(1)
-        neg_ei = negative_sampling(data.edge_index, data.x.size(0))
-        neg = (z[neg_ei[0]]*z[neg_ei[1]]).sum(1)
-        loss = -torch.log(torch.sigmoid(pos)+1e-9).mean()\
-               -torch.log(1-torch.sigmoid(neg)+1e-9).mean()
-        loss.backward(); opt.step()
-    model.eval()
-    with torch.no_grad(): emb = model(data.x, data.edge_index).numpy()
-    flagged = [idx[n] for n in scored if n in idx]
-    if not flagged: return {}
-    centroid = emb[flagged].mean(0)
-    return {node: float(np.exp(-np.linalg.norm(emb[i]-centroid)/10))
-            for node,i in idx.items()}
+from .feature_builder import FEATURES, IN_CHANNELS, node_features, scored_rows
+from profiling import span
+
+MODE = os.environ.get('GNN_MODE', 'infer')
+MODEL_PATH = os.environ.get('GNN_MODEL_PATH', os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'mulenet', 'graphsage.pt'))
+THREADS = int(os.environ.get('GNN_THREADS', 0))   # torch intra-op threads; 0 keeps torch's default
+MAX_EPOCHS = 80
+PATIENCE = 5              # epochs without validation improvement before stopping
+BATCH_EDGES = 1024        # positive edges per step (plus as many sampled negatives)
+STEPS_PER_EPOCH = 32
+FANOUT = (10, 5)          # sampled in-neighbours per node: first hop, second hop
+VAL_EDGES = 2048
+INFER_CHUNK = 65536       # destination nodes per inference chunk
+LR = 0.005
+SEED = 0
+
+if THREADS > 0:
+    torch.set_num_threads(THREADS)
+
+log = logging.getLogger('mulenet')
+_model_lock = threading.Lock()
+_loaded = (None, None)    # (weights_version, model) of the persisted weights
+
+
+def _check(deadline):
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError('GNN deadline passed')
+
+
+# ── Weights ──────────────────────────────────────────────────────
+def weights_version(path=MODEL_PATH):
+    """Identifies the persisted weights (part of the GNN stage's cache key); None when absent."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f'{st.st_mtime_ns}-{st.st_size}'
+
+
+def save_model(model, path=MODEL_PATH):
+    """Write the weights atomically; concurrent savers each use their own temp file."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.graphsage-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            torch.save({'model': model.state_dict(), 'features': list(FEATURES), 'in_ch': IN_CHANNELS,
+                        'hidden': model.c1.out_channels, 'out_ch': model.c2.out_channels}, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_model(path=MODEL_PATH):
+    """Persisted model (cached per process until the file changes), or None if missing or stale."""
+    global _loaded
+    version = weights_version(path)
+    with _model_lock:
+        if version is None:
+            return None
+        if _loaded[0] != version:
+            state = torch.load(path, map_location='cpu', weights_only=True)
+            if list(state['features']) != list(FEATURES) or state['in_ch'] != IN_CHANNELS:
+                return None   # trained on another feature layout
+            model = GraphSAGE(in_ch=state['in_ch'], hidden=state['hidden'], out_ch=state['out_ch'])
+            model.load_state_dict(state['model'])
+            model.eval()
+            _loaded = (version, model)
+        return _loaded[1]
+
+
+# ── Training ─────────────────────────────────────────────────────
+def _sample(G, seeds, rng, fanout=FANOUT):
+    """Neighbour-sampled subgraph around ``seeds``: (sorted node ids, local edge_index).
+
+    Each frontier node draws ``k`` of its in-edges with replacement per hop;
+    SAGEConv aggregates in-neighbours, so that is all a seed's embedding uses.
+    """
+    nodes = frontier = np.unique(seeds)
+    src, dst = [], []
+    for k in fanout:
+        deg = G.in_ptr[frontier + 1] - G.in_ptr[frontier]
+        f, d = frontier[deg > 0], deg[deg > 0]
+        if len(f) == 0:
+            break
+        pick = (rng.random((len(f), k)) * d[:, None]).astype(np.int64)
+        e = G.in_edges[G.in_ptr[f][:, None] + pick].ravel()
+        src.append(G.edge_src[e]); dst.append(np.repeat(f, k))
+        frontier = np.setdiff1d(G.edge_src[e], nodes)
+        nodes = np.union1d(nodes, frontier)
+    if src:
+        pairs = np.unique(np.stack([np.concatenate(src), np.concatenate(dst)]), axis=1)
+    else:
+        pairs = np.zeros((2, 0), dtype=np.int64)
+    return nodes, torch.from_numpy(np.searchsorted(nodes, pairs))
+
+
+def _loss(model, x, G, edges, rng):
+    """Link-prediction loss for positive ``edges`` against as many random-tail negatives."""
+    s, d = G.edge_src[edges], G.edge_dst[edges]
+    neg = rng.integers(0, len(G), len(edges))
+    nodes, edge_index = _sample(G, np.concatenate((s, d, neg)), rng)
+    z = model(x[torch.from_numpy(nodes)], edge_index)
+    zs, zd, zn = (z[torch.from_numpy(np.searchsorted(nodes, a))] for a in (s, d, neg))
+    return -F.logsigmoid((zs * zd).sum(1)).mean() - F.logsigmoid(-(zs * zn).sum(1)).mean()
+
+
+def train(model, x, G, max_epochs=MAX_EPOCHS, patience=PATIENCE, deadline=None):
+    """Mini-batch training with early stopping; returns the best model seen.
+
+    Past ``deadline`` (a ``time.time()`` value) it raises TimeoutError.
+    """
+    torch.manual_seed(SEED)
+    rng = np.random.default_rng(SEED)
+    edges = rng.permutation(G.number_of_edges())
+    val = edges[:min(VAL_EDGES, len(edges) // 10)]
+    fit = edges[len(val):]
+    if len(fit) == 0:
+        return model.eval()
+    opt = torch.optim.Adam(model.parameters(), lr=LR)
+    best, best_state, stale = float('inf'), copy.deepcopy(model.state_dict()), 0
+    for _ in range(max_epochs):
+        with span('gnn.epoch', items=min(len(fit), BATCH_EDGES * STEPS_PER_EPOCH)):
+            model.train()
+            order = rng.permutation(fit)[:BATCH_EDGES * STEPS_PER_EPOCH]
+            for batch in np.array_split(order, -(-len(order) // BATCH_EDGES)):
+                _check(deadline)
+                opt.zero_grad()
+                loss = _loss(model, x, G, batch, rng)
+                loss.backward(); opt.step()
+            model.eval()
+            with torch.no_grad():
+                # Same negatives and neighbourhoods every epoch, so losses compare
+                score = _loss(model, x, G, val if len(val) else order[:BATCH_EDGES],
+                              np.random.default_rng(SEED + 1)).item()
+        if score < best - 1e-4:
+            best, best_state, stale = score, copy.deepcopy(model.state_dict()), 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+    model.load_state_dict(best_state)
+    return model.eval()
+
+
+# ── Inference ────────────────────────────────────────────────────
+@torch.no_grad()
+def embed(model, x, G, chunk=INFER_CHUNK, deadline=None):
+    """Full-graph embeddings, one layer at a time over chunks of destination nodes."""
+    n = len(G)
+    src = torch.from_numpy(G.edge_src[G.in_edges])   # edges grouped by destination
+    dst = G.edge_dst[G.in_edges]
+    h = x
+    for layer, conv in enumerate((model.c1, model.c2)):
+        out = []
+        for lo in range(0, n, chunk):
+            _check(deadline)
+            hi = min(n, lo + chunk)
+            a, b = G.in_ptr[lo], G.in_ptr[hi]
+            edge_index = torch.stack((src[a:b], torch.from_numpy(dst[a:b] - lo)))
+            out.append(conv((h, h[lo:hi]), edge_index, size=(n, hi - lo)))
+        h = torch.cat(out)
+        if layer == 0:
+            h = F.relu(h)
+    return h.numpy()
+
+
+def _model_for(x, G, mode, deadline=None):
+    """Model for this request; None in ``infer`` mode when there are no usable weights."""
+    if mode == 'infer':
+        model = load_model(MODEL_PATH)
+        if model is None:
+            log.warning('GNN skipped: no usable weights at %s (pretrain with python -m gnn.anomaly_scorer)',
+                        MODEL_PATH)
+        return model
+    base = load_model(MODEL_PATH) if mode == 'finetune' else None
+    model = train(copy.deepcopy(base) if base is not None else GraphSAGE(in_ch=x.shape[1]), x, G,
+                  deadline=deadline)
+    save_model(model, MODEL_PATH)   # only reached when training finished in time
+    return model
+
+
+def compute_gnn_scores(G, df, scored, features=None, mode=MODE, deadline=None):
+    """{account: score} for the scored accounts; TimeoutError past ``deadline``."""
+    rows, _ = scored_rows(G, scored)
+    if len(rows) == 0:
+        return {}
+    x = torch.from_numpy(node_features(G, scored, features))
+    model = _model_for(x, G, mode, deadline)
+    if model is None:
+        return {}
+    with span('gnn.inference', items=len(G)):
+        emb = embed(model, x, G, deadline=deadline)
+    centroid = emb[rows].mean(0)
+    dist = np.linalg.norm(emb[rows] - centroid, axis=1)
+    return dict(zip(G.accounts[rows].tolist(), np.exp(-dist / 10).tolist()))
+
+
+if __name__ == '__main__':
+    import sys
+    from ingest import read_transactions
+    from pipeline import STAGES, run_stages
+    r = run_stages([s for s in STAGES if s.name not in ('gnn', 'lifecycle')],
+                   {'df': read_transactions(sys.argv[1], sys.argv[1])})
+    x = torch.from_numpy(node_features(r['graph'], r['scoring'], r['features']))
+    _model_for(x, r['graph'], 'finetune' if MODE == 'finetune' else 'train')
+    print(f'Weights saved to {MODEL_PATH}')
@@ -1,21 +1,38 @@
-import torch, networkx as nx
+import numpy as np
+import torch
 from torch_geometric.data import Data
- 
-def build_pyg_graph(G, df, scored):
-    nodes = list(G.nodes())
-    idx   = {n:i for i,n in enumerate(nodes)}
-    bc    = nx.betweenness_centrality(G, normalized=True)
-    feats = []
-    for node in nodes:
-        mi = df[df['receiver_id']==node]['amount'].sum()
-        mo = df[df['sender_id']==node]['amount'].sum()
-        nt = len(df[(df['sender_id']==node)|(df['receiver_id']==node)])
-        pt = mo/mi if mi>0 else 0
-        feats.append([G.in_degree(node), G.out_degree(node), bc.get(node,0), pt,
-                      min(mi,1e9)/1e7, min(mo,1e9)/1e7, min(nt,1000)/100,
-                      1 if node in scored else 0,
-                      scored.get(node,{}).get('suspicion_score',0)/100])
-    edges = [(idx[u],idx[v]) for u,v in G.edges()]
-    if not edges: edges=[(0,0)]
-    return Data(x=torch.tensor(feats,dtype=torch.float),
-                edge_index=torch.tensor(edges,dtype=torch.long).t().contiguous()), idx
+from feature_store import build_feature_store
+
+FEATURES = ('in_counterparties', 'out_counterparties', 'betweenness', 'pass_through',
+            'money_in', 'money_out', 'tx_count')
+IN_CHANNELS = len(FEATURES) + 2  # + flagged, suspicion score
+
+
+def scored_rows(G, scored):
+    """Node rows of the accounts in ``scored`` (G.accounts is sorted) and their scores."""
+    ids = np.asarray(list(scored), dtype=object)
+    rows = np.searchsorted(G.accounts, ids) if len(ids) else np.zeros(0, dtype=np.int64)
+    found = rows < len(G)
+    found[found] = G.accounts[rows[found]] == ids[found]
+    scores = np.fromiter((v.get('suspicion_score', 0) for v in scored.values()), dtype=np.float64, count=len(ids))
+    return rows[found], scores[found]
+
+
+def node_features(G, scored, features=None):
+    """(nodes, IN_CHANNELS) float32 matrix built from the shared feature store in one pass."""
+    if features is None:
+        features = build_feature_store(G)
+    in_deg, out_deg, bc, pt, mi, mo, nt = features.get(*FEATURES)
+    rows, scores = scored_rows(G, scored)
+    flag, score = np.zeros(len(G)), np.zeros(len(G))
+    flag[rows], score[rows] = 1, scores / 100
+    return np.column_stack([in_deg, out_deg, bc, pt,
+                            np.minimum(mi, 1e9)/1e7, np.minimum(mo, 1e9)/1e7,
+                            np.minimum(nt, 1000)/100, flag, score]).astype(np.float32)
+
+
+def build_pyg_graph(G, df, scored, features=None):
+    """Full-graph PyG ``Data`` (node features + every edge), for ad-hoc use outside the scorer."""
+    edges = np.vstack([G.edge_src, G.edge_dst]) if G.number_of_edges() else np.zeros((2, 1))
+    return Data(x=torch.from_numpy(node_features(G, scored, features)),
+                edge_index=torch.tensor(edges, dtype=torch.long).contiguous()), G.index
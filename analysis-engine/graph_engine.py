@@ -1,23 +1,228 @@
-import networkx as nx
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+class TxGraph:
+    """Compact, array-backed directed transaction graph.
+
+    Accounts are integer-encoded: node ``i`` is ``accounts[i]``. Transactions
+    are sorted by (sender, receiver, timestamp) so every edge ``e`` owns the
+    contiguous slice ``tx_ptr[e]:tx_ptr[e+1]`` of the ``tx_*`` columns.
+    Edges are sorted by (src, dst), so ``out_ptr`` is a CSR offset array over
+    them; ``in_ptr``/``in_edges`` give the matching CSC view.
+    Timestamps are int64 nanoseconds since the epoch.
+    """
+
+    def __init__(self, accounts, tx_src, tx_dst, tx_amount, tx_ts, tx_id):
+        self.accounts = accounts
+        self.tx_src, self.tx_dst = tx_src, tx_dst
+        self.tx_amount, self.tx_ts, self.tx_id = tx_amount, tx_ts, tx_id
+        n = len(accounts)
+
+        # ── Edges: one per distinct (src, dst) run in the sorted tx columns ──
+        if len(tx_src):
+            new_edge = np.empty(len(tx_src), dtype=bool)
+            new_edge[0] = True
+            new_edge[1:] = (tx_src[1:] != tx_src[:-1]) | (tx_dst[1:] != tx_dst[:-1])
+            starts = np.flatnonzero(new_edge)
+        else:
+            starts = np.zeros(0, dtype=np.int64)
+        self.tx_ptr = np.append(starts, len(tx_src)).astype(np.int64)
+        self.edge_src = tx_src[starts]
+        self.edge_dst = tx_dst[starts]
+        self.edge_count = np.diff(self.tx_ptr)
+        self.edge_amount = np.add.reduceat(tx_amount, starts) if len(starts) else np.zeros(0)
+        self.edge_first_ts = np.minimum.reduceat(tx_ts, starts) if len(starts) else np.zeros(0, np.int64)
+        self.edge_last_ts = np.maximum.reduceat(tx_ts, starts) if len(starts) else np.zeros(0, np.int64)
+
+        # ── CSR (out) and CSC (in) offsets over edges ──
+        self.out_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.edge_src, minlength=n), out=self.out_ptr[1:])
+        self.in_edges = np.argsort(self.edge_dst, kind='stable')
+        self.in_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.edge_dst, minlength=n), out=self.in_ptr[1:])
+
+        self._index = None
+        self._nx = None
+        self.cache = {}  # per-analysis memo for values derived from this graph
+
+    def __getstate__(self):
+        # Pickle the columns and plain-array memos (e.g. centrality); indexes,
+        # feature stores and the NetworkX view are rebuilt on demand
+        state = dict(self.__dict__, _index=None, _nx=None)
+        state['cache'] = {k: v for k, v in list(self.cache.items()) if isinstance(v, np.ndarray)}
+        return state
+
+    # ── NetworkX-style accessors ─────────────────────────────────
+    def number_of_nodes(self):
+        return len(self.accounts)
+
+    def number_of_edges(self):
+        return len(self.edge_src)
+
+    def nodes(self):
+        return self.accounts.tolist()
+
+    def __len__(self):
+        return len(self.accounts)
+
+    @property
+    def index(self):
+        """Account id → node index."""
+        if self._index is None:
+            self._index = {acc: i for i, acc in enumerate(self.accounts.tolist())}
+        return self._index
+
+    @property
+    def out_degree(self):
+        return np.diff(self.out_ptr)
+
+    @property
+    def in_degree(self):
+        return np.diff(self.in_ptr)
+
+    def successors(self, i):
+        return self.edge_dst[self.out_ptr[i]:self.out_ptr[i + 1]]
+
+    def predecessors(self, i):
+        return self.edge_src[self.in_edges[self.in_ptr[i]:self.in_ptr[i + 1]]]
+
+    def edge_id(self, u, v):
+        """Edge index for node indices ``u → v``, or -1 if absent."""
+        lo, hi = self.out_ptr[u], self.out_ptr[u + 1]
+        k = lo + np.searchsorted(self.edge_dst[lo:hi], v)
+        return int(k) if k < hi and self.edge_dst[k] == v else -1
+
+    def has_edge(self, src, dst):
+        idx = self.index
+        return src in idx and dst in idx and self.edge_id(idx[src], idx[dst]) >= 0
+
+    def edge_slice(self, e):
+        return slice(self.tx_ptr[e], self.tx_ptr[e + 1])
+
+    def to_networkx(self):
+        """NetworkX view with the legacy ``transactions``/``total_amount`` edge attrs."""
+        if self._nx is not None:
+            return self._nx
+        import networkx as nx   # only this legacy view needs it
+        G = nx.DiGraph()
+        G.add_nodes_from(self.accounts.tolist())
+        accs = self.accounts
+        amounts = self.tx_amount.tolist()
+        stamps = pd.to_datetime(self.tx_ts).tolist()
+        tx_ids = self.tx_id.tolist()
+        ptr = self.tx_ptr.tolist()
+        G.add_edges_from(
+            (accs[s], accs[d], {
+                'transactions': [{'amount': amounts[k], 'timestamp': stamps[k], 'tx_id': tx_ids[k]}
+                                 for k in range(ptr[e], ptr[e + 1])],
+                'total_amount': total,
+            })
+            for e, (s, d, total) in enumerate(zip(self.edge_src.tolist(), self.edge_dst.tolist(),
+                                                  self.edge_amount.tolist())))
+        self._nx = G
+        return G
+
+
+def to_ns(ts):
+    """Timestamp column → int64 nanoseconds, whatever resolution pandas parsed it at."""
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts)
+    return ts.values.astype('datetime64[ns]').view('int64')
+
 
 def build_graph(df):
-    G = nx.DiGraph()
-    # Add all unique nodes at once
-    all_accounts = set(df['sender_id'].tolist() + df['receiver_id'].tolist())
-    G.add_nodes_from(all_accounts)
-
-    # Group by (sender, receiver) pairs for bulk edge creation
-    grouped = df.groupby(['sender_id', 'receiver_id'])
-    for (s, r), group in grouped:
-        txs = group.apply(
-            lambda row: {
-                'amount': row['amount'],
-                'timestamp': row['timestamp'],
-                'tx_id': row['transaction_id']
-            }, axis=1
-        ).tolist()
-        G.add_edge(s, r,
-                   transactions=txs,
-                   total_amount=group['amount'].sum())
-    return G
\ No newline at end of file
+    # Integer-encode every account appearing on either side
+    n = len(df)
+    s, r = df['sender_id'], df['receiver_id']
+    if isinstance(s.dtype, pd.CategoricalDtype) and isinstance(r.dtype, pd.CategoricalDtype):
+        # Compact ingestion already dictionary-encoded the IDs; just align the two
+        both = union_categoricals([s, r], sort_categories=True,
+                                  ignore_order=True).remove_unused_categories()
+        codes, accounts = both.codes.astype(np.int64), both.categories
+    else:
+        codes, accounts = pd.factorize(pd.concat([s, r], ignore_index=True), sort=True)
+    src, dst = codes[:n], codes[n:]
+    ts = to_ns(df['timestamp'])
+
+    # Sort by (src, dst, ts) so edges and their transactions are contiguous
+    order = np.lexsort((ts, dst, src))
+    return TxGraph(
+        accounts=np.asarray(accounts, dtype=object),
+        tx_src=src[order], tx_dst=dst[order],
+        tx_amount=df['amount'].to_numpy(dtype=np.float64)[order],
+        tx_ts=ts[order],
+        tx_id=df['transaction_id'].to_numpy(dtype=object)[order],
+    )
+
+
+def graph_from_codes(names, src, dst, amount, ts, tx_id):
+    """``build_graph`` for dictionary-encoded columns: row ``i`` is ``names[src[i]]`` → ``names[dst[i]]``.
+
+    Only accounts that appear are kept, renumbered in sorted order.
+    """
+    n = len(src)
+    used, codes = np.unique(np.concatenate((src, dst)), return_inverse=True)
+    accounts = np.asarray(names[used], dtype=object)
+    order_names = np.argsort(accounts, kind='stable')
+    rank = np.empty(len(order_names), dtype=np.int64)
+    rank[order_names] = np.arange(len(order_names))
+    codes = rank[codes]
+    src, dst = codes[:n], codes[n:]
+    order = np.lexsort((ts, dst, src))
+    return TxGraph(accounts=accounts[order_names], tx_src=src[order], tx_dst=dst[order],
+                   tx_amount=amount[order], tx_ts=ts[order], tx_id=tx_id[order])
+
+
+_KEY = np.dtype([('src', np.int64), ('dst', np.int64), ('ts', np.int64)])
+
+
+def _keys(src, dst, ts):
+    keys = np.empty(len(src), dtype=_KEY)
+    keys['src'], keys['dst'], keys['ts'] = src, dst, ts
+    return keys
+
+
+def extend_graph(G, df):
+    """Append ``df``'s transactions to ``G``; returns (new graph, remap, new_rows).
+
+    Accounts stay sorted, so the result is identical to ``build_graph`` over
+    all transactions. ``remap[i]`` is old node ``i``'s index in the new graph
+    and ``new_rows`` are the appended transactions' rows in its tx columns.
+    Only the batch is sorted; it is merged into the already sorted columns,
+    so an append costs O(total) copying plus O(batch log batch).
+    """
+    if G is None or len(G.tx_src) == 0:
+        H = build_graph(df)
+        return H, np.zeros(0, dtype=np.int64), np.arange(len(H.tx_src))
+    ids = pd.Index(G.accounts)
+    s, r = df['sender_id'].astype(str).to_numpy(object), df['receiver_id'].astype(str).to_numpy(object)
+    accounts = ids.union(pd.Index(pd.unique(np.concatenate((s, r)))))
+    remap = accounts.get_indexer(ids).astype(np.int64)
+    src, dst, ts = accounts.get_indexer(s).astype(np.int64), accounts.get_indexer(r).astype(np.int64), \
+        to_ns(df['timestamp'])
+    order = np.lexsort((ts, dst, src))
+    src, dst, ts = src[order], dst[order], ts[order]
+
+    # remap is increasing, so the old rows stay sorted; new rows go after equal old ones
+    old_src, old_dst = remap[G.tx_src], remap[G.tx_dst]
+    at = np.searchsorted(_keys(old_src, old_dst, G.tx_ts), _keys(src, dst, ts), side='right')
+    rows = at + np.arange(len(at))
+    total = len(G.tx_src) + len(rows)
+    is_new = np.zeros(total, dtype=bool)
+    is_new[rows] = True
+
+    def merged(old, new, dtype):
+        out = np.empty(total, dtype=dtype)
+        out[~is_new], out[rows] = old, new
+        return out
+
+    H = TxGraph(
+        accounts=np.asarray(accounts, dtype=object),
+        tx_src=merged(old_src, src, np.int64), tx_dst=merged(old_dst, dst, np.int64),
+        tx_amount=merged(G.tx_amount, df['amount'].to_numpy(dtype=np.float64)[order], np.float64),
+        tx_ts=merged(G.tx_ts, ts, np.int64),
+        tx_id=merged(G.tx_id, df['transaction_id'].to_numpy(dtype=object)[order], object),
+    )
+    return H, remap, rows
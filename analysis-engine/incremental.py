@@ -0,0 +1,145 @@
+import threading, time
+import numpy as np
+
+from graph_engine import extend_graph
+from account_index import AccountIndex, build_account_index
+from feature_store import build_feature_store
+from detectors.cycle_detector import iter_cycles, touching_edges, assemble_rings
+from detectors.smurfing_detector import detect_smurfing
+from detectors.benford_detector import benford_analysis
+from output_builder import build_output
+from pipeline import STAGES, run_stages
+
+# Per-account running totals, kept aligned with the graph and handed to the feature store
+TOTALS = ('money_in', 'money_out', 'in_count', 'out_count', 'first_ts', 'last_ts')
+_FILL = {'first_ts': np.iinfo(np.int64).max, 'last_ts': np.iinfo(np.int64).min}
+
+
+class Stream:
+    """Append-only analysis state for one transaction feed.
+
+    Each batch is merged into the graph (O(total) copying, no re-sort) and
+    updates only what it can change: running per-account totals, smurfing
+    and Benford results for the accounts it touches, and rings through its
+    transactions. Shell centrality, whitelisting, scoring and lifecycle
+    depend on the whole graph and re-run over every account at snapshot
+    time; a snapshot matches a full analysis of everything appended so far.
+    """
+
+    def __init__(self):
+        self.G = None
+        self.tx_ids = set()
+        self.totals = {name: np.zeros(0, dtype=np.int64 if name in _FILL or 'count' in name else np.float64)
+                       for name in TOTALS}
+        self.rings = {}                  # canonical member rotation → ring record from iter_cycles
+        self.smurfing, self.benford = {}, {}
+        self.batches = 0
+        self.lock = threading.Lock()
+        self._snapshot = None
+
+    def append(self, df):
+        """Add a cleaned batch (duplicate transaction_ids are skipped); returns batch stats."""
+        with self.lock:
+            t = time.perf_counter()
+            ids = df['transaction_id'].tolist()
+            seen = self.tx_ids
+            fresh = np.fromiter((i not in seen for i in ids), dtype=bool, count=len(ids)) & \
+                ~df['transaction_id'].duplicated().to_numpy()
+            df = df[fresh]
+            stats = {'received': int(len(fresh)), 'appended': int(len(df)),
+                     'duplicates': int(len(fresh) - len(df))}
+            if len(df):
+                self.tx_ids.update(df['transaction_id'].tolist())
+                G, remap, rows = extend_graph(self.G, df)
+                self._update_totals(G, remap, rows)
+                touched = np.unique(np.concatenate((G.tx_src[rows], G.tx_dst[rows])))
+                self._update_accounts(G, touched)
+                found = self._update_rings(G, rows)
+                self.G, self._snapshot = G, None
+                self.batches += 1
+                stats.update(affected_accounts=int(len(touched)), rings_rechecked=found)
+            stats.update(self.describe(), seconds=round(time.perf_counter() - t, 3))
+            return stats
+
+    def _update_totals(self, G, remap, rows):
+        n = len(G)
+        src, dst, amount, ts = G.tx_src[rows], G.tx_dst[rows], G.tx_amount[rows], G.tx_ts[rows]
+        for name, old in self.totals.items():
+            col = np.full(n, _FILL.get(name, 0), dtype=old.dtype)
+            col[remap] = old
+            self.totals[name] = col
+        t = self.totals
+        t['money_in'] += np.bincount(dst, weights=amount, minlength=n)
+        t['money_out'] += np.bincount(src, weights=amount, minlength=n)
+        t['in_count'] += np.bincount(dst, minlength=n)
+        t['out_count'] += np.bincount(src, minlength=n)
+        for side in (src, dst):
+            np.minimum.at(t['first_ts'], side, ts)
+            np.maximum.at(t['last_ts'], side, ts)
+
+    def _update_accounts(self, G, touched):
+        # Both detectors are per-account: re-run them on the touched accounts' full history
+        index = AccountIndex(G, accounts=touched)
+        smurfing, benford = detect_smurfing(G, None, index=index), benford_analysis(G, None, index=index)
+        for acc in G.accounts[touched].tolist():
+            self.smurfing.pop(acc, None)
+            self.benford.pop(acc, None)
+        self.smurfing.update(smurfing)
+        self.benford.update(benford)
+
+    def _update_rings(self, G, rows):
+        found = 0
+        for ring in iter_cycles(G, edges=touching_edges(G, rows)):
+            # A new transaction can make the ring closable from an earlier member
+            m = ring['members']
+            k = m.index(min(m))
+            self.rings[tuple(m[k:] + m[:k])] = ring
+            found += 1
+        return found
+
+    def describe(self):
+        return {'batches': self.batches,
+                'total_transactions': len(self.G.tx_src) if self.G is not None else 0,
+                'total_accounts': len(self.G) if self.G is not None else 0,
+                'rings': len(self.rings)}
+
+    def snapshot(self):
+        """``build_output`` of everything appended so far; reused until the next append."""
+        with self.lock:
+            if self._snapshot is None:
+                self._snapshot = self._build()
+            return self._snapshot
+
+    def _build(self):
+        start = time.time()
+        cycles = assemble_rings(self.rings.values())
+        if self.G is None:
+            return build_output({}, [], None, time.time() - start, total_accounts=0)
+        G = self.G
+        index = build_account_index(G)
+        features = build_feature_store(G, index)
+        t = self.totals
+        features.preset(money_in=t['money_in'], money_out=t['money_out'], in_count=t['in_count'],
+                        out_count=t['out_count'], first_ts=t['first_ts'], last_ts=t['last_ts'])
+        r = run_stages(STAGES, {'df': None, 'graph': G, 'index': index, 'features': features,
+                                'cycles': cycles, 'smurfing': self.smurfing, 'benford': self.benford})
+        return build_output(r['lifecycle'], r['rings']['rings'], None, time.time() - start,
+                            total_accounts=G.number_of_nodes())
+
+
+class StreamRegistry:
+    """Named in-process streams, created on first append."""
+
+    def __init__(self):
+        self.streams = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, create=False):
+        with self._lock:
+            if name not in self.streams and create:
+                self.streams[name] = Stream()
+            return self.streams.get(name)
+
+    def drop(self, name):
+        with self._lock:
+            return self.streams.pop(name, None)
@@ -0,0 +1,170 @@
+import asyncio, os, tempfile
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Parquet / Arrow IPC support is optional — CSV never needs pyarrow
+try:
+    import pyarrow as pa, pyarrow.ipc, pyarrow.parquet
+    ARROW_ENABLED = True
+except ImportError:
+    ARROW_ENABLED = False
+
+REQUIRED = ['transaction_id', 'sender_id', 'receiver_id', 'amount', 'timestamp']
+SPOOL_CHUNK = 1 << 20        # bytes copied from the upload per read
+CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 200_000))
+AMOUNT_DTYPE = os.environ.get('INGEST_AMOUNT_DTYPE', 'float64')  # float32 halves memory
+MAX_ERRORS = 50              # row-level errors reported before giving up
+
+
+class IngestError(ValueError):
+    """Upload rejected before analysis; ``errors`` lists the offending rows."""
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)[:MAX_ERRORS]
+
+    def to_dict(self):
+        return {'error': 'Invalid upload', 'message': str(self), 'rows': self.errors}
+
+
+async def spool_upload(file, chunk=SPOOL_CHUNK, hasher=None):
+    """Copy an UploadFile to a temp file without holding the body in memory.
+
+    ``hasher`` (e.g. ``hashlib.sha256()``) is fed the bytes on the way through.
+    """
+    tmp = tempfile.NamedTemporaryFile(prefix='mulenet-', delete=False)
+    try:
+        while data := await file.read(chunk):
+            tmp.write(data)
+            if hasher is not None:
+                hasher.update(data)
+    finally:
+        tmp.close()
+    return tmp.name
+
+
+def sniff_format(path, filename=''):
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head[:4] == b'PAR1':
+        return 'parquet'
+    if head[:6] == b'ARROW1':
+        return 'arrow'
+    if head[:4] == b'\xff\xff\xff\xff' or filename.endswith(('.arrows', '.ipc')):
+        return 'arrow_stream'
+    return 'csv'
+
+
+def _clean(chunk, first_row):
+    """Coerce one chunk to compact dtypes; returns (frame, row-level errors).
+
+    Row numbers are 1-based data rows (the CSV header is not counted).
+    """
+    errors = []
+    rows = np.arange(first_row, first_row + len(chunk))
+
+    def reject(mask, column, reason):
+        for r, v in zip(rows[mask][:MAX_ERRORS], chunk[column].to_numpy()[mask][:MAX_ERRORS]):
+            errors.append({'row': int(r), 'column': column, 'value': None if pd.isna(v) else str(v),
+                           'error': reason})
+
+    out = {}
+    for col in ('transaction_id', 'sender_id', 'receiver_id'):
+        s = chunk[col]
+        missing = s.isna().to_numpy() | (s.astype(str).str.strip() == '').to_numpy()
+        reject(missing, col, 'missing id')
+        out[col] = s.astype(str) if col == 'transaction_id' else s.astype(str).astype('category')
+
+    amount = pd.to_numeric(chunk['amount'], errors='coerce')
+    reject(~np.isfinite(amount.to_numpy(dtype=np.float64, na_value=np.nan)), 'amount', 'not a finite number')
+    out['amount'] = amount.astype(AMOUNT_DTYPE)
+
+    ts = chunk['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        # utc=True: rows may carry different offsets; naive values are taken as UTC already
+        raw, ts = ts, pd.to_datetime(ts, errors='coerce', utc=True)
+        # Format is inferred from the first value; retry the rest one by one
+        retry = ts.isna() & raw.notna()
+        if retry.any():
+            ts[retry] = pd.to_datetime(raw[retry], errors='coerce', utc=True, format='mixed')
+    if getattr(ts.dt, 'tz', None) is not None:
+        ts = ts.dt.tz_convert(None)
+    reject(ts.isna().to_numpy(), 'timestamp', 'unparseable timestamp')
+    out['timestamp'] = ts.astype('datetime64[ns]')
+    return pd.DataFrame(out), errors
+
+
+def _concat(frames):
+    """Concatenate cleaned chunks, unioning categories instead of falling back to object."""
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype='float64' if c == 'amount' else 'datetime64[ns]'
+                                          if c == 'timestamp' else 'category') for c in REQUIRED})
+    cols = {}
+    for c in REQUIRED:
+        parts = [f[c] for f in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            cols[c] = pd.Series(union_categoricals(parts, ignore_order=True))
+        else:
+            cols[c] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(cols)
+
+
+def _batches(path, fmt):
+    """Raw DataFrame chunks with only the required columns."""
+    if fmt == 'csv':
+        header = pd.read_csv(path, nrows=0).columns
+        _check_columns(header)
+        yield from pd.read_csv(path, usecols=REQUIRED, chunksize=CHUNK_ROWS,
+                               dtype={'transaction_id': str, 'sender_id': str, 'receiver_id': str,
+                                      'amount': str, 'timestamp': str},
+                               keep_default_na=False, na_values=[''])
+        return
+    if not ARROW_ENABLED:
+        raise IngestError(f'{fmt} uploads need pyarrow installed')
+    if fmt == 'parquet':
+        pf = pa.parquet.ParquetFile(path, memory_map=True)
+        _check_columns(pf.schema_arrow.names)
+        for batch in pf.iter_batches(batch_size=CHUNK_ROWS, columns=REQUIRED):
+            yield batch.to_pandas()
+        return
+    source = pa.memory_map(path)
+    reader = pa.ipc.open_file(source) if fmt == 'arrow' else pa.ipc.open_stream(source)
+    _check_columns(reader.schema.names)
+    batches = (reader.get_batch(i) for i in range(reader.num_record_batches)) if fmt == 'arrow' else reader
+    for batch in batches:
+        yield batch.select(REQUIRED).to_pandas()
+
+
+def _check_columns(names):
+    missing = [c for c in REQUIRED if c not in set(names)]
+    if missing:
+        raise IngestError(f'Missing required columns: {", ".join(missing)}')
+
+
+def read_transactions(path, filename=''):
+    """Parse a CSV / Parquet / Arrow IPC file chunk by chunk into compact dtypes.
+
+    Raises IngestError at the first chunk containing malformed rows.
+    """
+    fmt = sniff_format(path, filename)
+    frames, first_row = [], 1
+    try:
+        for raw in _batches(path, fmt):
+            frame, errors = _clean(raw, first_row)
+            if errors:
+                raise IngestError(f'{len(errors)} malformed row(s) near row {errors[0]["row"]}', errors)
+            frames.append(frame)
+            first_row += len(raw)
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise IngestError(f'Could not parse {fmt} upload: {e}') from e
+    return _concat(frames)
+
+
+async def read_upload(file):
+    """Spool an UploadFile to disk, then parse it off the event loop."""
+    path = await spool_upload(file)
+    try:
+        return await asyncio.to_thread(read_transactions, path, file.filename or '')
+    finally:
+        os.unlink(path)
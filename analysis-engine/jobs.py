@@ -0,0 +1,226 @@
+import asyncio, hashlib, json, os, threading, time, uuid
+from itertools import islice
+
+from ingest import spool_upload, IngestError
+from pipeline import analyze_file, provisional_scores, PipelineCancelled, STAGES, CONCURRENCY
+from subgraph import register
+from profiling import profiled
+
+WORKERS = int(os.environ.get('JOB_WORKERS', 2))          # analyses running at once
+QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 8))    # accepted but not yet started
+TTL_SECS = int(os.environ.get('JOB_TTL_SECONDS', 3600))  # finished jobs kept this long
+PARTIAL_TOP = int(os.environ.get('JOB_PARTIAL_TOP', 500))  # accounts per partial event
+
+DEPS = {s.name: [d for d in s.deps if d != 'df'] for s in STAGES}
+PARTIAL_STAGES = ('cycles', 'rings', 'smurfing', 'shells', 'benford', 'whitelist', 'scoring')
+TERMINAL = ('done', 'failed', 'cancelled')
+
+# Per-stage progress counters reported in the job status
+COUNTS = {
+    'ingest': lambda df: {'rows': len(df)} if df is not None else {'graph_cached': True},
+    'graph': lambda G: {'accounts': G.number_of_nodes(), 'edges': G.number_of_edges()},
+    'cycles': lambda c: {'cycles': len(c['rings']), 'accounts': len(c['accounts'])},
+    'rings': lambda r: {'rings': len(r['rings']), 'accounts': len(r['index'])},
+    'smurfing': lambda r: {'accounts': len(r)},
+    'shells': lambda r: {'accounts': len(r)},
+    'benford': lambda r: {'violations': sum(1 for b in r.values() if b['pattern'])},
+    'whitelist': lambda r: {'accounts': len(r)},
+    'scoring': lambda r: {'suspicious': len(r)},
+}
+
+
+class JobQueueFull(Exception):
+    """Every worker is busy and the queue is at QUEUE_SIZE."""
+
+
+class Job:
+    """One queued analysis: ingest + pipeline on a worker thread, observed from the event loop.
+
+    Progress is kept in ``stages``; ``events`` is the append-only log that
+    ``stream()`` replays, with partial ``suspicious_accounts`` after each
+    detector and the full ``build_output`` result at the end.
+    """
+
+    def __init__(self, path, filename, digest, concurrency, loop):
+        self.id = uuid.uuid4().hex
+        self.path, self.filename, self.digest, self.concurrency = path, filename, digest, concurrency
+        self.status = 'queued'
+        self.stages = {name: {'status': 'pending'} for name in ['ingest', *DEPS]}
+        self.result = self.error = self.profile = None
+        self.created_at, self.started_at, self.finished_at = time.time(), None, None
+        self.cancel = threading.Event()
+        self.events = []
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    # ── Event log (appended on the loop thread only) ────────────
+    def _append(self, event):
+        self.events.append(event)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, event):
+        self._loop.call_soon_threadsafe(self._append, event)
+
+    async def stream(self):
+        """NDJSON lines: every event so far, then new ones until the job ends."""
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.events):
+                yield json.dumps(self.events[i]) + '\n'
+                i += 1
+            if self.events and self.events[-1]['event'] in TERMINAL:
+                return
+            await changed.wait()
+
+    # ── Worker side ─────────────────────────────────────────────
+    def _finish_stage(self, name, secs, counts=None):
+        self.stages[name] = {'status': 'done', 'seconds': round(secs, 3), **({'counts': counts} if counts else {})}
+        for other, deps in DEPS.items():
+            if self.stages[other]['status'] == 'pending' and all(
+                    self.stages[d]['status'] == 'done' for d in deps + ['ingest']):
+                self.stages[other]['status'] = 'running'
+
+    def _end(self, status, **event):
+        self.status, self.finished_at = status, time.time()
+        self.publish({'event': status, **event})
+
+    def run(self):
+        if self.cancel.is_set():
+            return
+        self.status, self.started_at = 'running', time.time()
+        self.stages['ingest']['status'] = 'running'
+        results = {}
+
+        def on_stage(name, result, secs):
+            results['df' if name == 'ingest' else name] = result
+            counts = COUNTS[name](result) if name in COUNTS else None
+            self._finish_stage(name, secs, counts)
+            event = {'event': 'stage', 'stage': name, 'seconds': round(secs, 3)}
+            if counts:
+                event['counts'] = counts
+            if name in PARTIAL_STAGES:
+                scored = result if name == 'scoring' else provisional_scores(results)
+                if scored is not None:
+                    event['provisional'] = name != 'scoring'
+                    event['suspicious_total'] = len(scored)
+                    event['suspicious_accounts'] = [{
+                        'account_id': v['account_id'],
+                        'suspicion_score': v['suspicion_score'],
+                        'detected_patterns': list(v['detected_patterns']),
+                        'ring_id': v['ring_id'],
+                    } for v in islice(scored.values(), PARTIAL_TOP)]
+            self.publish(event)
+
+        try:
+            with profiled() as self.profile:
+                self.result, r = analyze_file(self.path, self.filename, self.digest,
+                                              self.concurrency, on_stage, self.cancel)
+            self.result = register(self.result, r, self.digest)
+            if r is None:
+                for stage in self.stages.values():
+                    stage.update(status='done', cached=True)
+            self._end('done', result=self.result)
+        except PipelineCancelled:
+            self._end('cancelled')
+        except IngestError as e:
+            self.error = e.to_dict()
+            self._end('failed', error=self.error)
+        except Exception as e:
+            self.error = {'error': 'Analysis failed', 'message': str(e)}
+            self._end('failed', error=self.error)
+        finally:
+            self._discard_upload()
+
+    def _discard_upload(self):
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+        self.path = None
+
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': round(end - self.started_at, 2) if self.started_at else None,
+            'stages': self.stages,
+            **({'timings': self.profile.to_dict()['spans']} if self.profile else {}),
+            **({'error': self.error} if self.error else {}),
+        }
+
+
+class JobManager:
+    """Bounded local job runner: WORKERS analyses at a time, QUEUE_SIZE waiting, no broker."""
+
+    def __init__(self, workers=WORKERS, queue_size=QUEUE_SIZE, ttl=TTL_SECS):
+        self.workers, self.queue_size, self.ttl = workers, queue_size, ttl
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for job in self.jobs.values():
+            job.cancel.set()
+        for task in self._tasks:
+            task.cancel()
+
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    async def submit(self, file, concurrency=CONCURRENCY):
+        self._prune()
+        # Refuse before spooling so a full queue costs no disk
+        if self._queue.full():
+            raise JobQueueFull()
+        digest = hashlib.sha256()
+        path = await spool_upload(file, hasher=digest)
+        job = Job(path, file.filename or '', digest.hexdigest(), concurrency, asyncio.get_running_loop())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            job._discard_upload()
+            raise JobQueueFull()
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; a finished job is dropped instead."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status in TERMINAL:
+            del self.jobs[job_id]
+        elif job.status == 'queued':
+            job.cancel.set()
+            job._discard_upload()
+            job._end('cancelled')
+        else:
+            job.cancel.set()
+            job.status = 'cancelling'
+        return job
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await asyncio.to_thread(job.run)
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
@@ -1,42 +1,41 @@
 import pandas as pd
+from feature_store import build_feature_store
+from graph_engine import build_graph
 
-def classify_lifecycle_batch(scored, df, money_in=None, money_out=None):
-    """Classify lifecycle stage for all scored accounts in one pass."""
-    # Ensure timestamps are parsed
-    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+FEATURES = ('money_in', 'money_out', 'tx_count', 'last_ts')
 
-    if money_in is None:
-        money_in = df.groupby('receiver_id')['amount'].sum().to_dict()
-    if money_out is None:
-        money_out = df.groupby('sender_id')['amount'].sum().to_dict()
+def classify_lifecycle_batch(scored, df, G=None, features=None, timeline=None):
+    """Classify lifecycle stage for all scored accounts in one pass.
 
-    ts_min = df['timestamp'].min()
-    ts_max = df['timestamp'].max()
-    span = (ts_max - ts_min).total_seconds()
+    ``timeline`` is the (first, last) timestamp of the whole dataset when
+    ``G`` only holds part of it, e.g. one shard.
+    """
+    if G is None:
+        G = build_graph(df)
+    if features is None:
+        features = build_feature_store(G)
+    money_in, money_out, tx_count, last_ts = features.get(*FEATURES)
 
-    last_send = df.groupby('sender_id')['timestamp'].max().to_dict()
-    last_recv = df.groupby('receiver_id')['timestamp'].max().to_dict()
-    tx_count_send = df.groupby('sender_id').size().to_dict()
-    tx_count_recv = df.groupby('receiver_id').size().to_dict()
+    if timeline is not None:
+        ts_min, ts_max = timeline
+    else:
+        ts_min = G.tx_ts.min() if len(G.tx_ts) else 0
+        ts_max = G.tx_ts.max() if len(G.tx_ts) else 0
+    span = ts_max - ts_min
 
     for acc_id in scored:
-        mi = money_in.get(acc_id, 0)
-        mo = money_out.get(acc_id, 0)
-        last_s = last_send.get(acc_id, pd.Timestamp.min)
-        last_r = last_recv.get(acc_id, pd.Timestamp.min)
-        last = max(last_s, last_r)
-        tx_count = tx_count_send.get(acc_id, 0) + tx_count_recv.get(acc_id, 0)
+        i = G.index.get(acc_id)
 
         # No transactions → unknown
-        if tx_count == 0:
+        if i is None or tx_count[i] == 0:
             scored[acc_id]['lifecycle_stage'] = 'Unknown'
             continue
+        mi, mo = money_in[i], money_out[i]
 
-        last_pct = (last - ts_min).total_seconds() / span if span > 0 else 1
+        last_pct = (last_ts[i] - ts_min) / span if span > 0 else 1
 
         # Stage 4: Dormant — last activity early AND has some history
-        if last_pct < 0.70 and tx_count > 3:
+        if last_pct < 0.70 and tx_count[i] > 3:
             scored[acc_id]['lifecycle_stage'] = 'Stage 4: Dormant/Burned Mule'
         # Stage 3: Cash-Out — receives money but sends very little out
         elif mi > 0 and mo / mi < 0.15:
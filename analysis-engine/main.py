@@ -1,100 +1,310 @@
-from fastapi import FastAPI, UploadFile, File
+from startup import STARTUP
+STARTUP.record_imports()   # timed one by one for /health; the GNN stack loads on first use
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Query, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import pandas as pd, io, time
-
-from graph_engine import build_graph
-from detectors.cycle_detector import detect_cycles
-from detectors.smurfing_detector import detect_smurfing
-from detectors.shell_detector import detect_shells
-from detectors.benford_detector import benford_analysis
-from false_positive import apply_whitelist
-from scoring import compute_scores
-from lifecycle import classify_lifecycle_batch
-from output_builder import build_output
-
-# Safe GNN import — never crash if torch missing
-GNN_ENABLED = False
-try:
-    from gnn.anomaly_scorer import compute_gnn_scores
-    GNN_ENABLED = True
-except ImportError:
-    pass
-
-app = FastAPI()
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio, hashlib, logging, os, sys, time
+
+from ingest import spool_upload, read_upload, read_transactions, IngestError
+import pipeline
+from pipeline import analyze_file, CONCURRENCY
+from cache import CACHE
+from jobs import JobManager, JobQueueFull
+from incremental import StreamRegistry
+from triage import analyze_budgeted
+from store import STORE, DAY_NS, analyze_range, parse_time
+from profiling import profiled, METRICS
+from formats import FastJSONResponse, FormatError, PAGE_LIMIT, negotiate, paged_output, render, render_rows
+from subgraph import ANALYSES, GraphUnavailable, NODE_BUDGET, MAX_BUDGET, MAX_HOPS, register
+from batch import BatchError, analyze_batch, directory_files
+from workers import shutdown as shutdown_pool
+
+logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s %(message)s')
+log = logging.getLogger('mulenet')
+log.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
+
+jobs = JobManager()
+streams = StreamRegistry()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await jobs.start()
+    STORE.start_compactor()
+    STARTUP.ready()
+    STARTUP.start_warmup()
+    log.info('engine ready in %.2fs (imports %.2fs)', STARTUP.ready_seconds, STARTUP.import_seconds)
+    yield
+    await jobs.stop()
+    STORE.stop_compactor()
+    shutdown_pool()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=['*'],
     allow_methods=['*'], allow_headers=['*'])
 
 @app.get('/health')
 async def health():
-    return {'status': 'alive', 'gnn_enabled': GNN_ENABLED}
+    return {'status': 'alive', 'gnn_enabled': pipeline.GNN_ENABLED,
+            'gnn_loaded': 'gnn.anomaly_scorer' in sys.modules,
+            'cache': CACHE.stats() if CACHE is not None else None,
+            'startup': STARTUP.to_dict()}
 
 @app.post('/analyze')
-async def analyze(file: UploadFile = File(...)):
-    start = time.time()
-    df = pd.read_csv(io.StringIO((await file.read()).decode('utf-8')))
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    print(f'[{time.time()-start:.2f}s] CSV parsed — {len(df)} rows')
-
-    # ── Pre-compute shared lookups ONCE ─────────────────────────
-    recv_by_account = dict(tuple(df.groupby('receiver_id')))
-    sent_by_account = dict(tuple(df.groupby('sender_id')))
-    money_in = {acc: grp['amount'].sum() for acc, grp in recv_by_account.items()}
-    money_out = {acc: grp['amount'].sum() for acc, grp in sent_by_account.items()}
-
-    # Merge into txs_by_account for benford
-    all_accounts = set(df['sender_id'].tolist() + df['receiver_id'].tolist())
-    txs_by_account = {}
-    for acc in all_accounts:
-        parts = []
-        if acc in recv_by_account:
-            parts.append(recv_by_account[acc])
-        if acc in sent_by_account:
-            parts.append(sent_by_account[acc])
-        txs_by_account[acc] = pd.concat(parts) if parts else pd.DataFrame()
-
-    print(f'[{time.time()-start:.2f}s] Lookups pre-computed — {len(all_accounts)} accounts')
-
-    # ── Build graph ─────────────────────────────────────────────
-    G = build_graph(df)
-    print(f'[{time.time()-start:.2f}s] Graph built — {G.number_of_nodes()} nodes, {G.number_of_edges()} edges')
-
-    # ── Run detectors (passing pre-computed data) ───────────────
-    cycles = detect_cycles(G, df)
-    print(f'[{time.time()-start:.2f}s] Cycles detected — {len(cycles["rings"])} rings')
-
-    smurfing = detect_smurfing(G, df, recv_by_account=recv_by_account, sent_by_account=sent_by_account)
-    print(f'[{time.time()-start:.2f}s] Smurfing detected')
-
-    shells = detect_shells(G, df, money_in=money_in, money_out=money_out,
-                           recv_by_account=recv_by_account, sent_by_account=sent_by_account)
-    print(f'[{time.time()-start:.2f}s] Shells detected')
-
-    benford = benford_analysis(df, txs_by_account=txs_by_account)
-    print(f'[{time.time()-start:.2f}s] Benford analysis done')
-
-    whitelist = apply_whitelist(G, df, recv_by_account=recv_by_account, sent_by_account=sent_by_account)
-    print(f'[{time.time()-start:.2f}s] Whitelist applied — {len(whitelist)} whitelisted')
-
-    scored = compute_scores(G, df, cycles, smurfing, shells, benford, whitelist,
-                            money_in=money_in, money_out=money_out)
-    print(f'[{time.time()-start:.2f}s] Scores computed — {len(scored)} suspicious')
-
-    # ── GNN refinement (optional) ───────────────────────────────
-    if GNN_ENABLED:
-        try:
-            gnn_scores = compute_gnn_scores(G, df, scored)
-            for acc_id, gnn_s in gnn_scores.items():
-                if acc_id in scored:
-                    a = scored[acc_id]['suspicion_score']
-                    scored[acc_id]['suspicion_score'] = round(min(a * 0.70 + gnn_s * 100 * 0.30, 100), 1)
-                    scored[acc_id]['detected_patterns'].append('gnn_anomaly')
-        except Exception:
-            pass
-
-    # ── Lifecycle classification (batch) ────────────────────────
-    scored = classify_lifecycle_batch(scored, df, money_in=money_in, money_out=money_out)
-
-    total = time.time() - start
-    print(f'[{total:.2f}s] ✅ Analysis complete — {len(scored)} accounts scored')
-    return JSONResponse(build_output(scored, cycles['rings'], df, total))
+async def analyze(file: UploadFile | None = File(None),
+                  concurrency: int = Query(CONCURRENCY, ge=1, le=32),
+                  shards: int = Query(0, ge=0, le=256),
+                  persist: bool = Query(False),
+                  start: str | None = Query(None),
+                  end: str | None = Query(None),
+                  days: float | None = Query(None, gt=0),
+                  account: list[str] | None = Query(None),
+                  timings: bool = Query(False),
+                  profile: bool = Query(False),
+                  budget: float | None = Query(None, gt=0, le=3600),
+                  format: str | None = Query(None),
+                  limit: int | None = Query(None, ge=0, le=PAGE_LIMIT),
+                  accept: str | None = Header(None)):
+    began = time.time()
+    fmt = _format(format, accept)
+    # Without a file, or with a range/account filter, the transaction store is analyzed
+    query = file is None or any(q is not None for q in (start, end, days, account))
+    if file is not None and query and not persist:
+        raise HTTPException(400, 'start/end/days/account select stored transactions: '
+                                 'omit the file, or add persist=true to store it first')
+    if budget is not None and (query or shards > 1):
+        raise HTTPException(400, 'budget applies to a single uploaded file, unsharded')
+    try:
+        lo, hi = parse_time(start), parse_time(end)
+    except ValueError as e:
+        raise HTTPException(400, f'Bad time bound: {e}')
+    if days is not None:
+        lo = (hi if hi is not None else time.time_ns()) - int(days * DAY_NS)
+
+    digest, path, stored = hashlib.sha256(), None, None
+    if file is not None:
+        path = await spool_upload(file, hasher=digest)
+
+    # CPU-bound stages run off the event loop so /health etc. stay responsive
+    try:
+        with profiled(sample=profile, name=f'{int(began)}-{digest.hexdigest()[:12] if path else "store"}') as prof:
+            if query:
+                if path:
+                    stored = await asyncio.to_thread(_persist, path, file.filename or '')
+                out, r = await asyncio.to_thread(analyze_range, lo, hi, account, concurrency)
+            elif budget is not None:
+                out, r = await asyncio.to_thread(analyze_budgeted, path, file.filename or '', budget,
+                                                 digest.hexdigest(), concurrency)
+            else:
+                out, r = await asyncio.to_thread(analyze_file, path, file.filename or '', digest.hexdigest(),
+                                                 concurrency, None, None, shards)
+            if persist and not query:
+                stored = await asyncio.to_thread(_persist, path, file.filename or '', r)
+    except IngestError as e:
+        return JSONResponse(e.to_dict(), status_code=422)
+    finally:
+        if path:
+            os.unlink(path)
+
+    spans = prof.to_dict()
+    slowest = sorted(spans['spans'].items(), key=lambda kv: -kv[1]['wall_seconds'])[:5]
+    log.info('analyze %s: %.2fs, %d accounts flagged%s; slowest: %s',
+             'store' if query else file.filename, time.time() - began,
+             out['summary']['suspicious_accounts_flagged'], ' (cached)' if r is None and not query and shards <= 1
+             else '', ', '.join(f'{k} {v["wall_seconds"]:.3f}s' for k, v in slowest))
+    out = register(out, r, None if query else digest.hexdigest())
+    if stored is not None:
+        out = {**out, 'stored': stored}
+    if timings or profile:
+        out = {**out, 'timings': spans}
+    return render(out, fmt, limit)
+
+def _format(format, accept):
+    try:
+        return negotiate(format, accept)
+    except FormatError as e:
+        raise HTTPException(e.status, str(e))
+
+def _persist(path, filename, r=None):
+    """Append an upload to the store, reusing the analysis' parsed frame when there is one."""
+    df = r.get('df') if r is not None else None
+    return STORE.append(df if df is not None else read_transactions(path, filename))
+
+@app.get('/metrics')
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type='text/plain; version=0.0.4')
+
+# ── Async jobs: submit, poll, stream, cancel ─────────────────────
+def _job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f'Unknown job: {job_id}')
+    return job
+
+@app.post('/jobs', status_code=202)
+async def submit_job(file: UploadFile = File(...),
+                     concurrency: int = Query(CONCURRENCY, ge=1, le=32)):
+    try:
+        job = await jobs.submit(file, concurrency)
+    except JobQueueFull:
+        return JSONResponse({'error': 'Job queue full', 'queued': jobs.queued},
+                            status_code=429, headers={'Retry-After': '30'})
+    return {'job_id': job.id, 'status': job.status}
+
+@app.get('/jobs/{job_id}')
+async def job_status(job_id: str):
+    return _job(job_id).to_dict()
+
+@app.get('/jobs/{job_id}/result')
+async def job_result(job_id: str, format: str | None = Query(None),
+                     limit: int | None = Query(None, ge=0, le=PAGE_LIMIT),
+                     accept: str | None = Header(None)):
+    job, fmt = _job(job_id), _format(format, accept)
+    if job.status == 'failed':
+        return JSONResponse(job.error, status_code=422 if 'rows' in job.error else 500)
+    if job.result is None:
+        return JSONResponse(job.to_dict(), status_code=409 if job.status == 'cancelled' else 202)
+    return render(job.result, fmt, limit)
+
+@app.get('/jobs/{job_id}/events')
+async def job_events(job_id: str):
+    return StreamingResponse(_job(job_id).stream(), media_type='application/x-ndjson')
+
+@app.delete('/jobs/{job_id}')
+async def cancel_job(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, f'Unknown job: {job_id}')
+    return {'job_id': job.id, 'status': job.status}
+
+
+# ── Incremental streams: append batches, snapshot on demand ──────
+@app.post('/streams/{stream_id}/transactions')
+async def append_transactions(stream_id: str, file: UploadFile = File(...)):
+    try:
+        df = await read_upload(file)
+    except IngestError as e:
+        return JSONResponse(e.to_dict(), status_code=422)
+    stream = streams.get(stream_id, create=True)
+    return {'stream_id': stream_id, **await asyncio.to_thread(stream.append, df)}
+
+@app.get('/streams/{stream_id}/snapshot')
+async def stream_snapshot(stream_id: str, format: str | None = Query(None),
+                          limit: int | None = Query(None, ge=0, le=PAGE_LIMIT),
+                          accept: str | None = Header(None)):
+    stream, fmt = streams.get(stream_id), _format(format, accept)
+    if stream is None:
+        raise HTTPException(404, f'Unknown stream: {stream_id}')
+    return render(await asyncio.to_thread(stream.snapshot), fmt, limit)
+
+@app.delete('/streams/{stream_id}')
+async def drop_stream(stream_id: str):
+    if streams.drop(stream_id) is None:
+        raise HTTPException(404, f'Unknown stream: {stream_id}')
+    return {'stream_id': stream_id, 'deleted': True}
+
+
+# ── Transaction store: uploads append by day, /analyze queries ranges ──
+@app.post('/store/transactions')
+async def store_transactions(file: UploadFile = File(...)):
+    try:
+        df = await read_upload(file)
+    except IngestError as e:
+        return JSONResponse(e.to_dict(), status_code=422)
+    return await asyncio.to_thread(STORE.append, df)
+
+@app.get('/store')
+async def store_stats():
+    return await asyncio.to_thread(STORE.stats)
+
+
+# ── Batches: many files in one call, linked across files ─────────
+@app.post('/batch')
+async def batch(files: list[UploadFile] | None = File(None),
+                directory: str | None = Query(None),
+                pattern: str = Query('*.csv'),
+                merge: bool = Query(False),
+                concurrency: int = Query(CONCURRENCY, ge=1, le=32),
+                limit: int | None = Query(None, ge=0, le=PAGE_LIMIT)):
+    if (files is None) == (directory is None):
+        raise HTTPException(400, 'Upload files or name a directory, not both')
+    began, spooled = time.time(), []
+    try:
+        if directory is not None:
+            items = [(path, name, None) for path, name in directory_files(directory, pattern)]
+        else:
+            for f in files:
+                digest = hashlib.sha256()
+                spooled.append((await spool_upload(f, hasher=digest), f.filename or '', digest))
+            items = [(path, name, digest.hexdigest()) for path, name, digest in spooled]
+        result = await asyncio.to_thread(analyze_batch, items, merge, concurrency)
+    except BatchError as e:
+        raise HTTPException(e.status, str(e))
+    finally:
+        for path, _, _ in spooled:
+            os.unlink(path)
+
+    log.info('batch %s: %d files (%d failed), %.2fs, %d cross-file accounts', result['mode'],
+             result['summary']['files'], result['summary']['failed_files'], time.time() - began,
+             result['summary']['cross_file_accounts'])
+    if limit is not None:
+        result['files'] = [paged_output(f, limit) if 'suspicious_accounts' in f else f for f in result['files']]
+        if 'analysis' in result:
+            result['analysis'] = paged_output(result['analysis'], limit)
+    return FastJSONResponse(result)
+
+
+# ── Analyses: paged accounts/rings and k-hop subgraphs ───────────
+def _analysis(analysis_id):
+    analysis = ANALYSES.get(analysis_id)
+    if analysis is None:
+        raise HTTPException(404, f'Unknown analysis: {analysis_id}')
+    return analysis
+
+@app.get('/analyses/{analysis_id}/accounts')
+async def analysis_accounts(analysis_id: str, cursor: str | None = Query(None),
+                            limit: int = Query(1000, ge=1, le=PAGE_LIMIT),
+                            format: str | None = Query(None), accept: str | None = Header(None)):
+    return _rows(analysis_id, 'accounts', cursor, limit, format, accept)
+
+@app.get('/analyses/{analysis_id}/rings')
+async def analysis_rings(analysis_id: str, cursor: str | None = Query(None),
+                         limit: int = Query(1000, ge=1, le=PAGE_LIMIT),
+                         format: str | None = Query(None), accept: str | None = Header(None)):
+    return _rows(analysis_id, 'rings', cursor, limit, format, accept)
+
+def _rows(analysis_id, kind, cursor, limit, format, accept):
+    analysis, fmt = _analysis(analysis_id), _format(format, accept)
+    rows = analysis.account_rows if kind == 'accounts' else analysis.ring_rows
+    try:
+        return render_rows(rows, fmt, kind, limit, cursor,
+                           {'X-Analysis-Id': analysis_id, 'X-Total-Count': str(len(rows))})
+    except FormatError as e:
+        raise HTTPException(e.status, str(e))
+
+async def _subgraph(fn, *args):
+    try:
+        return FastJSONResponse(await asyncio.to_thread(fn, *args))
+    except GraphUnavailable as e:
+        raise HTTPException(410, str(e))
+
+@app.get('/analyses/{analysis_id}/accounts/{account_id}/subgraph')
+async def account_subgraph(analysis_id: str, account_id: str,
+                           hops: int = Query(2, ge=0, le=MAX_HOPS),
+                           budget: int = Query(NODE_BUDGET, ge=1, le=MAX_BUDGET)):
+    analysis = _analysis(analysis_id)
+    try:
+        return await _subgraph(analysis.account_subgraph, account_id, hops, budget)
+    except KeyError:
+        raise HTTPException(404, f'Unknown account: {account_id}')
+
+@app.get('/analyses/{analysis_id}/rings/{ring_id}/subgraph')
+async def ring_subgraph(analysis_id: str, ring_id: str,
+                        hops: int = Query(0, ge=0, le=MAX_HOPS),
+                        budget: int = Query(NODE_BUDGET, ge=1, le=MAX_BUDGET)):
+    analysis = _analysis(analysis_id)
+    if ring_id not in analysis.rings:
+        raise HTTPException(404, f'Unknown ring: {ring_id}')
+    return await _subgraph(analysis.ring_subgraph, ring_id, hops, budget)
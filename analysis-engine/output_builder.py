@@ -1,5 +1,9 @@
-def build_output(scored, rings, df, processing_time):
-    all_accs = set(df['sender_id'].tolist() + df['receiver_id'].tolist())
+import pandas as pd
+
+
+def build_output(scored, rings, df, processing_time, total_accounts=None):
+    if total_accounts is None:   # callers with a graph pass its node count
+        total_accounts = pd.concat((df['sender_id'], df['receiver_id']), ignore_index=True).nunique()
     return {
         'suspicious_accounts': [{
             'account_id': v['account_id'],
@@ -7,15 +11,20 @@ def build_output(scored, rings, df, processing_time):
             'detected_patterns': v['detected_patterns'],
             'ring_id': v['ring_id'],
             'lifecycle_stage': v.get('lifecycle_stage', 'Unknown'),
+            **({'evidence': v['evidence']} if 'evidence' in v else {}),
         } for v in scored.values()],
         'fraud_rings': [{
             'ring_id': r['ring_id'],
             'member_accounts': r['member_accounts'],
             'pattern_type': r['pattern_type'],
             'risk_score': r['risk_score'],
+            'cycle_count': r['cycle_count'],
+            'edge_count': len(r['edges']),
+            'total_flow': r['total_flow'],
+            'span_hours': r['span_hours'],
         } for r in rings],
         'summary': {
-            'total_accounts_analyzed': len(all_accs),
+            'total_accounts_analyzed': total_accounts,
             'suspicious_accounts_flagged': len(scored),
             'fraud_rings_detected': len(rings),
             'processing_time_seconds': round(processing_time, 2),
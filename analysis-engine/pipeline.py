@@ -0,0 +1,289 @@
+import contextvars, importlib.util, os, time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import account_index, centrality, feature_store, false_positive, graph_engine, ingest
+import lifecycle, output_builder, ring_consolidation, scoring
+import detectors.benford_detector, detectors.cycle_detector
+import detectors.shell_detector, detectors.smurfing_detector
+from graph_engine import build_graph
+from account_index import build_account_index
+from feature_store import build_feature_store
+from detectors.cycle_detector import detect_cycles
+from ring_consolidation import consolidate_rings
+from detectors.smurfing_detector import detect_smurfing
+from detectors.shell_detector import detect_shells
+from detectors.benford_detector import benford_analysis
+from false_positive import apply_whitelist
+from scoring import compute_scores
+from lifecycle import classify_lifecycle_batch
+from ingest import read_transactions
+from output_builder import build_output
+from cache import CACHE, settings, make_key
+from profiling import span
+
+# GNN capability is detected without importing torch; the GNN stack loads on first use
+GNN_ENABLED = all(importlib.util.find_spec(m) is not None for m in ('torch', 'torch_geometric'))
+
+
+def _gnn_scorer():
+    """``gnn.anomaly_scorer``, imported on first call; None (and GNN off) if it fails to import."""
+    global GNN_ENABLED
+    if GNN_ENABLED:
+        try:
+            import gnn.anomaly_scorer
+            return gnn.anomaly_scorer
+        except ImportError:   # installed but unusable — never crash the analysis
+            GNN_ENABLED = False
+    return None
+
+CONCURRENCY = int(os.environ.get('PIPELINE_CONCURRENCY', 4))
+CANCEL_POLL = 0.5  # seconds between cancellation checks while stages run
+
+# ``settings()`` lists everything besides the inputs that shapes a stage's
+# result; ``cached`` stages are stored in the result cache under that key
+Stage = namedtuple('Stage', ['name', 'deps', 'fn', 'settings', 'cached'], defaults=(tuple, False))
+
+
+class PipelineCancelled(Exception):
+    """Raised by run_stages once its ``cancel`` event is set."""
+
+
+def _gnn(r, deadline=None):
+    scored = r['scoring']
+    scorer = _gnn_scorer()
+    if scorer is None:
+        return scored
+    try:
+        gnn_scores = scorer.compute_gnn_scores(r['graph'], r['df'], scored, features=r['features'],
+                                               deadline=deadline)
+        for acc_id, gnn_s in gnn_scores.items():
+            if acc_id in scored:
+                a = scored[acc_id]['suspicion_score']
+                scored[acc_id]['suspicion_score'] = round(min(a * 0.70 + gnn_s * 100 * 0.30, 100), 1)
+                scored[acc_id]['detected_patterns'].append('gnn_anomaly')
+    except TimeoutError:   # triage's budget ran out: the caller falls back to the algorithmic scores
+        raise
+    except Exception:
+        pass
+    return scored
+
+
+def _gnn_settings():
+    if _gnn_scorer() is None:
+        return (False,)
+    import gnn.anomaly_scorer, gnn.feature_builder
+    # Inference results depend on the persisted weights, so they key the stage too
+    return (True, settings(gnn.anomaly_scorer, 'MODE'), settings(gnn.feature_builder),
+            gnn.anomaly_scorer.weights_version())
+
+
+# graph → cycles (→ rings)/smurfing/shells/benford/whitelist → scoring → GNN → lifecycle
+# Stages only read transactions from the graph: ``df`` is None when it came from the cache
+STAGES = [
+    Stage('graph', ('df',), lambda r: build_graph(r['df']),
+          lambda: (settings(graph_engine), settings(ingest, 'AMOUNT_DTYPE')), cached=True),
+    Stage('index', ('graph',), lambda r: build_account_index(r['graph']),
+          lambda: (settings(account_index),)),
+    Stage('features', ('graph', 'index'), lambda r: build_feature_store(r['graph'], r['index']),
+          lambda: (settings(feature_store), settings(centrality, 'MODE', 'EPSILON', 'DELTA'))),
+    Stage('cycles', ('graph',), lambda r: detect_cycles(r['graph'], r['df']),
+          lambda: (settings(detectors.cycle_detector, 'MIN_LEN', 'MAX_LEN', 'WINDOW_HRS'),), cached=True),
+    Stage('rings', ('graph', 'cycles'), lambda r: consolidate_rings(r['graph'], r['cycles']),
+          lambda: (settings(ring_consolidation, 'MERGE'),)),
+    Stage('smurfing', ('graph', 'index'), lambda r: detect_smurfing(r['graph'], r['df'], index=r['index']),
+          lambda: (settings(detectors.smurfing_detector, 'WINDOW_HRS', 'FAN_THRESH', 'THRESHOLDS'),),
+          cached=True),
+    Stage('shells', ('graph', 'index', 'features'), lambda r: detect_shells(r['graph'], r['df'], features=r['features'],
+                                                           index=r['index']),
+          lambda: (settings(detectors.shell_detector, 'VELOCITY_SECS', 'MAX_EVIDENCE_PAIRS'),), cached=True),
+    Stage('benford', ('graph', 'index'), lambda r: benford_analysis(r['graph'], r['df'], index=r['index']),
+          lambda: (settings(detectors.benford_detector, 'MIN_TXS', 'TESTS'),), cached=True),
+    Stage('whitelist', ('graph', 'features'), lambda r: apply_whitelist(r['graph'], r['df'], features=r['features']),
+          lambda: (settings(false_positive),), cached=True),
+    Stage('scoring', ('features', 'cycles', 'rings', 'smurfing', 'shells', 'benford', 'whitelist'),
+          lambda r: compute_scores(r['graph'], r['df'], r['cycles'], r['smurfing'], r['shells'],
+                                   r['benford'], r['whitelist'], features=r['features'], rings=r['rings']),
+          lambda: (settings(scoring),)),
+    Stage('gnn', ('features', 'scoring'), _gnn, _gnn_settings),
+    Stage('lifecycle', ('features', 'gnn'), lambda r: classify_lifecycle_batch(r['gnn'], r['df'], G=r['graph'],
+                                                                    features=r['features'],
+                                                                    timeline=r.get('timeline')),
+          lambda: (settings(lifecycle),)),
+]
+
+
+def stage_keys(stages, digest):
+    """Cache key per stage: the upload digest, the stage's settings and its dependencies' keys.
+
+    Keys chain through ``deps``, so a scoring-only change leaves every
+    detector key (and cached result) intact and re-keys scoring onward.
+    """
+    keys = {'df': digest}
+    for stage in stages:
+        keys[stage.name] = make_key(stage.name, stage.settings(), *(keys[d] for d in stage.deps))
+    return keys
+
+
+def output_key(keys):
+    """Cache key of the ``build_output`` result for a set of ``stage_keys``."""
+    return make_key('output', settings(output_builder), keys['lifecycle'])
+
+
+def run_stages(stages, inputs, concurrency=CONCURRENCY, on_stage=None, cancel=None):
+    """Run ``stages`` as soon as their dependencies are met, up to ``concurrency`` at once.
+
+    Stages run on threads, so every stage reads the same in-memory graph and
+    columns without pickling; NumPy/SciPy release the GIL in the heavy
+    kernels, and the cycle and centrality engines fan out to their own
+    process pools. ``on_stage(name, result, seconds)`` fires as each stage
+    finishes. The first failing stage cancels whatever has not started.
+
+    Setting the ``cancel`` event (a ``threading.Event``) raises
+    PipelineCancelled within ``CANCEL_POLL`` seconds; a stage already in
+    flight finishes in the background and its result is dropped.
+    """
+    results, running = dict(inputs), {}
+    pending = [s for s in stages if s.name not in results]
+
+    def timed(stage):
+        with span(stage.name) as s:
+            out = stage.fn(results)
+            s.items = _count(out)
+        return out, s.wall
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        while pending or running:
+            if cancel is not None and cancel.is_set():
+                raise PipelineCancelled()
+            for stage in [s for s in pending if all(d in results for d in s.deps)]:
+                pending.remove(stage)
+                # Each stage runs in a copy of this context, so its spans reach the caller's profile
+                running[pool.submit(contextvars.copy_context().run, timed, stage)] = stage
+            if not running:
+                raise RuntimeError(f'Unsatisfiable stage dependencies: {[s.name for s in pending]}')
+            done, _ = wait(running, timeout=CANCEL_POLL if cancel is not None else None,
+                           return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage = running.pop(fut)
+                results[stage.name], secs = fut.result()
+                if on_stage:
+                    on_stage(stage.name, results[stage.name], secs)
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return results
+
+
+def _count(result):
+    """Items a stage produced: cycles/rings for the cycle and ring stages, else entries/accounts."""
+    if isinstance(result, dict) and 'rings' in result:
+        return len(result['rings'])
+    return len(result) if hasattr(result, '__len__') else None
+
+
+def run_pipeline(df, concurrency=CONCURRENCY, on_stage=None, cancel=None):
+    """Full analysis of one transaction frame; returns every stage's result."""
+    return run_stages(STAGES, {'df': df}, concurrency, on_stage, cancel)
+
+
+def _from_cache(stage, key, computed):
+    def fn(r):
+        hit = CACHE.get(key)
+        if hit is not None:
+            return hit
+        computed.append(stage.name)
+        return stage.fn(r)
+    return stage._replace(fn=fn)
+
+
+def _ingest(path, filename):
+    with span('ingest') as s:
+        df = read_transactions(path, filename)
+        s.items = len(df)
+    return df
+
+
+def analyze_file(path, filename='', digest=None, concurrency=CONCURRENCY, on_stage=None, cancel=None,
+                 shards=0, store=True):
+    """Parse and analyze an uploaded file; returns (build_output result, stage results).
+
+    With a ``digest`` of the upload and the result cache enabled, an
+    unchanged re-upload returns the stored output (stage results are then
+    None), a cached graph skips parsing altogether, and cached detector
+    results are reused; whatever was computed is stored on success, unless
+    ``store`` is False (a forked worker, whose cache writer thread did not
+    survive the fork; its caller stores the results). ``on_stage`` also sees ``('ingest', df or None, seconds)``.
+
+    With ``shards`` > 1 the analysis is split by weakly connected component
+    (see sharding.py); the output is the same, stage results are None and
+    ``on_stage`` sees ``('shard N', result, seconds)`` per finished shard.
+    """
+    start = time.time()
+    if digest is None or CACHE is None:
+        keys, stages, inputs = None, STAGES, {}
+    else:
+        keys = stage_keys(STAGES, digest)
+        out_key = output_key(keys)
+        out = CACHE.get(out_key)
+        if out is not None:
+            return {**out, 'summary': {**out['summary'], 'processing_time_seconds': round(time.time() - start, 2)}}, None
+        computed = []
+        stages = [_from_cache(s, keys[s.name], computed) if s.cached else s for s in STAGES]
+        G = CACHE.get(keys['graph'])
+        inputs = {'graph': G} if G is not None else {}
+
+    t = time.perf_counter()
+    if shards > 1:
+        from sharding import analyze_sharded   # sharding builds on this module
+        df = _ingest(path, filename)
+        if on_stage:
+            on_stage('ingest', df, time.perf_counter() - t)
+        t = time.perf_counter()
+        def on_shard(shard, part):
+            if on_stage:
+                on_stage(f'shard {shard.id}', part, time.perf_counter() - t)
+        out = analyze_sharded(df, shards, concurrency=concurrency, on_shard=on_shard)
+        out['summary']['processing_time_seconds'] = round(time.time() - start, 2)
+        if keys is not None and store:
+            CACHE.put(out_key, out)
+        return out, None
+
+    inputs['df'] = None if 'graph' in inputs else _ingest(path, filename)
+    if on_stage:
+        on_stage('ingest', inputs['df'], time.perf_counter() - t)
+        if inputs['df'] is None:
+            on_stage('graph', inputs['graph'], 0.0)
+    if cancel is not None and cancel.is_set():
+        raise PipelineCancelled()
+
+    r = run_stages(stages, inputs, concurrency, on_stage, cancel)
+    with span('output', items=len(r['lifecycle'])):
+        out = build_output(r['lifecycle'], r['rings']['rings'], r['df'], time.time() - start,
+                           total_accounts=r['graph'].number_of_nodes())
+    if keys is not None and store:
+        # Stored last so the graph carries its centrality memo
+        for name in computed:
+            CACHE.put(keys[name], r[name])
+        CACHE.put(out_key, out)
+    return out, r
+
+
+# Stand-ins for detectors that have not finished yet
+_EMPTY = {'cycles': {'accounts': {}, 'rings': []}, 'smurfing': {}, 'shells': {},
+          'benford': {}, 'whitelist': set()}
+
+
+def provisional_scores(results):
+    """Scores from whichever detectors have finished so far, or None before the features exist.
+
+    Same shape as the ``scoring`` stage; missing detectors count as silent,
+    so scores only grow as more stages complete (whitelisting aside).
+    """
+    if 'features' not in results:
+        return None
+    r = {name: results.get(name, empty) for name, empty in _EMPTY.items()}
+    return compute_scores(results['graph'], results.get('df'), r['cycles'], r['smurfing'], r['shells'],
+                          r['benford'], r['whitelist'], features=results['features'], rings=results.get('rings'))
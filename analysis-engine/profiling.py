@@ -0,0 +1,194 @@
+"""Structured timing for analyses: spans, Prometheus metrics and an opt-in sampler."""
+import contextvars, os, sys, threading, time
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not on Windows; peak RSS then reads as 0
+    resource = None
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current = contextvars.ContextVar('profile', default=None)
+
+
+def peak_rss():
+    """Process high-water RSS in bytes (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Span:
+    """Handle yielded by ``span``; set ``items`` to the number of things processed."""
+    __slots__ = ('name', 'items', 'wall', 'cpu', 'rss')
+
+    def __init__(self, name, items=None):
+        self.name, self.items = name, items
+        self.wall = self.cpu = 0.0
+        self.rss = 0
+
+
+@contextmanager
+def span(name, items=None):
+    """Measure wall time, thread CPU time and peak-RSS growth of the block.
+
+    RSS is the process high-water mark, so concurrent stages share the
+    growth; treat it as an upper bound per stage.
+    """
+    s = Span(name, items)
+    profile = _current.get()
+    tid = threading.get_ident()
+    if profile is not None:
+        profile.active[tid] += 1
+    rss, cpu, wall = peak_rss(), time.thread_time(), time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.wall = time.perf_counter() - wall
+        s.cpu = time.thread_time() - cpu
+        s.rss = peak_rss() - rss
+        METRICS.observe(s)
+        if profile is not None:
+            profile.active[tid] -= 1
+            profile.record(s)
+
+
+class Profile:
+    """Span totals for one request, aggregated by name."""
+
+    def __init__(self):
+        self.spans = {}
+        self.active = Counter()   # thread id → open spans; the sampler only looks at these
+        self.path = None
+        self._lock = threading.Lock()
+
+    def record(self, s):
+        with self._lock:
+            rec = self.spans.setdefault(s.name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                                 'peak_rss_delta_bytes': 0, 'items': None})
+            rec['calls'] += 1
+            rec['wall_seconds'] += s.wall
+            rec['cpu_seconds'] += s.cpu
+            rec['peak_rss_delta_bytes'] = max(rec['peak_rss_delta_bytes'], s.rss)
+            if s.items is not None:
+                rec['items'] = (rec['items'] or 0) + int(s.items)
+
+    def to_dict(self):
+        with self._lock:
+            out = {name: {**rec, 'wall_seconds': round(rec['wall_seconds'], 4),
+                          'cpu_seconds': round(rec['cpu_seconds'], 4)}
+                   for name, rec in self.spans.items()}
+        return {'spans': out, 'profile_file': self.path}
+
+
+class Sampler(threading.Thread):
+    """Samples the stacks of a profile's threads into collapsed ("folded") stack counts.
+
+    The output is one ``frame;frame;frame count`` line per distinct stack,
+    readable by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, profile, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.profile, self.interval = profile, interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            for tid, depth in list(self.profile.active.items()):
+                frame = frames.get(tid) if depth > 0 else None
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self, path):
+        self._done.set()
+        self.join()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+@contextmanager
+def profiled(sample=False, name=None):
+    """Collect spans from this context (and threads it hands work to) into a Profile.
+
+    Only threads inside one of its spans are sampled, so idle pool threads,
+    concurrent requests and the event loop stay out of the profile.
+
+    With ``sample`` a sampling profiler runs for the duration and writes its
+    folded stacks to ``PROFILE_DIR/<name>.folded`` (``profile.path``).
+    """
+    profile = Profile()
+    token = _current.set(profile)
+    sampler = Sampler(profile) if sample else None
+    if sampler:
+        sampler.start()
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        if sampler:
+            profile.path = os.path.join(PROFILE_DIR, f'{name or int(time.time() * 1000)}.folded')
+            sampler.stop(profile.path)
+
+
+# ── Prometheus text exposition ───────────────────────────────────
+class Metrics:
+    """Process-wide counters and a wall-time histogram per span name."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.hist = {}     # name → [bucket counts..., +Inf count]
+        self.sums = Counter()
+        self.cpu = Counter()
+        self.items = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, s):
+        with self._lock:
+            counts = self.hist.setdefault(s.name, [0] * (len(self.buckets) + 1))
+            for i, le in enumerate(self.buckets):
+                if s.wall <= le:
+                    counts[i] += 1
+            counts[-1] += 1
+            self.sums[s.name] += s.wall
+            self.cpu[s.name] += s.cpu
+            if s.items is not None:
+                self.items[s.name] += int(s.items)
+
+    def render(self):
+        with self._lock:
+            lines = ['# HELP mulenet_span_seconds Wall time per instrumented stage.',
+                     '# TYPE mulenet_span_seconds histogram']
+            for name, counts in sorted(self.hist.items()):
+                for le, c in zip(self.buckets, counts):
+                    lines.append(f'mulenet_span_seconds_bucket{{span="{name}",le="{le}"}} {c}')
+                lines.append(f'mulenet_span_seconds_bucket{{span="{name}",le="+Inf"}} {counts[-1]}')
+                lines.append(f'mulenet_span_seconds_sum{{span="{name}"}} {self.sums[name]:.6f}')
+                lines.append(f'mulenet_span_seconds_count{{span="{name}"}} {counts[-1]}')
+            lines += ['# HELP mulenet_span_cpu_seconds_total Thread CPU time per instrumented stage.',
+                      '# TYPE mulenet_span_cpu_seconds_total counter']
+            lines += [f'mulenet_span_cpu_seconds_total{{span="{n}"}} {v:.6f}' for n, v in sorted(self.cpu.items())]
+            lines += ['# HELP mulenet_span_items_total Items processed per instrumented stage.',
+                      '# TYPE mulenet_span_items_total counter']
+            lines += [f'mulenet_span_items_total{{span="{n}"}} {v}' for n, v in sorted(self.items.items())]
+        lines += ['# HELP mulenet_process_peak_rss_bytes Process high-water resident set size.',
+                  '# TYPE mulenet_process_peak_rss_bytes gauge',
+                  f'mulenet_process_peak_rss_bytes {peak_rss()}']
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
@@ -0,0 +1,79 @@
+"""Ring consolidation: overlapping cycles merged into network-level rings."""
+import os
+import numpy as np
+
+MERGE = os.environ.get('RING_MERGE', 'edges')   # 'edges' | 'accounts' | 'off'
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]   # path halving
+        i = parent[i]
+    return i
+
+
+def _cycle_edges(members):
+    return list(zip(members, members[1:] + members[:1]))
+
+
+def consolidate_rings(G, cycles, merge=MERGE):
+    """Rings from ``detect_cycles`` output plus an account → ring IDs inverted index.
+
+    Each ring carries its members (in order of first appearance), its
+    directed edges as account pairs, total flow over those edges, first/last
+    transaction, time span and the number of constituent cycles. Rings are
+    numbered by (first transaction, members), like cycles, so IDs do not
+    depend on worker timing or sharding.
+    """
+    found = cycles['rings']
+    parent = list(range(len(found)))
+    if merge != 'off':
+        owner = {}   # account or edge → first cycle that used it
+        for c, cyc in enumerate(found):
+            keys = cyc['member_accounts'] if merge == 'accounts' else _cycle_edges(cyc['member_accounts'])
+            for key in keys:
+                o = owner.setdefault(key, c)
+                if o != c:
+                    a, b = _find(parent, o), _find(parent, c)
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for c in range(len(found)):
+        groups.setdefault(_find(parent, c), []).append(found[c])
+    rings = []
+    for group in groups.values():
+        members, edges = {}, {}
+        for cyc in group:
+            members.update(dict.fromkeys(cyc['member_accounts']))
+            edges.update(dict.fromkeys(_cycle_edges(cyc['member_accounts'])))
+        first, last = min(c['first_ts'] for c in group), max(c['last_ts'] for c in group)
+        eids = [G.edge_id(G.index[s], G.index[d]) for s, d in edges]
+        rings.append({
+            'member_accounts': list(members),
+            'pattern_type': 'cycle' if len(group) == 1 else 'cycle_network',
+            'risk_score': max(c['risk_score'] for c in group),
+            'cycle_count': len(group),
+            'edges': [list(e) for e in edges],
+            'total_flow': round(float(G.edge_amount[eids].sum()), 2),
+            'first_ts': first,
+            'last_ts': last,
+            'span_hours': round((last - first) / 3.6e12, 2),
+        })
+
+    rings.sort(key=lambda r: (r['first_ts'], r['member_accounts']))
+    index = {}
+    for counter, ring in enumerate(rings, 1):
+        ring['ring_id'] = f'RING_{counter:03d}'
+        for acc in ring['member_accounts']:
+            index.setdefault(acc, []).append(ring['ring_id'])
+    return {'rings': rings, 'index': index}
+
+
+def ring_counts(G, rings):
+    """Rings each account (aligned with G.accounts) belongs to."""
+    counts = np.zeros(len(G), dtype=np.int64)
+    idx = G.index
+    for acc, ids in rings['index'].items():
+        counts[idx[acc]] = len(ids)
+    return counts
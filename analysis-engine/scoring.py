@@ -1,49 +1,84 @@
-def compute_scores(G, df, cycles, smurfing, shells, benford, whitelist, money_in=None, money_out=None):
-    # Pre-compute money flows if not provided
-    if money_in is None:
-        money_in = df.groupby('receiver_id')['amount'].sum().to_dict()
-    if money_out is None:
-        money_out = df.groupby('sender_id')['amount'].sum().to_dict()
+import numpy as np
+from feature_store import build_feature_store
+from detectors.cycle_detector import MIN_LEN, MAX_LEN
+from ring_consolidation import consolidate_rings, ring_counts
 
+FEATURES = ('money_in', 'money_out')
+DETECTORS = ('cycles', 'smurfing', 'shells', 'benford')
+
+# One bit per pattern; output lists patterns in this order
+PATTERNS = ([f'cycle_length_{k}' for k in range(MIN_LEN, MAX_LEN + 1)] +
+            ['fan_in', 'fan_out', 'below_threshold_amounts', 'shell_account',
+             'high_velocity', 'benford_violation', 'super_node'])
+BIT = {p: np.uint32(1 << k) for k, p in enumerate(PATTERNS)}
+
+
+def _popcount(bits):
+    return np.unpackbits(bits.view(np.uint8).reshape(-1, 4), axis=1).sum(axis=1)
+
+
+def score_matrix(G, cycles, smurfing, shells, benford, whitelist, rings):
+    """Per-account score columns and a pattern bitmask, aligned with G.accounts.
+
+    Detector outputs only list accounts they fired on, so filling the columns
+    touches those entries alone; everything else is array arithmetic.
+    """
+    n, idx = len(G), G.index
+    m = {name: np.zeros(n) for name in DETECTORS}
+    m['bits'] = np.zeros(n, dtype=np.uint32)
+    for name, results in (('cycles', cycles['accounts']), ('smurfing', smurfing), ('shells', shells)):
+        col = m[name]
+        for acc, r in results.items():
+            i = idx[acc]
+            col[i] = sum(r['scores'])
+            for p in r['patterns']:
+                m['bits'][i] |= BIT[p]
+    m['ring_count'] = ring_counts(G, rings)
+    for acc, b in benford.items():
+        i = idx[acc]
+        m['benford'][i] = b['score_delta']
+        if b['pattern']:
+            m['bits'][i] |= BIT[b['pattern']]
+    m['whitelisted'] = np.zeros(n, dtype=bool)
+    m['whitelisted'][[idx[acc] for acc in whitelist]] = True
+    return m
+
+
+def compute_scores(G, df, cycles, smurfing, shells, benford, whitelist, features=None, rings=None):
+    if features is None:
+        features = build_feature_store(G)
+    if rings is None:
+        rings = consolidate_rings(G, cycles)
+    money_in, money_out = features.get(*FEATURES)
+    m = score_matrix(G, cycles, smurfing, shells, benford, whitelist, rings)
+
+    score = m['cycles'] + m['smurfing'] + m['shells'] + m['benford']
+    bits = m['bits'].copy()
+
+    # Multipliers
+    score = np.where(_popcount(bits) >= 2, score * 1.3, score)
+    pass_through = np.divide(money_out, money_in, out=np.zeros(len(score)), where=money_in > 0)
+    score = np.where(pass_through > 0.95, score * 1.2, score)
+    super_node = m['ring_count'] > 1   # links otherwise separate rings
+    score = np.where(super_node, score * 1.3, score)
+    bits[super_node] |= BIT['super_node']
+
+    final = np.round(np.minimum(score, 100), 1)
+    flagged = np.flatnonzero(~m['whitelisted'] & (score >= 10))
+    flagged = flagged[np.argsort(-final[flagged], kind='stable')]
+
+    # Only flagged accounts are materialized as dicts
     suspicious = {}
-    for account in G.nodes():
-        if account in whitelist:
-            continue
-        score, patterns, ring_ids = 0, [], []
-        if account in cycles['accounts']:
-            c = cycles['accounts'][account]
-            score += sum(c['scores'])
-            patterns += c['patterns']
-            ring_ids += c['ring_ids']
-        if account in smurfing:
-            score += sum(smurfing[account]['scores'])
-            patterns += smurfing[account]['patterns']
-        if account in shells:
-            score += sum(shells[account]['scores'])
-            patterns += shells[account]['patterns']
-        if account in benford:
-            b = benford[account]
-            score += b['score_delta']
-            if b['pattern']:
-                patterns.append(b['pattern'])
-
-        # Multipliers
-        if len(set(patterns)) >= 2:
-            score *= 1.3
-        mi = money_in.get(account, 0)
-        mo = money_out.get(account, 0)
-        if mi > 0 and mo / mi > 0.95:
-            score *= 1.2
-        if len(set(ring_ids)) > 1:
-            score *= 1.3
-            patterns.append('super_node')
-
-        if score >= 10:
-            suspicious[account] = {
-                'account_id': account,
-                'suspicion_score': round(min(score, 100), 1),
-                'detected_patterns': list(dict.fromkeys(patterns)),
-                'ring_id': ring_ids[0] if ring_ids else 'RING_NONE'
-            }
-
-    return dict(sorted(suspicious.items(), key=lambda x: x[1]['suspicion_score'], reverse=True))
+    for i in flagged.tolist():
+        account = G.accounts[i]
+        ring_ids = rings['index'].get(account)
+        suspicious[account] = {
+            'account_id': account,
+            'suspicion_score': round(min(float(score[i]), 100), 1),
+            'detected_patterns': [p for p in PATTERNS if bits[i] & BIT[p]],
+            'ring_id': ring_ids[0] if ring_ids else 'RING_NONE'
+        }
+        evidence = shells.get(account, {}).get('evidence')
+        if evidence:
+            suspicious[account]['evidence'] = evidence
+    return suspicious
@@ -0,0 +1,220 @@
+"""Weakly-connected-component sharding of one analysis; merges to the unsharded output.
+
+Also runs across hosts through a shared directory:
+
+    python sharding.py plan transactions.csv /shared/job --shards 16
+    python sharding.py run /shared/job 3 7 11      # on any host, any shard ids
+    python sharding.py merge /shared/job result.json
+"""
+import contextvars, heapq, json, os, sys, time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from graph_engine import build_graph
+from feature_store import build_feature_store
+from centrality import betweenness
+from ingest import read_transactions, ARROW_ENABLED
+from output_builder import build_output
+from pipeline import STAGES, run_stages, CONCURRENCY
+
+SHARDS = int(os.environ.get('SHARD_COUNT', os.cpu_count() or 1))
+GIANT_SHARE = float(os.environ.get('SHARD_GIANT_SHARE', 0.25))  # components above this share of txs run alone
+MANIFEST = 'manifest.json'
+
+Shard = namedtuple('Shard', ['id', 'rows', 'giant'])
+
+
+def plan_shards(G, shards=SHARDS, giant_share=GIANT_SHARE):
+    """Split ``G``'s transaction rows into shards made of whole weakly connected components.
+
+    Components holding more than ``giant_share`` of all transactions get a
+    shard each (``giant=True``); the rest are packed largest-first into the
+    currently lightest of ``shards`` bins. Empty bins are dropped.
+    """
+    n, total = len(G), len(G.tx_src)
+    adj = csr_matrix((np.ones(len(G.edge_src), dtype=np.int8), (G.edge_src, G.edge_dst)), shape=(n, n))
+    n_comp, labels = connected_components(adj, directed=True, connection='weak')
+    tx_comp = labels[G.tx_src]
+    size = np.bincount(tx_comp, minlength=n_comp)
+
+    giants = np.flatnonzero(size > giant_share * total) if total else np.zeros(0, dtype=np.int64)
+    bin_of = np.full(n_comp, -1, dtype=np.int64)
+    bin_of[giants] = np.arange(len(giants))
+    bins = [(0, len(giants) + b) for b in range(max(1, shards))]
+    tail = np.flatnonzero((bin_of < 0) & (size > 0))
+    for c in tail[np.argsort(-size[tail], kind='stable')].tolist():
+        load, b = heapq.heappop(bins)
+        bin_of[c] = b
+        heapq.heappush(bins, (load + int(size[c]), b))
+
+    tx_bin = bin_of[tx_comp]
+    order = np.argsort(tx_bin, kind='stable')
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(tx_bin, minlength=len(giants) + len(bins)))))
+    plan = [(order[bounds[b]:bounds[b + 1]], b < len(giants)) for b in range(len(bounds) - 1)]
+    return [Shard(i, rows, giant) for i, (rows, giant) in enumerate(p for p in plan if len(p[0]))]
+
+
+def shard_frame(G, rows):
+    """Transactions ``rows`` of ``G`` as an ingest-shaped DataFrame."""
+    return pd.DataFrame({
+        'transaction_id': G.tx_id[rows],
+        'sender_id': pd.Categorical.from_codes(G.tx_src[rows], categories=G.accounts),
+        'receiver_id': pd.Categorical.from_codes(G.tx_dst[rows], categories=G.accounts),
+        'amount': G.tx_amount[rows],
+        'timestamp': G.tx_ts[rows].view('datetime64[ns]'),
+    })
+
+
+def analyze_shard(df, population, timeline, concurrency=1):
+    """Full pipeline over one shard; returns its scored accounts and rings (shard-local ring IDs).
+
+    Centrality is normalized by the whole graph's ``population`` and the
+    lifecycle uses the whole dataset's ``timeline``, so every per-account
+    value equals the unsharded one.
+    """
+    G = build_graph(df)
+    features = build_feature_store(G)
+    features.preset(betweenness=betweenness(G, population=population))
+    r = run_stages(STAGES, {'df': df, 'graph': G, 'features': features, 'timeline': tuple(timeline)},
+                   concurrency)
+    return {'accounts': list(r['lifecycle'].values()), 'rings': r['rings']['rings']}
+
+
+def merge_shards(parts, total_accounts, processing_time):
+    """Combine shard results into one ``build_output`` result with global ring IDs."""
+    rings, ids = [], {}
+    for p, part in enumerate(parts):
+        for ring in part['rings']:
+            rings.append((ring['first_ts'], ring['member_accounts'], p, ring))
+    rings.sort(key=lambda x: x[:2])
+    merged_rings = []
+    for counter, (_, _, p, ring) in enumerate(rings, 1):
+        ids[p, ring['ring_id']] = f'RING_{counter:03d}'
+        merged_rings.append({**ring, 'ring_id': ids[p, ring['ring_id']]})
+
+    accounts = [{**acc, 'ring_id': ids.get((p, acc['ring_id']), acc['ring_id'])}
+                for p, part in enumerate(parts) for acc in part['accounts']]
+    accounts.sort(key=lambda a: (-a['suspicion_score'], a['account_id']))
+    return build_output({a['account_id']: a for a in accounts}, merged_rings, None, processing_time,
+                        total_accounts=total_accounts)
+
+
+def iter_shards(G, plan, workers=SHARDS, concurrency=CONCURRENCY):
+    """Yield (shard, result) as shards finish: giants in this process, the tail on a process pool."""
+    population, timeline = len(G), (int(G.tx_ts.min()), int(G.tx_ts.max()))
+    giants = [s for s in plan if s.giant]
+    tail = [s for s in plan if not s.giant]
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(tail))) if len(tail) > 1 and workers > 1 else None
+    local = ThreadPoolExecutor(max_workers=1)
+    try:
+        futures = {}
+        for s in tail if pool else []:
+            futures[pool.submit(analyze_shard, shard_frame(G, s.rows), population, timeline)] = s
+        for s in giants + ([] if pool else tail):
+            futures[local.submit(contextvars.copy_context().run, analyze_shard, shard_frame(G, s.rows),
+                                 population, timeline, concurrency)] = s
+        for fut in as_completed(futures):
+            yield futures[fut], fut.result()
+    finally:
+        local.shutdown(cancel_futures=True)
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+
+def analyze_sharded(df, shards=SHARDS, workers=SHARDS, concurrency=CONCURRENCY, on_shard=None):
+    """Sharded equivalent of one full analysis; ``on_shard(shard, result)`` fires per finished shard."""
+    start = time.time()
+    G = build_graph(df)
+    if len(G.tx_src) == 0:
+        return build_output({}, [], None, time.time() - start, total_accounts=0)
+    parts = []
+    for shard, part in iter_shards(G, plan_shards(G, shards), workers, concurrency):
+        parts.append(part)
+        if on_shard:
+            on_shard(shard, part)
+    return merge_shards(parts, len(G), time.time() - start)
+
+
+# ── File protocol: plan / run / merge through a shared directory ──
+def _shard_file(directory, shard_id):
+    return os.path.join(directory, f'shard-{shard_id:03d}.' + ('parquet' if ARROW_ENABLED else 'csv'))
+
+
+def _result_file(directory, shard_id):
+    return os.path.join(directory, f'shard-{shard_id:03d}.result.json')
+
+
+def write_shards(df, directory, shards=SHARDS):
+    """Write each shard's transactions plus a manifest; returns the manifest."""
+    os.makedirs(directory, exist_ok=True)
+    G = build_graph(df)
+    plan = plan_shards(G, shards)
+    for s in plan:
+        frame = shard_frame(G, s.rows)
+        if ARROW_ENABLED:
+            frame.to_parquet(_shard_file(directory, s.id), index=False)
+        else:
+            frame.to_csv(_shard_file(directory, s.id), index=False)
+    manifest = {
+        'population': len(G),
+        'timeline': [int(G.tx_ts.min()), int(G.tx_ts.max())] if len(G.tx_ts) else [0, 0],
+        'shards': [{'id': s.id, 'file': os.path.basename(_shard_file(directory, s.id)),
+                    'transactions': len(s.rows), 'giant': bool(s.giant)} for s in plan],
+    }
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def run_shard_file(directory, shard_id, concurrency=CONCURRENCY):
+    """Analyze one planned shard and write its result next to it (atomically)."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    df = read_transactions(_shard_file(directory, shard_id))
+    part = analyze_shard(df, manifest['population'], manifest['timeline'], concurrency)
+    tmp = _result_file(directory, shard_id) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(part, f)
+    os.replace(tmp, _result_file(directory, shard_id))
+
+
+def merge_directory(directory):
+    """Merge every shard result in ``directory``; raises if any shard has not finished."""
+    start = time.time()
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    parts = []
+    for s in manifest['shards']:
+        path = _result_file(directory, s['id'])
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'Shard {s["id"]} has no result yet: {path}')
+        with open(path) as f:
+            parts.append(json.load(f))
+    return merge_shards(parts, manifest['population'], time.time() - start)
+
+
+if __name__ == '__main__':
+    cmd, args = sys.argv[1], sys.argv[2:]
+    if cmd == 'plan':
+        shards = int(args[args.index('--shards') + 1]) if '--shards' in args else SHARDS
+        manifest = write_shards(read_transactions(args[0], args[0]), args[1], shards)
+        print(f'{len(manifest["shards"])} shards written to {args[1]}')
+    elif cmd == 'run':
+        with open(os.path.join(args[0], MANIFEST)) as f:
+            ids = [int(a) for a in args[1:]] or [s['id'] for s in json.load(f)['shards']]
+        for shard_id in ids:
+            run_shard_file(args[0], shard_id)
+            print(f'shard {shard_id} done')
+    elif cmd == 'merge':
+        out = merge_directory(args[0])
+        if len(args) > 1:
+            with open(args[1], 'w') as f:
+                json.dump(out, f)
+        else:
+            json.dump(out, sys.stdout)
+    else:
+        sys.exit(f'Unknown command: {cmd} (plan | run | merge)')
@@ -0,0 +1,155 @@
+"""Startup accounting and the optional warm-up for the API process."""
+import importlib, os, sys, tempfile, threading, time
+
+WARMUP = os.environ.get('ENGINE_WARMUP', '0') == '1'
+HEAVY = ('numpy', 'pandas', 'scipy.sparse', 'scipy.special', 'fastapi', 'pipeline')
+
+STARTED = time.perf_counter()
+
+
+def process_age():
+    """Seconds since this process started (from /proc, so it includes interpreter startup); None elsewhere."""
+    try:
+        with open('/proc/self/stat') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])   # field 22, starttime
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def timed_imports(names=HEAVY):
+    """Import ``names`` in order; seconds each took (0 if something earlier already loaded it)."""
+    out = {}
+    for name in names:
+        t = time.perf_counter()
+        if name not in sys.modules:
+            importlib.import_module(name)
+        out[name] = round(time.perf_counter() - t, 4)
+    return out
+
+
+def _sample_csv():
+    """A ring, a fan-in with cash-outs, a shell chain and a little noise: every detector has work."""
+    rows, t = [], 0
+    def tx(src, dst, amount):
+        nonlocal t
+        t += 1
+        rows.append(f'W{len(rows)},{src},{dst},{amount:.2f},2024-01-01 {t // 60:02d}:{t % 60:02d}:00')
+    for i in range(3):
+        tx(f'R{i}', f'R{(i + 1) % 3}', 50000 - 1000 * i)
+    for i in range(12):
+        tx(f'S{i}', 'AGG', 9500 + i)
+    for i in range(3):
+        tx('AGG', f'OUT{i}', 30000 + i)
+    for i in range(3):
+        tx(f'C{i}', f'C{i + 1}', 200000 - 5000 * i)
+    for i in range(20):
+        tx(f'N{i}', f'N{(i * 7 + 3) % 20}', 123 + 37 * i)
+    return 'transaction_id,sender_id,receiver_id,amount,timestamp\n' + '\n'.join(rows) + '\n'
+
+
+def _timed(out, name, fn, *args, **kwargs):
+    t = time.perf_counter()
+    result = fn(*args, **kwargs)
+    out[name] = round(time.perf_counter() - t, 4)
+    return result
+
+
+def warm_kernels(df):
+    """Call each vectorized kernel once on ``df``'s graph; seconds per kernel.
+
+    NumPy and SciPy have no JIT to warm. A kernel's first call pays for
+    lazy submodule imports, dtype dispatch and first-touch allocations instead.
+    """
+    import numpy as np
+    from graph_engine import build_graph
+    from account_index import AccountIndex
+    from feature_store import FeatureStore
+    from centrality import _brandes_batched, _brandes_small
+    from detectors.cycle_detector import iter_cycles
+    from detectors.smurfing_detector import detect_smurfing
+    from detectors.shell_detector import detect_shells
+    from detectors.benford_detector import digit_test
+
+    out = {}
+    G = _timed(out, 'graph', build_graph, df)                  # lexsort, reduceat, CSR/CSC offsets
+    index = _timed(out, 'account_index', AccountIndex, G)      # per-side sorts, searchsorted pointers
+    features = FeatureStore(G, index)
+    _timed(out, 'features', features.get, 'money_in', 'in_amount_std', 'first_ts', 'pass_through')
+    _timed(out, 'fan_windows', detect_smurfing, G, None, index=index)
+    _timed(out, 'velocity', detect_shells, G, None, features=features, index=index,
+           betweenness=np.zeros(len(G)))
+    _timed(out, 'benford', digit_test, G, index=index)
+    _timed(out, 'cycles', lambda: list(iter_cycles(G, workers=1)))
+    # Both betweenness paths, on directed rings: the sample's components are all small
+    small, large = np.arange(10), np.arange(100)
+    _timed(out, 'betweenness', lambda: (_brandes_small(np.arange(11), (small + 1) % 10, small.tolist()),
+                                        _brandes_batched(np.arange(101), (large + 1) % 100, large)))
+    return out
+
+
+def warm_up():
+    """Warm each kernel, then run one analysis of the sample end to end (bypassing the result cache).
+
+    Returns the kernel timings from ``warm_kernels``.
+    """
+    from ingest import read_transactions
+    from pipeline import run_pipeline
+    from output_builder import build_output
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(_sample_csv())
+        df = read_transactions(path, 'warmup.csv')
+        kernels = warm_kernels(df)
+        r = run_pipeline(df)
+        build_output(r['lifecycle'], r['rings']['rings'], df, 0.0, total_accounts=len(r['graph']))
+    finally:
+        os.unlink(path)
+    return kernels
+
+
+class Startup:
+    """What ``/health`` reports about this process's startup."""
+
+    def __init__(self):
+        self.imports = {}
+        self.import_seconds = self.ready_seconds = None
+        self.warmup = {'state': 'off' if not WARMUP else 'pending', 'seconds': None,
+                       'pool_workers': 0, 'kernels': None, 'error': None}
+
+    def record_imports(self, names=HEAVY):
+        t = time.perf_counter()
+        self.imports = timed_imports(names)
+        self.import_seconds = round(time.perf_counter() - t, 4)
+
+    def ready(self):
+        """Call once the app can serve; reports time since process (or, failing that, module) start."""
+        age = process_age()
+        self.ready_seconds = round(age if age is not None else time.perf_counter() - STARTED, 3)
+
+    def start_warmup(self):
+        """Warm up on a daemon thread; requests are served meanwhile."""
+        if WARMUP:
+            threading.Thread(target=self._warm, name='warmup', daemon=True).start()
+
+    def _warm(self):
+        from workers import prefork
+        t = time.perf_counter()
+        self.warmup['state'] = 'running'
+        try:
+            self.warmup['kernels'] = warm_up()
+            self.warmup['pool_workers'] = prefork()
+            self.warmup['state'] = 'done'
+        except Exception as e:   # warm-up is best effort; analyses still work cold
+            self.warmup.update(state='failed', error=repr(e))
+        self.warmup['seconds'] = round(time.perf_counter() - t, 3)
+
+    def to_dict(self):
+        return {'ready_seconds': self.ready_seconds, 'import_seconds': self.import_seconds,
+                'imports': self.imports, 'warmup': dict(self.warmup)}
+
+
+STARTUP = Startup()
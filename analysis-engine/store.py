@@ -0,0 +1,292 @@
+"""Embedded on-disk transaction store: day partitions of memory-mapped columns.
+
+Layout under ``STORE_DIR``: ``accounts.jsonl`` (account code = line) and
+``day=YYYY-MM-DD/part-NNNNNNNN/`` directories of row-aligned .npy columns,
+sorted tx_id hashes for dedup and a per-part account index.
+"""
+import json, os, shutil, threading, time
+import numpy as np
+import pandas as pd
+
+from graph_engine import graph_from_codes, to_ns
+from output_builder import build_output
+from pipeline import STAGES, CONCURRENCY, run_stages
+from profiling import span
+
+DIRECTORY = os.environ.get('STORE_DIR', 'store')
+COMPACT_PARTS = int(os.environ.get('STORE_COMPACT_PARTS', 4))        # parts per day that trigger a merge
+COMPACT_INTERVAL = float(os.environ.get('STORE_COMPACT_SECONDS', 60))  # background check period
+DAY_NS = 86_400_000_000_000
+COLUMNS = ('tx_id', 'src', 'dst', 'amount', 'ts')
+
+
+def _hash(ids):
+    return pd.util.hash_array(np.asarray(ids, dtype=object))
+
+
+def _day(name):
+    return np.datetime64(name[len('day='):], 'D').astype('datetime64[ns]').astype(np.int64)
+
+
+class Part:
+    """One partition directory, memory-mapped on open."""
+
+    def __init__(self, path):
+        self.path = path
+        self.day = _day(os.path.basename(os.path.dirname(path)))
+        load = lambda name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+        self.cols = {c: load(c) for c in COLUMNS}
+        self.txhash, self.acc, self.acc_ptr, self.acc_rows = (load(n) for n in ('txhash', 'acc', 'acc_ptr', 'acc_rows'))
+
+    def __len__(self):
+        return len(self.cols['ts'])
+
+    def rows(self, start=None, end=None, accounts=None):
+        """Row numbers inside [start, end) touching any of ``accounts`` (codes); None = all rows."""
+        rows = None
+        if accounts is not None:
+            pos = np.searchsorted(self.acc, accounts)
+            pos = pos[(pos < len(self.acc)) & (self.acc[np.minimum(pos, len(self.acc) - 1)] == accounts)]
+            rows = np.unique(np.concatenate([self.acc_rows[self.acc_ptr[p]:self.acc_ptr[p + 1]] for p in pos]
+                                            or [np.zeros(0, dtype=np.int64)]))
+        if (start is not None and start > self.day) or (end is not None and end < self.day + DAY_NS):
+            ts = self.cols['ts'] if rows is None else self.cols['ts'][rows]
+            keep = np.ones(len(ts), dtype=bool)
+            if start is not None:
+                keep &= ts >= start
+            if end is not None:
+                keep &= ts < end
+            rows = np.flatnonzero(keep) if rows is None else rows[keep]
+        return rows
+
+
+def _write_part(path, cols, publish=True):
+    """Write ``cols`` (plus dedup hashes and the account index) as a new part, atomically.
+
+    With ``publish`` False the part is left at ``path + '.tmp'``, which
+    readers skip, for the caller to rename; returns where it was written.
+    """
+    tmp = path + '.tmp'
+    os.makedirs(tmp)
+    for name, values in cols.items():
+        np.save(os.path.join(tmp, name + '.npy'), values)
+    np.save(os.path.join(tmp, 'txhash.npy'), np.sort(_hash(cols['tx_id'])))
+    n = len(cols['src'])
+    # (account code, row) pairs, each row once per account it touches, sorted by code then row
+    key = np.unique(np.concatenate((cols['src'], cols['dst'])).astype(np.int64) * n + np.tile(np.arange(n), 2))
+    acc, ptr = np.unique(key // n, return_index=True)
+    np.save(os.path.join(tmp, 'acc.npy'), acc.astype(np.int32))
+    np.save(os.path.join(tmp, 'acc_ptr.npy'), np.append(ptr, len(key)).astype(np.int64))
+    np.save(os.path.join(tmp, 'acc_rows.npy'), key % n)
+    if not publish:
+        return tmp
+    os.rename(tmp, path)
+    return path
+
+
+class TransactionStore:
+    """Append/query/compact over ``directory``; one instance per process."""
+
+    def __init__(self, directory=DIRECTORY):
+        self.directory = directory
+        self.codes, self.names = {}, []
+        self._lock = threading.Lock()       # parts list and account dictionary
+        self._write = threading.Lock()      # one append or compaction swap at a time
+        self._compacting = threading.Lock()
+        self._wake = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+        self.compactions = 0
+        self._seq = 0
+        path = os.path.join(directory, 'accounts.jsonl')
+        if os.path.exists(path):
+            with open(path) as f:
+                self.names = [json.loads(line) for line in f]
+            self.codes = {name: i for i, name in enumerate(self.names)}
+        for parts in self._days().values():
+            for p in parts:
+                self._seq = max(self._seq, int(os.path.basename(p).split('-')[1]))
+
+    # ── Layout ───────────────────────────────────────────────────
+    def _days(self):
+        """Day directory name → its part paths (oldest first)."""
+        out = {}
+        if not os.path.isdir(self.directory):
+            return out
+        for day in sorted(os.listdir(self.directory)):
+            if not day.startswith('day='):
+                continue
+            base = os.path.join(self.directory, day)
+            for p in sorted(os.listdir(base)):
+                if p.startswith('part-') and not p.endswith('.tmp'):
+                    out.setdefault(day, []).append(os.path.join(base, p))
+        return out
+
+    def _next_part(self, day):
+        self._seq += 1
+        return os.path.join(self.directory, day, f'part-{self._seq:08d}')
+
+    def _encode(self, names):
+        """Account names → codes, extending (and persisting) the dictionary with new ones."""
+        uniques, inverse = np.unique(np.asarray(names, dtype=object), return_inverse=True)
+        new = [u for u in uniques.tolist() if u not in self.codes]
+        if new:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, 'accounts.jsonl'), 'a') as f:
+                f.write(''.join(json.dumps(u) + '\n' for u in new))
+            with self._lock:
+                for u in new:
+                    self.codes[u] = len(self.names)
+                    self.names.append(u)
+        return np.array([self.codes[u] for u in uniques.tolist()], dtype=np.int32)[inverse]
+
+    # ── Writes ───────────────────────────────────────────────────
+    def append(self, df):
+        """Store a cleaned batch (ingest's columns) by day; duplicate transaction_ids are skipped."""
+        with self._write, span('store.append', items=len(df)):
+            ids = df['transaction_id'].to_numpy(dtype=object)
+            h = _hash(ids)
+            fresh = ~pd.Series(ids).duplicated().to_numpy()
+            for part in self._open():
+                pos = np.searchsorted(part.txhash, h)
+                fresh &= ~((pos < len(part.txhash)) & (part.txhash[np.minimum(pos, len(part.txhash) - 1)] == h))
+            df = df[fresh]
+            stats = {'received': int(len(fresh)), 'appended': int(len(df)), 'duplicates': int(len(fresh) - len(df)),
+                     'days': []}
+            if len(df) == 0:
+                return stats
+            ts = to_ns(df['timestamp'])
+            cols = {'tx_id': df['transaction_id'].to_numpy(dtype=str),
+                    'src': self._encode(df['sender_id'].astype(str).to_numpy(object)),
+                    'dst': self._encode(df['receiver_id'].astype(str).to_numpy(object)),
+                    'amount': df['amount'].to_numpy(dtype=np.float64), 'ts': ts}
+            days = ts // DAY_NS
+            order = np.argsort(days, kind='stable')
+            bounds = np.flatnonzero(np.diff(days[order])) + 1
+            for rows in np.split(order, bounds):
+                day = 'day=' + str(np.datetime64(int(days[rows[0]]), 'D'))
+                os.makedirs(os.path.join(self.directory, day), exist_ok=True)
+                with self._lock:
+                    path = self._next_part(day)
+                _write_part(path, {c: v[rows] for c, v in cols.items()})
+                stats['days'].append(day[len('day='):])
+            if any(len(p) >= COMPACT_PARTS for p in self._days().values()):
+                self._wake.set()
+            return stats
+
+    def compact(self, min_parts=2):
+        """Merge each day's parts (when it has at least ``min_parts``) into one, sorted by time."""
+        merged = 0
+        with self._compacting:
+            for day, paths in self._days().items():
+                if len(paths) >= min_parts:
+                    self._merge(day, paths)
+                    merged += 1
+        self.compactions += merged
+        return merged
+
+    def _merge(self, day, paths):
+        with span('store.compact') as sp:
+            parts = [Part(p) for p in paths]
+            cols = {c: np.concatenate([p.cols[c] for p in parts]) for c in COLUMNS}
+            order = np.argsort(cols['ts'], kind='stable')
+            sp.items = len(order)
+            with self._write:
+                with self._lock:
+                    path = self._next_part(day)
+                tmp = _write_part(path, {c: v[order] for c, v in cols.items()}, publish=False)
+                # One swap under the lock: readers see either the old parts or the new one, never both
+                with self._lock:
+                    os.rename(tmp, path)
+                    for p in paths:
+                        os.rename(p, p + '.tmp')
+            for p in paths:
+                shutil.rmtree(p + '.tmp')
+
+    # ── Background compaction ────────────────────────────────────
+    def start_compactor(self, interval=COMPACT_INTERVAL):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._compactor, args=(interval,), name='store-compactor',
+                                            daemon=True)
+            self._thread.start()
+
+    def _compactor(self, interval):
+        while not self._done.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            if not self._done.is_set():
+                self.compact(min_parts=COMPACT_PARTS)
+
+    def stop_compactor(self):
+        if self._thread is not None:
+            self._done.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    # ── Reads ────────────────────────────────────────────────────
+    def _open(self, start=None, end=None):
+        """Parts whose day overlaps [start, end), mapped while holding the lock."""
+        with self._lock:
+            return [Part(p) for day, paths in self._days().items()
+                    if (start is None or _day(day) + DAY_NS > start) and (end is None or _day(day) < end)
+                    for p in paths]
+
+    def graph(self, start=None, end=None, accounts=None):
+        """TxGraph of stored transactions in [start, end) (ns) touching any of ``accounts``.
+
+        Only the selected rows of each mapped part are read; None when nothing matches.
+        """
+        with span('store.query') as s:
+            codes = None
+            if accounts is not None:
+                codes = np.unique(np.array([self.codes[a] for a in accounts if a in self.codes], dtype=np.int32))
+            picked = []
+            for part in self._open(start, end):
+                rows = part.rows(start, end, codes)
+                picked.append({c: (v if rows is None else v[rows]) for c, v in part.cols.items()})
+            cols = {c: np.concatenate([p[c] for p in picked]) if picked else np.zeros(0) for c in COLUMNS}
+            s.items = len(cols['ts'])
+            if len(cols['ts']) == 0:
+                return None
+            with self._lock:
+                names = np.asarray(self.names, dtype=object)
+            return graph_from_codes(names, cols['src'], cols['dst'], np.asarray(cols['amount'], dtype=np.float64),
+                                    np.asarray(cols['ts'], dtype=np.int64), cols['tx_id'].astype(object))
+
+    def stats(self):
+        days = self._days()
+        parts = self._open()
+        return {'directory': self.directory, 'days': len(days), 'parts': len(parts),
+                'transactions': int(sum(len(p) for p in parts)), 'accounts': len(self.names),
+                'first_day': min(days)[len('day='):] if days else None,
+                'last_day': max(days)[len('day='):] if days else None,
+                'compactions': self.compactions}
+
+
+def parse_time(value):
+    """Query bound (ISO date or date-time; aware ones are converted to UTC) → int64 ns, or None."""
+    if not value:
+        return None
+    t = pd.Timestamp(value)
+    return int((t.tz_convert(None) if t.tzinfo is not None else t).value)
+
+
+def analyze_range(start=None, end=None, accounts=None, concurrency=CONCURRENCY, store=None):
+    """(output, stage results) for stored transactions in [start, end) touching ``accounts``.
+
+    An account filter keeps every transaction sent or received by one of
+    them, so rings and fans among their counterparties are only partly seen.
+    """
+    store = store or STORE
+    begin = time.time()
+    G = store.graph(start, end, accounts)
+    if G is None:
+        return build_output({}, [], None, time.time() - begin, total_accounts=0), None
+    r = run_stages(STAGES, {'df': None, 'graph': G}, concurrency)
+    with span('output', items=len(r['lifecycle'])):
+        return build_output(r['lifecycle'], r['rings']['rings'], None, time.time() - begin,
+                            total_accounts=G.number_of_nodes()), r
+
+
+STORE = TransactionStore()
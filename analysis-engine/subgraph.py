@@ -0,0 +1,182 @@
+"""k-hop neighbourhoods of accounts and rings, for drill-down in the investigation UI."""
+import os, threading, uuid
+from collections import OrderedDict
+import numpy as np
+
+from cache import CACHE
+from pipeline import STAGES, stage_keys
+from profiling import span
+
+KEEP = int(os.environ.get('ANALYSIS_KEEP', 8))                   # analyses kept for subgraph queries
+NODE_BUDGET = int(os.environ.get('SUBGRAPH_NODE_BUDGET', 200))   # default node cap per response
+MAX_BUDGET = 5000
+MAX_HOPS = 4
+EDGES_PER_NODE = 4          # edge cap is this × the node budget, highest flow kept
+MEMO_ENTRIES = 256          # memoized subgraphs per analysis
+
+
+class GraphUnavailable(LookupError):
+    """The analysis is known but its graph was not kept (sharded run, or evicted from the cache)."""
+
+
+def _ranges(ptr, nodes):
+    """Concatenated ``ptr[v]:ptr[v+1]`` ranges of ``nodes``."""
+    starts, lens = ptr[nodes], ptr[nodes + 1] - ptr[nodes]
+    return np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum())
+
+
+def neighborhood(G, seeds, hops=2, budget=NODE_BUDGET):
+    """(node ids, hop per node, truncated) within ``hops`` of ``seeds``, at most ``budget`` nodes.
+
+    Expands a whole hop at a time, so every node's hop is its shortest
+    distance from the seeds. Each new node is ranked by the largest transfer
+    (either direction) linking it to the previous hop; when the budget cannot
+    take the whole hop, the highest-flow nodes are kept and the rest dropped.
+    """
+    seeds = np.asarray(list(dict.fromkeys(seeds)), dtype=np.int64)
+    truncated = len(seeds) > budget
+    nodes, dist = [seeds[:budget]], [np.zeros(min(len(seeds), budget), dtype=np.int64)]
+    seen = np.zeros(len(G), dtype=bool)
+    seen[nodes[0]] = True
+    frontier, room = nodes[0], budget - len(nodes[0])
+    for h in range(1, hops + 1):
+        out = _ranges(G.out_ptr, frontier)
+        inc = G.in_edges[_ranges(G.in_ptr, frontier)]
+        nbr = np.concatenate((G.edge_dst[out], G.edge_src[inc]))
+        flow = np.concatenate((G.edge_amount[out], G.edge_amount[inc]))
+        order = np.argsort(-flow, kind='stable')
+        nbr = nbr[order][~seen[nbr[order]]]
+        _, first = np.unique(nbr, return_index=True)
+        frontier = nbr[np.sort(first)]     # best flow first
+        if len(frontier) > room:
+            frontier, truncated = frontier[:room], True
+        if len(frontier) == 0:
+            break
+        seen[frontier] = True
+        nodes.append(frontier)
+        dist.append(np.full(len(frontier), h, dtype=np.int64))
+        room -= len(frontier)
+    return np.concatenate(nodes), np.concatenate(dist), truncated
+
+
+def induced_edges(G, nodes, limit):
+    """Edge ids between ``nodes``, highest total amount first; (edges, truncated)."""
+    inside = np.zeros(len(G), dtype=bool)
+    inside[nodes] = True
+    e = _ranges(G.out_ptr, nodes)
+    e = e[inside[G.edge_dst[e]]]
+    e = e[np.argsort(-G.edge_amount[e], kind='stable')]
+    return e[:limit], len(e) > limit
+
+
+def _iso(ns):
+    return np.datetime_as_string(np.asarray(ns, dtype='datetime64[ns]'), unit='s').tolist()
+
+
+class Analysis:
+    """One analysis' graph (or a loader for it) and its reported accounts and rings (in output order)."""
+
+    def __init__(self, out, G=None, load=None):
+        self.G, self._load = G, load
+        self.account_rows, self.ring_rows = out['suspicious_accounts'], out['fraud_rings']
+        self.accounts = {a['account_id']: a for a in self.account_rows}
+        self.rings = {r['ring_id']: r for r in self.ring_rows}
+        self.memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def graph(self):
+        if self.G is None and self._load is not None:
+            self.G = self._load()
+        if self.G is None:
+            raise GraphUnavailable('The graph of this analysis was not kept (sharded run, or evicted from the '
+                                   'result cache); run it again')
+        return self.G
+
+    def subgraph(self, seeds, hops, budget):
+        """Nodes (with risk attributes and hop distance) and aggregated edges around ``seeds`` (names)."""
+        key = (tuple(seeds), hops, budget)
+        with self._lock:
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                return self.memo[key]
+        G = self.graph()
+        with span('subgraph') as sp:
+            nodes, dist, truncated = neighborhood(G, [G.index[a] for a in seeds], hops, budget)
+            edges, cut = induced_edges(G, nodes, EDGES_PER_NODE * budget)
+            sp.items = len(nodes)
+            first, last = G.edge_first_ts[edges], G.edge_last_ts[edges]
+            result = {
+                'nodes': [self._node(a, d) for a, d in zip(G.accounts[nodes].tolist(), dist.tolist())],
+                'edges': [{'source': s, 'target': t, 'total_amount': round(amount, 2), 'count': count,
+                           'first_ts': f, 'last_ts': l, 'span_hours': round(hrs, 2)}
+                          for s, t, amount, count, f, l, hrs in zip(
+                              G.accounts[G.edge_src[edges]].tolist(), G.accounts[G.edge_dst[edges]].tolist(),
+                              G.edge_amount[edges].tolist(), G.edge_count[edges].tolist(),
+                              _iso(first), _iso(last), ((last - first) / 3.6e12).tolist())],
+                'truncated': bool(truncated or cut),
+            }
+        with self._lock:
+            self.memo[key] = result
+            while len(self.memo) > MEMO_ENTRIES:
+                self.memo.popitem(last=False)
+        return result
+
+    def _node(self, account, hop):
+        info = self.accounts.get(account, {})
+        return {'account_id': account, 'hop': hop, 'suspicion_score': info.get('suspicion_score', 0),
+                'detected_patterns': info.get('detected_patterns', []), 'ring_id': info.get('ring_id', 'RING_NONE'),
+                'lifecycle_stage': info.get('lifecycle_stage')}
+
+    def account_subgraph(self, account, hops=2, budget=NODE_BUDGET):
+        if account not in self.graph().index:
+            raise KeyError(account)
+        return {'account_id': account, 'hops': hops, **self.subgraph([account], hops, budget)}
+
+    def ring_subgraph(self, ring_id, hops=0, budget=NODE_BUDGET):
+        ring = self.rings[ring_id]
+        return {'ring_id': ring_id, 'hops': hops, **self.subgraph(ring['member_accounts'], hops, budget)}
+
+
+class AnalysisRegistry:
+    """The last ``keep`` analyses by id, least recently used evicted first."""
+
+    def __init__(self, keep=KEEP):
+        self.keep = keep
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, analysis_id, analysis):
+        with self._lock:
+            old = self.entries.pop(analysis_id, None)
+            if analysis.G is None and old is not None and old.G is not None:
+                analysis.G = old.G   # same upload again: keep the graph already in memory
+            self.entries[analysis_id] = analysis
+            while len(self.entries) > self.keep:
+                self.entries.popitem(last=False)
+
+    def get(self, analysis_id):
+        with self._lock:
+            analysis = self.entries.get(analysis_id)
+            if analysis is not None:
+                self.entries.move_to_end(analysis_id)
+            return analysis
+
+
+ANALYSES = AnalysisRegistry()
+
+
+def register(out, r=None, digest=None):
+    """Keep an analysis for subgraph queries; returns ``out`` with its ``analysis_id``.
+
+    Uploads are identified by content, so re-uploading a file gives the same
+    id; when the output came from the result cache the graph is loaded from
+    there on first use.
+    """
+    analysis_id = digest[:16] if digest else uuid.uuid4().hex[:16]
+    G = r.get('graph') if r is not None else None
+    load = None
+    if G is None and digest is not None and CACHE is not None:
+        key = stage_keys(STAGES, digest)['graph']
+        load = lambda: CACHE.get(key)
+    ANALYSES.put(analysis_id, Analysis(out, G, load))
+    return {**out, 'analysis_id': analysis_id}
@@ -0,0 +1,204 @@
+"""The original per-account pandas/NetworkX detectors, kept as reference implementations.
+
+Semantics are the original engine's, with two deliberate differences:
+timestamps are compared in nanoseconds whatever resolution pandas parsed
+them at (the original assumed nanoseconds, which pandas 3 no longer
+guarantees), and high velocity checks every receive/send pair instead of
+sampling the last/first 100 of busy accounts.
+"""
+from collections import defaultdict
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+WINDOW_HRS = 72
+FAN_THRESH = 10
+THRESHOLDS = [10000, 25000, 50000, 100000, 200000, 500000]
+BENFORD = np.array([np.log10(1 + 1 / d) for d in range(1, 10)])
+
+
+def _ns(ts):
+    return pd.to_datetime(ts).values.astype('datetime64[ns]').astype(np.int64)
+
+
+def nx_graph(df):
+    G = nx.DiGraph()
+    G.add_nodes_from(pd.unique(pd.concat([df['sender_id'], df['receiver_id']]).astype(str)))
+    for (s, r), grp in df.groupby(['sender_id', 'receiver_id'], observed=True):
+        G.add_edge(str(s), str(r), total_amount=grp['amount'].sum())
+    return G
+
+
+def detect_smurfing(df):
+    res = defaultdict(lambda: {'patterns': [], 'scores': []})
+    window = WINDOW_HRS * 3_600_000_000_000
+    df = df.assign(sender_id=df['sender_id'].astype(str), receiver_id=df['receiver_id'].astype(str),
+                   ts=_ns(df['timestamp']))
+    recv, sent = dict(tuple(df.groupby('receiver_id'))), dict(tuple(df.groupby('sender_id')))
+    for account in set(recv) | set(sent):
+        for txs, other, pattern in ((recv.get(account), 'sender_id', 'fan_in'),
+                                    (sent.get(account), 'receiver_id', 'fan_out')):
+            if txs is None or len(txs) < FAN_THRESH:
+                continue
+            txs = txs.sort_values('ts', kind='stable')
+            cps, stamps, left = txs[other].values, txs['ts'].values, 0
+            for right in range(len(stamps)):
+                while stamps[right] - stamps[left] > window:
+                    left += 1
+                if len(set(cps[left:right + 1])) >= FAN_THRESH:
+                    res[account]['patterns'].append(pattern)
+                    res[account]['scores'].append(20)
+                    break
+        amounts = [*(recv[account]['amount'] if account in recv else []),
+                   *(sent[account]['amount'] if account in sent else [])]
+        if any(t * 0.95 <= a < t for a in amounts for t in THRESHOLDS):
+            res[account]['patterns'].append('below_threshold_amounts')
+            res[account]['scores'].append(10)
+    return dict(res)
+
+
+def _lead(a):
+    for ch in str(abs(float(a))):
+        if ch.isdigit() and ch != '0':
+            return int(ch)
+    return 0
+
+
+def benford_analysis(df):
+    """p-value per account with at least 20 transactions and 10 usable leading digits."""
+    results = {}
+    sides = pd.concat([df[['sender_id', 'amount']].set_axis(['account', 'amount'], axis=1),
+                       df[['receiver_id', 'amount']].set_axis(['account', 'amount'], axis=1)])
+    sides['account'] = sides['account'].astype(str)
+    for acc, txs in sides.groupby('account'):
+        if len(txs) < 20:
+            continue
+        obs = np.zeros(9)
+        for d in map(_lead, txs['amount']):
+            if 1 <= d <= 9:
+                obs[d - 1] += 1
+        n = obs.sum()
+        if n < 10:
+            continue
+        exp = np.maximum(BENFORD * n, 0.5)
+        # stats.chisquare insists the sums match; the 0.5 floor can break that, so sum by hand
+        chi = ((obs - exp) ** 2 / exp).sum()
+        results[acc] = float(stats.chi2.sf(chi, 8))
+    return results
+
+
+def high_velocity(df, secs=6 * 3600):
+    """Accounts that sent within ``secs`` after (or at) one of their receives."""
+    df = df.assign(sender_id=df['sender_id'].astype(str), receiver_id=df['receiver_id'].astype(str),
+                   s=_ns(df['timestamp']) // 10**9)
+    recv = {a: g['s'].values for a, g in df.groupby('receiver_id')}
+    found = set()
+    for acc, g in df.groupby('sender_id'):
+        if acc in recv:
+            diffs = g['s'].values[:, None] - recv[acc][None, :]
+            if np.any((diffs >= 0) & (diffs <= secs)):
+                found.add(acc)
+    return found
+
+
+def shell_accounts(df):
+    G = nx_graph(df)
+    bc = nx.betweenness_centrality(G, normalized=True)
+    s, r = df['sender_id'].astype(str), df['receiver_id'].astype(str)
+    money_in, money_out = df.groupby(r)['amount'].sum(), df.groupby(s)['amount'].sum()
+    count = s.value_counts().add(r.value_counts(), fill_value=0)
+    found = set()
+    for node in G.nodes():
+        mi, mo = money_in.get(node, 0), money_out.get(node, 0)
+        if bc[node] > 0.05 and count.get(node, 0) <= 5 and mi > 0 and mo / mi > 0.85:
+            found.add(node)
+    return found
+
+
+def whitelist(df):
+    found = set()
+    df = df.assign(sender_id=df['sender_id'].astype(str), receiver_id=df['receiver_id'].astype(str))
+    recv, sent = dict(tuple(df.groupby('receiver_id'))), dict(tuple(df.groupby('sender_id')))
+    for node in set(recv) | set(sent):
+        in_txs, out_txs = recv.get(node), sent.get(node)
+        if in_txs is not None and len(in_txs) >= 20:
+            mean = in_txs['amount'].mean()
+            cv = in_txs['amount'].std() / mean if mean > 0 else 0
+            if in_txs['sender_id'].nunique() / len(in_txs) > 0.6 and 0.1 < cv < 2.5:
+                found.add(node)
+                continue
+        if out_txs is not None and len(out_txs) >= 10:
+            mean_o = out_txs['amount'].mean()
+            cv_o = out_txs['amount'].std() / mean_o if mean_o > 0 else 1
+            if cv_o < 0.15 and out_txs['receiver_id'].nunique() > 8:
+                found.add(node)
+    return found
+
+
+def time_respecting_cycles(df, window_hrs=WINDOW_HRS, min_len=3, max_len=5):
+    """Canonical member tuples of simple cycles that some rotation can traverse in time order.
+
+    Brute force: every simple cycle from NetworkX, every starting member,
+    every choice of transaction per hop.
+    """
+    G = nx_graph(df)
+    ts = {}
+    for (s, r), grp in df.groupby(['sender_id', 'receiver_id'], observed=True):
+        ts[str(s), str(r)] = sorted(_ns(grp['timestamp']).tolist())
+    window = window_hrs * 3_600_000_000_000
+    found = set()
+    for cyc in nx.simple_cycles(G, length_bound=max_len):
+        if len(cyc) < min_len:
+            continue
+        for k in range(len(cyc)):
+            rot = cyc[k:] + cyc[:k]
+            hops = [ts[rot[i], rot[(i + 1) % len(rot)]] for i in range(len(rot))]
+            if any(_closes(hops[1:], t0, t0, window) for t0 in hops[0]):
+                m = cyc.index(min(cyc))
+                found.add(tuple(cyc[m:] + cyc[:m]))
+                break
+    return found
+
+
+def _closes(hops, prev, t0, window):
+    if not hops:
+        return True
+    return any(_closes(hops[1:], t, t0, window) for t in hops[0] if prev <= t <= t0 + window)
+
+
+def compute_scores(accounts, df, cycles, smurfing, shells, benford, whitelist, ring_ids):
+    """The original scoring loop; ``ring_ids`` maps account → ring IDs it belongs to."""
+    s, r = df['sender_id'].astype(str), df['receiver_id'].astype(str)
+    money_in = df.groupby(r)['amount'].sum().to_dict()
+    money_out = df.groupby(s)['amount'].sum().to_dict()
+    suspicious = {}
+    for account in accounts:
+        if account in whitelist:
+            continue
+        score, patterns, rings = 0, [], list(ring_ids.get(account, []))
+        for found in (cycles['accounts'], smurfing, shells):
+            if account in found:
+                score += sum(found[account]['scores'])
+                patterns += found[account]['patterns']
+        if account in benford:
+            b = benford[account]
+            score += b['score_delta']
+            if b['pattern']:
+                patterns.append(b['pattern'])
+        if len(set(patterns)) >= 2:
+            score *= 1.3
+        mi, mo = money_in.get(account, 0), money_out.get(account, 0)
+        if mi > 0 and mo / mi > 0.95:
+            score *= 1.2
+        if len(set(rings)) > 1:
+            score *= 1.3
+            patterns.append('super_node')
+        if score >= 10:
+            suspicious[account] = {
+                'account_id': account,
+                'suspicion_score': round(min(score, 100), 1),
+                'detected_patterns': list(dict.fromkeys(patterns)),
+                'ring_id': rings[0] if rings else 'RING_NONE'
+            }
+    return dict(sorted(suspicious.items(), key=lambda x: x[1]['suspicion_score'], reverse=True))
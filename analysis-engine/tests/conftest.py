@@ -0,0 +1,65 @@
+import os, random, runpy, sys, tempfile
+
+ENGINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA = os.path.join(ENGINE, '..', 'test-data')
+sys.path[:0] = [ENGINE, TEST_DATA]
+
+# Before any engine module is imported: no shared on-disk cache, no warm-up pool, a scratch store
+os.environ.setdefault('RESULT_CACHE', '0')
+os.environ.setdefault('ENGINE_WARMUP', '0')
+os.environ.setdefault('STORE_DIR', tempfile.mkdtemp(prefix='mulenet-store-'))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BASE = pd.Timestamp('2024-01-01')
+COLUMNS = ['transaction_id', 'sender_id', 'receiver_id', 'amount', 'timestamp']
+GENERATED = ('test1_cycle.csv', 'test2_smurfing.csv', 'test3_shell.csv', 'test4_merchant_trap.csv',
+             'test5_payroll_trap.csv', 'test6_10k_stress.csv')
+
+
+def frame(rows):
+    """Transactions from (id, sender, receiver, amount, hours after BASE) tuples."""
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df['timestamp'] = BASE + pd.to_timedelta(df['timestamp'], unit='h')
+    return df
+
+
+def write_csv(df, path):
+    df.assign(timestamp=df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')).to_csv(path, index=False)
+    return str(path)
+
+
+def random_frame(n, accounts, hours=240, seed=0, prefix='T'):
+    """``n`` random transfers between ``accounts`` accounts, seeded."""
+    rng = np.random.default_rng(seed)
+    src = rng.integers(0, accounts, n)
+    dst = (src + rng.integers(1, accounts, n)) % accounts
+    return frame([(f'{prefix}{i:06d}', f'A{s:04d}', f'A{d:04d}', round(float(a), 2), float(h))
+                  for i, (s, d, a, h) in enumerate(zip(src, dst, rng.uniform(50, 60000, n),
+                                                       rng.uniform(0, hours, n)))])
+
+
+@pytest.fixture(scope='session')
+def generated(tmp_path_factory):
+    """Directory holding test-data/generate.py's six files, generated once with a fixed seed."""
+    out = tmp_path_factory.mktemp('generated')
+    cwd, state = os.getcwd(), random.getstate()
+    os.chdir(out)
+    try:
+        random.seed(7)
+        runpy.run_path(os.path.join(TEST_DATA, 'generate.py'))
+    finally:
+        os.chdir(cwd)
+        random.setstate(state)
+    return out
+
+
+@pytest.fixture(scope='module')
+def client():
+    """TestClient on the FastAPI app, with its lifespan (job workers, compactor) running."""
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as c:
+        yield c
@@ -0,0 +1,55 @@
+import numpy as np
+
+from account_index import AccountIndex, build_account_index
+from conftest import random_frame
+from graph_engine import build_graph
+
+
+def _by_account(df, account_col, other_col):
+    """{account: [(counterparty, ts, amount)] in time order} straight from the frame."""
+    out = {}
+    rows = df.assign(ts=df['timestamp'].values.astype('datetime64[ns]').view('int64'))
+    for acc, grp in rows.sort_values('ts', kind='stable').groupby(account_col, sort=False):
+        out[acc] = sorted(zip(grp[other_col], grp['ts'], grp['amount']), key=lambda x: x[1])
+    return out
+
+
+def _view(G, side, i):
+    txs = side[i]
+    assert np.array_equal(txs.amount, G.tx_amount[txs.rows]) and np.array_equal(txs.ts, G.tx_ts[txs.rows])
+    assert np.all(np.diff(txs.ts) >= 0)
+    return sorted(zip(G.accounts[txs.counterparty].tolist(), txs.ts.tolist(), txs.amount.tolist()),
+                  key=lambda x: x[1])
+
+
+def test_sides_match_grouped_frame():
+    df = random_frame(2000, 70, seed=1)
+    G = build_graph(df)
+    index = AccountIndex(G)
+    incoming = _by_account(df, 'receiver_id', 'sender_id')
+    outgoing = _by_account(df, 'sender_id', 'receiver_id')
+    for i, acc in enumerate(G.accounts.tolist()):
+        assert sorted(_view(G, index.incoming, i)) == sorted(incoming.get(acc, []))
+        assert sorted(_view(G, index.outgoing, i)) == sorted(outgoing.get(acc, []))
+        both = index.all[i]
+        assert len(both.rows) == len(incoming.get(acc, [])) + len(outgoing.get(acc, []))
+    assert index.all.count.sum() == 2 * len(df)
+
+
+def test_subset_index_only_holds_those_accounts():
+    G = build_graph(random_frame(1000, 50, seed=2))
+    full = AccountIndex(G)
+    picked = np.array([3, 17, 40])
+    part = AccountIndex(G, accounts=picked)
+    for i in range(len(G)):
+        for side in ('incoming', 'outgoing', 'all'):
+            got, want = getattr(part, side)[i], getattr(full, side)[i]
+            if i in picked:
+                assert np.array_equal(np.sort(got.rows), np.sort(want.rows))
+            else:
+                assert len(got.rows) == 0
+
+
+def test_memoized_on_the_graph():
+    G = build_graph(random_frame(100, 10, seed=3))
+    assert build_account_index(G) is build_account_index(G)
@@ -0,0 +1,110 @@
+"""The engine against the original detectors (tests/baseline.py) on test-data/generate.py's files."""
+import pytest
+
+import baseline
+from conftest import GENERATED
+from account_index import build_account_index
+from centrality import betweenness
+from detectors.benford_detector import benford_analysis
+from detectors.cycle_detector import iter_cycles
+from detectors.shell_detector import detect_shells
+from detectors.smurfing_detector import detect_smurfing
+from false_positive import apply_whitelist
+from feature_store import build_feature_store
+from graph_engine import build_graph
+from ingest import read_transactions
+from pipeline import analyze_file
+
+# What each planted file must flag, and nothing else
+PLANTED = {
+    'test1_cycle.csv': {'ACC_A', 'ACC_B', 'ACC_C'},
+    'test2_smurfing.csv': {f'SRC_{i:02d}' for i in range(12)} | {'AGG_001'},
+    'test3_shell.csv': {'SHELL1', 'SHELL2', 'SHELL3'},
+    'test4_merchant_trap.csv': set(),
+    'test5_payroll_trap.csv': set(),
+}
+
+
+@pytest.fixture(scope='module')
+def loaded(generated):
+    out = {}
+    for name in GENERATED:
+        df = read_transactions(str(generated / name), name)
+        out[name] = df, build_graph(df)
+    return out
+
+
+@pytest.mark.parametrize('name', sorted(PLANTED))
+def test_planted_files_flag_exactly_the_planted_accounts(generated, name):
+    out, _ = analyze_file(str(generated / name), name)
+    assert {a['account_id'] for a in out['suspicious_accounts']} == PLANTED[name]
+    assert all(0 <= a['suspicion_score'] <= 100 for a in out['suspicious_accounts'])
+
+
+def test_cycle_file_reports_the_ring(generated):
+    out, _ = analyze_file(str(generated / 'test1_cycle.csv'))
+    assert [sorted(r['member_accounts']) for r in out['fraud_rings']] == [['ACC_A', 'ACC_B', 'ACC_C']]
+    assert {a['ring_id'] for a in out['suspicious_accounts']} == {out['fraud_rings'][0]['ring_id']}
+
+
+def test_stress_file_finds_planted_rings_and_spares_traps(generated, loaded):
+    out, _ = analyze_file(str(generated / 'test6_10k_stress.csv'))
+    _, G = loaded['test6_10k_stress.csv']
+    accounts = G.accounts.tolist()
+    planted = {frozenset(a for a in accounts if a.startswith(f'RING{k}_')) for k in range(5)}
+    assert planted <= {frozenset(r['member_accounts']) for r in out['fraud_rings']}
+    flagged = {a['account_id'] for a in out['suspicious_accounts']}
+    assert {f'AGG_{k:02d}' for k in range(3)} <= flagged
+    assert not {a for a in flagged if a.startswith(('LEGIT_', 'EMP_', 'CUST_', 'CORP_BANK'))}
+
+
+@pytest.mark.parametrize('name', GENERATED)
+def test_smurfing_matches_baseline(loaded, name):
+    df, G = loaded[name]
+    got = {a: (sorted(r['patterns']), sum(r['scores'])) for a, r in detect_smurfing(G, df).items()}
+    ref = {a: (sorted(r['patterns']), sum(r['scores'])) for a, r in baseline.detect_smurfing(df).items()}
+    assert got == ref
+
+
+@pytest.mark.parametrize('name', GENERATED)
+def test_benford_matches_baseline(loaded, name):
+    df, G = loaded[name]
+    got = {a: r['p_value'] for a, r in benford_analysis(G, df).items()}
+    ref = baseline.benford_analysis(df)
+    assert got.keys() == ref.keys()
+    assert all(got[a] == pytest.approx(ref[a], abs=1e-4) for a in got)
+
+
+@pytest.mark.parametrize('name', GENERATED)
+def test_whitelist_matches_baseline(loaded, name):
+    df, G = loaded[name]
+    assert apply_whitelist(G, df) == baseline.whitelist(df)
+
+
+@pytest.mark.parametrize('name', GENERATED)
+def test_high_velocity_matches_baseline(loaded, name):
+    df, G = loaded[name]
+    got = {a for a, r in detect_shells(G, df).items() if 'high_velocity' in r['patterns']}
+    assert got == baseline.high_velocity(df)
+
+
+@pytest.mark.parametrize('name', GENERATED[:5])
+def test_shell_accounts_match_baseline(loaded, name):
+    df, G = loaded[name]
+    index = build_account_index(G)
+    features = build_feature_store(G, index)
+    bc = betweenness(G)   # the default mode, as the pipeline runs it
+    got = {a for a, r in detect_shells(G, df, features=features, index=index, betweenness=bc).items()
+           if 'shell_account' in r['patterns']}
+    assert got == baseline.shell_accounts(df)
+
+
+@pytest.mark.parametrize('name', GENERATED[:5])   # random graphs: test_cycle_detector.py
+def test_cycles_are_the_time_respecting_baseline_cycles(loaded, name):
+    df, G = loaded[name]
+    got = set()
+    for ring in iter_cycles(G, workers=1):
+        m = ring['members']
+        k = m.index(min(m))
+        got.add(tuple(m[k:] + m[:k]))
+    assert got == baseline.time_respecting_cycles(df)
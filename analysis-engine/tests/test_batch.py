@@ -0,0 +1,95 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch, pipeline, subgraph
+from batch import analyze_batch
+from cache import ResultCache
+from conftest import frame, random_frame, write_csv
+from pipeline import STAGES, output_key, stage_keys
+from subgraph import ANALYSES
+
+# The same ring in both files, each with its own background traffic
+RING = [('c1', 'RA', 'RB', 5000, 1), ('c2', 'RB', 'RC', 4900, 2), ('c3', 'RC', 'RA', 4800, 3)]
+
+
+@pytest.fixture(scope='module')
+def files(tmp_path_factory):
+    out = tmp_path_factory.mktemp('batch')
+    paths = []
+    for k in range(2):
+        df = pd.concat([random_frame(400, 40, seed=30 + k, prefix=f'F{k}T'), frame(RING)], ignore_index=True)
+        df['transaction_id'] = [f'{k}-{t}' for t in df['transaction_id']]
+        paths.append(Path(write_csv(df, out / f'day{k}.csv')))
+    return paths
+
+
+def _upload(paths):
+    return [('files', (p.name, open(p, 'rb'), 'text/csv')) for p in paths]
+
+
+def test_batch_analyses_serve_subgraphs(client, files):
+    res = client.post('/batch', files=_upload(files)).json()
+    assert [f['file'] for f in res['files']] == ['day0.csv', 'day1.csv']
+    assert all(f['transactions'] == 403 for f in res['files'])
+    for f in res['files']:
+        sub = client.get(f'/analyses/{f["analysis_id"]}/accounts/RA/subgraph', params={'hops': 1})
+        assert sub.status_code == 200
+        assert {'RB', 'RC'} <= {n['account_id'] for n in sub.json()['nodes']}
+        ring = next(r for r in f['fraud_rings'] if 'RA' in r['member_accounts'])
+        sub = client.get(f'/analyses/{f["analysis_id"]}/rings/{ring["ring_id"]}/subgraph')
+        assert sub.status_code == 200 and len(sub.json()['edges']) == 3
+    link = next(l for l in res['combined']['rings'] if 'RA' in l['member_accounts'])
+    assert link['files'] == ['day0.csv', 'day1.csv'] and {'RA', 'RB', 'RC'} <= set(link['shared_accounts'])
+    assert {'RA', 'RB', 'RC'} <= {a['account_id'] for a in res['combined']['accounts']}
+
+
+def test_each_file_matches_analyze(client, files):
+    res = client.post('/batch', files=_upload(files)).json()
+    for f, path in zip(res['files'], files):
+        direct = client.post('/analyze', files={'file': (path.name, open(path, 'rb'), 'text/csv')}).json()
+        assert f['analysis_id'] == direct['analysis_id']
+        assert f['suspicious_accounts'] == direct['suspicious_accounts'] and f['fraud_rings'] == direct['fraud_rings']
+
+
+def test_worker_results_are_cached_by_the_parent(files, tmp_path, monkeypatch):
+    cache = ResultCache(memory_bytes=1 << 26, disk_bytes=0, directory=str(tmp_path))
+    for module in (batch, pipeline, subgraph):
+        monkeypatch.setattr(module, 'CACHE', cache)
+    items = [(str(p), p.name, None) for p in files]
+    first = analyze_batch(items)
+    cache.flush()
+    for f, path in zip(first['files'], files):
+        keys = stage_keys(STAGES, batch._digest(str(path)))
+        assert cache.get(output_key(keys))['suspicious_accounts'] == f['suspicious_accounts']
+        assert cache.get(keys['graph']) is not None
+    again = analyze_batch(items)
+    assert [f['suspicious_accounts'] for f in again['files']] == [f['suspicious_accounts'] for f in first['files']]
+    # An output the worker found cached comes back without stage results; the graph is then read from the cache
+    digest = batch._digest(str(files[0]))
+    G = batch._keep({'digest': digest, 'stages': None, 'out': first['files'][0]})
+    assert G is not None and int(G.tx_src.size) == 403
+
+
+def test_ring_files_come_from_transfers_inside_each_ring():
+    # HUB sits in both rings; A→Y joins members of different rings, so it counts for neither
+    df = frame([('1', 'A', 'B', 10, 1), ('2', 'B', 'HUB', 10, 2), ('3', 'HUB', 'A', 10, 3),
+                ('4', 'X', 'HUB', 10, 4), ('5', 'HUB', 'Y', 10, 5), ('6', 'Y', 'X', 10, 6),
+                ('7', 'HUB', 'Y', 10, 7), ('8', 'A', 'Y', 10, 8), ('9', 'Q', 'A', 10, 9)])
+    source = np.array([0, 1, 0, 1, 1, 1, 2, 2, 2])
+    out = {'suspicious_accounts': [{'account_id': a} for a in ('HUB', 'A', 'Z')],
+           'fraud_rings': [{'ring_id': 'R1', 'member_accounts': ['A', 'B', 'HUB']},
+                           {'ring_id': 'R2', 'member_accounts': ['HUB', 'X', 'Y']},
+                           {'ring_id': 'R3', 'member_accounts': ['P', 'Q']}]}
+    accounts, rings = batch._provenance(df, source, ['f0', 'f1', 'f2'], out)
+    assert accounts == {'HUB': ['f0', 'f1', 'f2'], 'A': ['f0', 'f2'], 'Z': []}
+    assert rings == {'R1': ['f0', 'f1'], 'R2': ['f1', 'f2'], 'R3': []}
+
+
+def test_bad_file_does_not_stop_the_batch(files, tmp_path):
+    bad = tmp_path / 'bad.csv'
+    bad.write_text('not,a,transaction,file\n1,2,3,4\n')
+    res = analyze_batch([(str(files[0]), files[0].name, None), (str(bad), 'bad.csv', None)])
+    assert 'error' in res['files'][1] and res['summary']['failed_files'] == 1
+    assert res['files'][0]['transactions'] == 403
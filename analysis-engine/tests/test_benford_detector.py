@@ -0,0 +1,77 @@
+from decimal import Decimal
+import numpy as np
+import pytest
+from scipy import stats
+
+from conftest import frame
+from detectors.benford_detector import digit_bins, digit_test, benford_analysis, BENFORD, MIN_TXS
+from graph_engine import build_graph
+
+AMOUNTS = [0.3, 0.07, 1e-5, 1.0, 9.99, 10.0, 99.5, 100.0, 999.999, 1000.0, 123456.78, 5e12, -42.0, 0.0,
+           float('nan'), float('inf')]
+
+
+def _digits(a):
+    """First two significant digits from the exact decimal expansion, or None."""
+    if not np.isfinite(a) or a == 0:
+        return None
+    digits = ''.join(c for c in format(Decimal(repr(abs(a))), 'f') if c.isdigit()).lstrip('0')
+    return (digits + '0')[:2]
+
+
+@pytest.mark.parametrize('test', ['first', 'second', 'first_two'])
+def test_digit_bins_match_decimal_digits(test):
+    rng = np.random.default_rng(0)
+    amounts = np.concatenate((AMOUNTS, np.round(rng.lognormal(6, 3, 5000), 2)))
+    got = digit_bins(amounts, test)
+    for a, b in zip(amounts.tolist(), got.tolist()):
+        d = _digits(a)
+        want = -1 if d is None else {'first': int(d[0]) - 1, 'second': int(d[1]), 'first_two': int(d) - 10}[test]
+        assert b == want, a
+
+
+def _account_frame(amounts, account='ACC'):
+    return frame([(f't{i}', account, f'C{i}', a, i) for i, a in enumerate(amounts)])
+
+
+def test_p_value_is_the_chi_square_test():
+    rng = np.random.default_rng(1)
+    amounts = np.round(rng.uniform(1, 1000, 200), 2)   # uniform: far from Benford
+    G = build_graph(_account_frame(amounts))
+    _, n, p = digit_test(G)
+    i = G.index['ACC']
+    obs = np.bincount(digit_bins(amounts), minlength=9)
+    assert n[i] == 200
+    assert p[i] == pytest.approx(stats.chisquare(obs, BENFORD * 200).pvalue)
+    result = benford_analysis(G, None)['ACC']
+    assert result['pattern'] == 'benford_violation' and result['score_delta'] == 15
+
+
+def test_benford_like_account_is_compliant():
+    rng = np.random.default_rng(2)
+    amounts = np.round(10 ** rng.uniform(1, 5, 400), 2)   # log-uniform follows Benford
+    result = benford_analysis(build_graph(_account_frame(amounts)), None)['ACC']
+    assert result == {'compliant': True, 'p_value': result['p_value'], 'score_delta': -15, 'pattern': None}
+    assert result['p_value'] >= 0.05
+
+
+def test_small_accounts_are_not_tested():
+    G = build_graph(_account_frame([123.0] * (MIN_TXS - 1)))
+    assert benford_analysis(G, None) == {}
+    G = build_graph(_account_frame([123.0] * MIN_TXS))
+    assert benford_analysis(G, None)['ACC']['compliant'] is False
+
+
+def test_each_transaction_counts_for_both_sides():
+    G = build_graph(frame([(f't{i}', 'A', 'B', 100 + i, i) for i in range(MIN_TXS)]))
+    tx_count, n, _ = digit_test(G)
+    assert tx_count.tolist() == [MIN_TXS, MIN_TXS] and n.tolist() == [MIN_TXS, MIN_TXS]
+
+
+def test_extra_tests_are_reported():
+    rng = np.random.default_rng(3)
+    G = build_graph(_account_frame(np.round(10 ** rng.uniform(1, 5, 300), 2)))
+    result = benford_analysis(G, None, tests=('first', 'second', 'first_two'))['ACC']
+    assert set(result['tests']) == {'second', 'first_two'}
+    with pytest.raises(ValueError):
+        digit_bins([1.0], 'third')
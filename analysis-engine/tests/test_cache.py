@@ -0,0 +1,121 @@
+import os, stat
+import numpy as np
+import pytest
+
+import cache as cache_module, pipeline
+from cache import ResultCache, make_key, settings
+from conftest import random_frame, write_csv
+from pipeline import STAGES, analyze_file, output_key, stage_keys
+
+
+def _cache(tmp_path, **kw):
+    return ResultCache(**{'memory_bytes': 1 << 20, 'disk_bytes': 1 << 20, 'directory': str(tmp_path), **kw})
+
+
+def test_round_trip_through_memory_and_disk(tmp_path):
+    cache = _cache(tmp_path)
+    key = make_key('x', 1)
+    assert cache.get(key) is None
+    cache.put(key, {'a': np.arange(3)})
+    cache.flush()
+    assert cache.get(key)['a'].tolist() == [0, 1, 2]
+    # A fresh process only has the disk tier
+    again = _cache(tmp_path).get(key)
+    assert again['a'].tolist() == [0, 1, 2]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_memory_tier_is_lru_bounded(tmp_path):
+    cache = _cache(tmp_path, memory_bytes=2500, disk_bytes=0)
+    blob = lambda k: bytes([k]) * 1000
+    for k in range(3):
+        cache.put(str(k), blob(k))
+    cache.flush()
+    assert cache.get('0') is None and cache.get('2') == blob(2)
+    cache.get('1')
+    cache.put('3', blob(3))
+    cache.flush()
+    assert cache.get('1') == blob(1) and cache.get('2') is None
+    # Too big for memory and no disk tier: not kept at all
+    cache.put('big', b'x' * 5000)
+    cache.flush()
+    assert cache.get('big') is None and not os.listdir(tmp_path)
+
+
+def test_disk_tier_evicts_least_recently_read(tmp_path):
+    cache = _cache(tmp_path, memory_bytes=0, disk_bytes=3500)
+    for k in range(3):
+        cache.put(str(k), bytes(1000))
+        cache.flush()
+        os.utime(tmp_path / f'{k}.pkl', (k, k))
+    cache.get('0')   # refreshes its mtime
+    cache.put('3', bytes(1000))
+    cache.flush()
+    assert sorted(os.listdir(tmp_path)) == ['0.pkl', '2.pkl', '3.pkl']
+
+
+@pytest.mark.skipif(cache_module.UID is None, reason='no POSIX ownership')
+def test_disk_tier_is_private(tmp_path, monkeypatch):
+    loose = tmp_path / 'loose'
+    loose.mkdir(mode=0o777)
+    os.chmod(loose, 0o777)
+    cache = _cache(loose)
+    assert stat.S_IMODE(os.stat(loose).st_mode) == 0o700 and cache.disk_bytes
+    cache.put('k', [1, 2])
+    cache.flush()
+    assert stat.S_IMODE(os.stat(loose / 'k.pkl').st_mode) == 0o600
+    # A file others could have written is never unpickled
+    os.chmod(loose / 'k.pkl', 0o666)
+    assert _cache(loose).get('k') is None
+    os.chmod(loose / 'k.pkl', 0o600)
+    assert _cache(loose).get('k') == [1, 2]
+    # Neither is one another user owns, nor anything in a directory they own
+    reader = _cache(loose)
+    monkeypatch.setattr(cache_module, 'UID', cache_module.UID + 1)
+    assert reader.get('k') is None
+    other = _cache(loose)
+    assert other.disk_bytes == 0 and other.get('k') is None
+    # A symlink is not taken for the directory
+    (tmp_path / 'link').symlink_to(loose)
+    monkeypatch.setattr(cache_module, 'UID', os.getuid())
+    assert _cache(tmp_path / 'link').disk_bytes == 0
+
+
+def test_keys_chain_through_dependencies(monkeypatch):
+    import scoring
+    before = stage_keys(STAGES, 'digest')
+    assert stage_keys(STAGES, 'digest') == before
+    assert stage_keys(STAGES, 'other')['cycles'] != before['cycles']
+    # A scoring-only change re-keys scoring onward and nothing upstream
+    changed = [s._replace(settings=lambda: (settings(scoring), 'changed')) if s.name == 'scoring' else s
+               for s in STAGES]
+    after = stage_keys(changed, 'digest')
+    same = {k for k in before if before[k] == after[k]}
+    assert {'graph', 'cycles', 'rings', 'smurfing', 'shells', 'benford', 'whitelist'} <= same
+    assert not {'scoring', 'gnn', 'lifecycle'} & same
+    assert output_key(after) != output_key(before)
+
+
+def test_reanalysis_reuses_cached_stages(tmp_path, monkeypatch):
+    cache = _cache(tmp_path / 'cache', memory_bytes=64 << 20, disk_bytes=64 << 20)
+    monkeypatch.setattr(pipeline, 'CACHE', cache)
+    path = write_csv(random_frame(800, 80, seed=12), tmp_path / 'tx.csv')
+    first, r = analyze_file(path, digest='d' * 64)
+    assert r is not None
+    cache.flush()
+    second, r = analyze_file(path, digest='d' * 64)
+    assert r is None
+    strip = lambda out: {**out, 'summary': {**out['summary'], 'processing_time_seconds': 0}}
+    assert strip(second) == strip(first)
+
+    # Changed scoring settings: the graph and detectors come from the cache, scoring reruns
+    ran = []
+    def rerun(stage):
+        def fn(r):
+            ran.append(stage.name)
+            return stage.fn(r)
+        return stage._replace(fn=fn, settings=lambda: ('changed',) if stage.name == 'scoring' else stage.settings())
+    monkeypatch.setattr(pipeline, 'STAGES', [rerun(s) for s in STAGES])
+    third, r = analyze_file(path, digest='d' * 64)
+    assert r['df'] is None and strip(third) == strip(first)
+    assert {'scoring', 'lifecycle'} <= set(ran) and not {'cycles', 'smurfing', 'shells', 'benford'} & set(ran)
@@ -0,0 +1,85 @@
+import time
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+
+import centrality
+from centrality import betweenness
+from conftest import frame, random_frame
+from graph_engine import build_graph
+
+
+def _reference(G):
+    bc = nx.betweenness_centrality(nx.DiGraph(G.to_networkx()), normalized=True)
+    return np.array([bc[a] for a in G.accounts.tolist()])
+
+
+def _graph(seed, n=900, accounts=120):
+    # Several weakly connected components of different sizes, plus a self-loop
+    df = random_frame(n, accounts, seed=seed)
+    small = frame([('s1', 'X1', 'X2', 1, 0), ('s2', 'X2', 'X3', 1, 1), ('s3', 'X3', 'X3', 1, 2),
+                   ('s4', 'Y1', 'Y2', 1, 0)])
+    return build_graph(pd.concat([df, small], ignore_index=True))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_exact_matches_networkx(seed):
+    G = _graph(seed)
+    np.testing.assert_allclose(betweenness(G, mode='exact', workers=1), _reference(G), atol=1e-12)
+
+
+def test_small_component_path_matches_batched(monkeypatch):
+    G = _graph(5)
+    batched = betweenness(G, mode='exact', workers=1).copy()
+    G.cache.clear()
+    monkeypatch.setattr(centrality, 'SMALL_COMPONENT', 10_000)
+    np.testing.assert_allclose(betweenness(G, mode='exact', workers=1), batched, atol=1e-12)
+
+
+def test_parallel_matches_serial(monkeypatch):
+    G = _graph(6)
+    serial = betweenness(G, mode='exact', workers=1).copy()
+    G.cache.clear()
+    monkeypatch.setattr(centrality, 'PARALLEL_MIN_WORK', 1)
+    np.testing.assert_allclose(betweenness(G, mode='exact', workers=2), serial, atol=1e-12)
+
+
+def test_approx_stays_within_epsilon():
+    G = build_graph(random_frame(6000, 1500, seed=7))
+    exact = betweenness(G, mode='exact', workers=1)
+    # At 1500 nodes epsilon 0.02 would need every node as a pivot; 0.1 samples about a third
+    approx = betweenness(G, mode='approx', epsilon=0.1, delta=0.1, workers=1)
+    assert np.abs(approx - exact).max() <= 0.1
+    assert not np.array_equal(approx, exact)   # pivots really were sampled
+
+
+def test_default_is_exact():
+    # Sampling is opt-in: its error is close to the shell test's 0.05 threshold
+    G = _graph(5)
+    np.testing.assert_array_equal(betweenness(G, workers=1), betweenness(G, mode='exact', workers=1))
+    assert betweenness(G, workers=1) is betweenness(G, mode='exact', workers=1)
+
+
+def test_memoized_per_settings():
+    G = _graph(8)
+    a = betweenness(G, mode='exact', workers=1)
+    assert betweenness(G, mode='exact', workers=1) is a
+    assert betweenness(G, mode='approx', workers=1) is not a
+
+
+def test_population_rescales_normalization():
+    G = _graph(9)
+    own = betweenness(G, mode='exact', workers=1)
+    n, big = len(G), 10 * len(G)
+    wider = betweenness(G, mode='exact', workers=1, population=big)
+    np.testing.assert_allclose(wider, own * (n - 1) * (n - 2) / ((big - 1) * (big - 2)))
+
+
+def test_deadline_raises_and_memoizes_nothing():
+    G = build_graph(random_frame(20000, 3000, seed=10))
+    t = time.time()
+    with pytest.raises(TimeoutError):
+        betweenness(G, mode='exact', workers=1, deadline=time.time() + 0.05)
+    assert time.time() - t < 2
+    assert not any(k[0] == 'betweenness' for k in G.cache if isinstance(k, tuple))
@@ -0,0 +1,95 @@
+import time
+import numpy as np
+import pytest
+
+import baseline
+from conftest import frame, random_frame
+from detectors import cycle_detector
+from detectors.cycle_detector import detect_cycles, iter_cycles, touching_edges, cycle_candidates
+from graph_engine import build_graph, extend_graph
+
+
+def _canonical(rings):
+    found = set()
+    for ring in rings:
+        m = ring['members']
+        k = m.index(min(m))
+        found.add(tuple(m[k:] + m[:k]))
+    return found
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_matches_brute_force_on_random_graphs(seed):
+    df = random_frame(400, 40, hours=200, seed=seed)
+    assert _canonical(iter_cycles(build_graph(df), workers=1)) == baseline.time_respecting_cycles(df)
+
+
+def test_hops_must_follow_in_time():
+    # Started at C (3h) the hops run 3h → 5h → 6h; any other start goes back in time
+    ring = frame([('1', 'A', 'B', 100, 5), ('2', 'B', 'C', 90, 6), ('3', 'C', 'A', 80, 3)])
+    assert _canonical(iter_cycles(build_graph(ring), workers=1)) == {('A', 'B', 'C')}
+    backwards = frame([('1', 'A', 'B', 100, 5), ('2', 'B', 'C', 90, 4), ('3', 'C', 'A', 80, 3)])
+    assert detect_cycles(build_graph(backwards), None)['rings'] == []
+
+
+def test_window_and_length_bounds():
+    slow = frame([('1', 'A', 'B', 100, 0), ('2', 'B', 'C', 90, 40), ('3', 'C', 'A', 80, 73)])
+    assert detect_cycles(build_graph(slow), None)['rings'] == []
+    assert len(detect_cycles(build_graph(slow), None, window_hrs=80)['rings']) == 1
+    six = frame([(str(i), f'N{i}', f'N{(i + 1) % 6}', 100, i) for i in range(6)])
+    assert detect_cycles(build_graph(six), None)['rings'] == []
+    five = frame([(str(i), f'N{i}', f'N{(i + 1) % 5}', 100, i) for i in range(5)])
+    assert len(detect_cycles(build_graph(five), None)['rings']) == 1
+    assert detect_cycles(build_graph(five), None, max_len=4)['rings'] == []
+
+
+def test_ring_record():
+    G = build_graph(frame([('1', 'A', 'B', 1000, 0), ('2', 'B', 'C', 900, 2), ('3', 'C', 'A', 810, 4)]))
+    found = detect_cycles(G, None)
+    ring = found['rings'][0]
+    assert ring['member_accounts'] == ['A', 'B', 'C'] and ring['span_hours'] == 4.0
+    assert ring['total_amount'] == 2710 and ring['amount_decay'] == pytest.approx(0.9)
+    assert found['accounts']['B']['patterns'] == ['cycle_length_3']
+
+
+def test_parallel_components_match_inline(monkeypatch):
+    df = random_frame(600, 30, hours=100, seed=9)
+    df = df.assign(sender_id=df['sender_id'] + df.index.map(lambda i: 'x' if i % 2 else 'y'),
+                   receiver_id=df['receiver_id'] + df.index.map(lambda i: 'x' if i % 2 else 'y'))
+    G = build_graph(df)   # two disjoint halves, each its own component
+    inline = detect_cycles(G, None, workers=1)
+    monkeypatch.setattr(cycle_detector, 'PARALLEL_MIN_EDGES', 1)
+    parallel = detect_cycles(G, None, workers=2)
+    assert parallel == inline and inline['rings']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_search_stops_at_the_deadline(monkeypatch, workers):
+    # Two dense halves whose full search takes minutes
+    df = random_frame(6000, 120, hours=72, seed=1)
+    df = df.assign(sender_id=df['sender_id'] + df.index.map(lambda i: 'x' if i % 2 else 'y'),
+                   receiver_id=df['receiver_id'] + df.index.map(lambda i: 'x' if i % 2 else 'y'))
+    G = build_graph(df)
+    monkeypatch.setattr(cycle_detector, 'PARALLEL_MIN_EDGES', 1)
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        detect_cycles(G, None, workers=workers, deadline=start + 0.3)
+    assert time.time() - start < 2
+    assert detect_cycles(build_graph(random_frame(200, 20, seed=2)), None, deadline=time.time() + 60)
+
+
+def test_touching_edges_cover_every_ring_through_new_transactions():
+    df = random_frame(500, 40, hours=300, seed=11)
+    head, tail = df.iloc[:450], df.iloc[450:]
+    G, _, _ = extend_graph(None, head)
+    H, _, rows = extend_graph(G, tail)
+    before = _canonical(iter_cycles(G, workers=1))
+    after = _canonical(iter_cycles(H, workers=1))
+    local = _canonical(iter_cycles(H, workers=1, edges=touching_edges(H, rows)))
+    assert after - before <= local
+
+
+def test_candidates_are_members_of_big_strong_components():
+    G = build_graph(frame([('1', 'A', 'B', 1, 0), ('2', 'B', 'C', 1, 1), ('3', 'C', 'A', 1, 2),
+                           ('4', 'C', 'D', 1, 3), ('5', 'E', 'F', 1, 4), ('6', 'F', 'E', 1, 5)]))
+    assert G.accounts[cycle_candidates(G)].tolist() == ['A', 'B', 'C']
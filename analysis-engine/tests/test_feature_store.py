@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import frame, random_frame
+from feature_store import FeatureStore, build_feature_store
+from graph_engine import build_graph
+
+
+def _column(G, series, fill=0.0):
+    return series.reindex(G.accounts.tolist()).fillna(fill).to_numpy(dtype=float)
+
+
+def test_features_match_pandas():
+    df = random_frame(3000, 90, seed=4)
+    # One account that only receives once, so its std is undefined
+    df = pd.concat([df, frame([('lone', 'A0000', 'LONE', 10.0, 5)])], ignore_index=True)
+    G = build_graph(df)
+    fs = FeatureStore(G)
+    ins, outs = df.groupby('receiver_id'), df.groupby('sender_id')
+
+    np.testing.assert_allclose(fs['money_in'], _column(G, ins['amount'].sum()))
+    np.testing.assert_allclose(fs['money_out'], _column(G, outs['amount'].sum()))
+    assert np.array_equal(fs['in_count'], _column(G, ins.size()))
+    assert np.array_equal(fs['tx_count'], _column(G, ins.size()) + _column(G, outs.size()))
+    assert np.array_equal(fs['in_counterparties'], _column(G, ins['sender_id'].nunique()))
+    assert np.array_equal(fs['out_counterparties'], _column(G, outs['receiver_id'].nunique()))
+    np.testing.assert_allclose(fs['in_amount_mean'], _column(G, ins['amount'].mean()))
+    np.testing.assert_allclose(fs['out_amount_std'], _column(G, outs['amount'].std(ddof=1), np.nan))
+    assert np.isnan(fs['in_amount_std'][G.index['LONE']])
+    assert fs['out_amount_mean'][G.index['LONE']] == 0.0   # no outgoing rows: 0, not NaN
+
+    ts = pd.concat([df[['sender_id', 'timestamp']].set_axis(['acc', 'ts'], axis=1),
+                    df[['receiver_id', 'timestamp']].set_axis(['acc', 'ts'], axis=1)])
+    ts['ts'] = ts['ts'].values.astype('datetime64[ns]').view('int64')
+    by_acc = ts.groupby('acc')['ts']
+    assert np.array_equal(fs['first_ts'], by_acc.min().reindex(G.accounts.tolist()).to_numpy())
+    assert np.array_equal(fs['last_ts'], by_acc.max().reindex(G.accounts.tolist()).to_numpy())
+
+
+def test_pass_through_is_zero_without_inflow():
+    G = build_graph(frame([('1', 'SRC', 'MID', 100, 0), ('2', 'MID', 'DST', 80, 1)]))
+    fs = FeatureStore(G)
+    assert dict(zip(G.accounts.tolist(), fs['pass_through'].tolist())) == {'SRC': 0.0, 'MID': 0.8, 'DST': 0.0}
+
+
+def test_each_feature_is_computed_once():
+    G = build_graph(random_frame(200, 20, seed=5))
+    fs = build_feature_store(G)
+    assert build_feature_store(G) is fs
+    a = fs['money_in']
+    assert fs['money_in'] is a and set(fs.timings) == {'money_in'}
+    # Derived features reuse their inputs rather than recomputing them
+    fs['pass_through']
+    assert fs['money_in'] is a and set(fs.timings) == {'money_in', 'money_out', 'pass_through'}
+    assert fs.get('money_in', 'money_out') == (a, fs['money_out'])
+    assert fs.require(['money_in']) == {'money_in': a}
+
+
+def test_preset_columns_are_used_as_is():
+    G = build_graph(random_frame(200, 20, seed=6))
+    fs = FeatureStore(G)
+    money_in = np.arange(len(G), dtype=float)
+    fs.preset(money_in=money_in)
+    assert fs['money_in'] is money_in and fs.timings['money_in'] == 0.0
+    assert np.array_equal(fs['pass_through'] > 0, (fs['money_out'] > 0) & (money_in > 0))
+
+
+def test_unknown_features_are_rejected():
+    fs = FeatureStore(build_graph(random_frame(20, 5)))
+    with pytest.raises(KeyError):
+        fs['velocity']
+    with pytest.raises(KeyError):
+        fs.preset(velocity=np.zeros(5))
@@ -0,0 +1,111 @@
+import io, json
+import pytest
+
+from formats import FormatError, decode_cursor, encode_cursor, negotiate, page, paged_output
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq
+
+
+@pytest.mark.parametrize('offset', [0, 1, 999, 10 ** 9])
+def test_cursor_round_trip(offset):
+    assert decode_cursor(encode_cursor(offset)) == offset
+    assert '=' not in encode_cursor(offset)
+
+
+@pytest.mark.parametrize('cursor', ['!!', 'bm90LWEtbnVtYmVy', encode_cursor(-1)])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(FormatError) as e:
+        decode_cursor(cursor)
+    assert e.value.status == 400
+
+
+def test_pages_cover_every_row_once():
+    rows, seen, cursor = list(range(23)), [], None
+    while True:
+        part, cursor = page(rows, 5, cursor)
+        seen += part
+        if cursor is None:
+            break
+    assert seen == rows
+    assert page(rows) == (rows, None) and page(rows, 23) == (rows, None)
+    out = paged_output({'suspicious_accounts': rows, 'fraud_rings': rows[:2], 'summary': {}}, 5)
+    assert out['suspicious_accounts'] == rows[:5] and out['fraud_rings'] == rows[:2]
+    assert out['next_cursor'] == {'accounts': encode_cursor(5), 'rings': None}
+
+
+def test_negotiation():
+    assert negotiate() == 'json' and negotiate('parquet') == 'parquet'
+    assert negotiate(None, 'application/x-ndjson') == 'ndjson'
+    assert negotiate(None, 'text/html, application/vnd.apache.arrow.stream;q=0.5, application/x-ndjson;q=0.9') == 'ndjson'
+    assert negotiate(None, 'application/x-parquet;q=0, */*;q=0.1') == 'json'
+    assert negotiate(None, 'text/html') == 'json'
+    with pytest.raises(FormatError):
+        negotiate('xml')
+
+
+@pytest.fixture(scope='module')
+def upload(generated):
+    return generated / 'test6_10k_stress.csv'
+
+
+@pytest.fixture(scope='module')
+def analysis(client, upload):
+    out = client.post('/analyze', files={'file': ('tx.csv', open(upload, 'rb'), 'text/csv')}).json()
+    assert len(out['suspicious_accounts']) > 20 and len(out['fraud_rings']) > 3
+    return out
+
+
+def _walk(client, url, limit):
+    rows, cursor = [], None
+    while True:
+        body = client.get(url, params={'limit': limit, 'cursor': cursor}).json()
+        rows += body.get('accounts', body.get('rings'))
+        cursor = body['next_cursor']
+        if cursor is None:
+            return rows
+
+
+def test_cursor_pages_match_the_full_result(client, analysis):
+    base = f'/analyses/{analysis["analysis_id"]}'
+    assert _walk(client, f'{base}/accounts', 7) == analysis['suspicious_accounts']
+    assert _walk(client, f'{base}/rings', 2) == analysis['fraud_rings']
+    assert client.get(f'{base}/accounts', params={'cursor': '!!'}).status_code == 400
+    assert client.get('/analyses/0123456789abcdef/accounts').status_code == 404
+
+
+def test_limit_on_analyze_continues_at_the_analysis(client, analysis, upload):
+    top = client.post('/analyze?limit=10', files={'file': ('tx.csv', open(upload, 'rb'), 'text/csv')}).json()
+    assert top['analysis_id'] == analysis['analysis_id']
+    assert top['suspicious_accounts'] == analysis['suspicious_accounts'][:10]
+    more = client.get(f'/analyses/{top["analysis_id"]}/accounts',
+                      params={'cursor': top['next_cursor']['accounts']}).json()
+    assert top['suspicious_accounts'] + more['accounts'] == analysis['suspicious_accounts']
+
+
+def test_ndjson_and_headers(client, analysis):
+    res = client.get(f'/analyses/{analysis["analysis_id"]}/accounts', params={'limit': 5},
+                     headers={'Accept': 'application/x-ndjson'})
+    assert res.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in res.text.splitlines()] == analysis['suspicious_accounts'][:5]
+    assert res.headers['X-Analysis-Id'] == analysis['analysis_id']
+    assert res.headers['X-Total-Count'] == str(len(analysis['suspicious_accounts']))
+    assert res.headers['X-Row-Count'] == '5' and res.headers['X-Next-Cursor'] == encode_cursor(5)
+
+
+@pytest.mark.parametrize('fmt', ['arrow', 'parquet'])
+def test_tabular_formats(client, analysis, fmt):
+    url = f'/analyses/{analysis["analysis_id"]}/accounts'
+    res = client.get(url, params={'format': fmt, 'limit': 8, 'cursor': encode_cursor(3)})
+    body = io.BytesIO(res.content)
+    table = pa.ipc.open_stream(body).read_all() if fmt == 'arrow' else pq.read_table(body)
+    want = analysis['suspicious_accounts'][3:11]
+    assert table.column('account_id').to_pylist() == [a['account_id'] for a in want]
+    assert table.column('detected_patterns').to_pylist() == [a['detected_patterns'] for a in want]
+    assert [json.loads(e) for e in table.column('evidence').to_pylist()] == [a.get('evidence') for a in want]
+    assert table.schema.metadata[b'x-analysis-id'].decode() == analysis['analysis_id']
+    assert res.headers['X-Next-Cursor'] == encode_cursor(11)
+    rings = client.get(f'/analyses/{analysis["analysis_id"]}/rings', params={'format': fmt})
+    body = io.BytesIO(rings.content)
+    table = pa.ipc.open_stream(body).read_all() if fmt == 'arrow' else pq.read_table(body)
+    assert table.column('member_accounts').to_pylist() == [r['member_accounts'] for r in analysis['fraud_rings']]
@@ -0,0 +1,61 @@
+import os, threading, time
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torch_geometric')
+
+from conftest import random_frame
+from gnn import anomaly_scorer
+from gnn.anomaly_scorer import compute_gnn_scores, load_model, save_model, weights_version
+from gnn.graph_sage import GraphSAGE
+from gnn.feature_builder import IN_CHANNELS
+from graph_engine import build_graph
+from pipeline import run_stages, STAGES
+
+
+@pytest.fixture
+def weights(tmp_path, monkeypatch):
+    path = str(tmp_path / 'weights' / 'graphsage.pt')
+    monkeypatch.setattr(anomaly_scorer, 'MODEL_PATH', path)
+    monkeypatch.setattr(anomaly_scorer, 'MAX_EPOCHS', 2)
+    return path
+
+
+def _scored():
+    df = random_frame(600, 60, seed=18)
+    r = run_stages([s for s in STAGES if s.name not in ('gnn', 'lifecycle')], {'df': df})
+    return r['graph'], df, r['scoring'], r['features']
+
+
+def test_infer_without_weights_skips_and_writes_nothing(weights):
+    G, df, scored, features = _scored()
+    assert compute_gnn_scores(G, df, scored, features, mode='infer') == {}
+    assert not os.path.exists(os.path.dirname(weights))
+
+
+def test_train_saves_and_infer_reuses(weights, monkeypatch):
+    G, df, scored, features = _scored()
+    trained = compute_gnn_scores(G, df, scored, features, mode='train')
+    assert set(trained) == set(scored) and all(0 < v <= 1 for v in trained.values())
+    version = weights_version(weights)
+    monkeypatch.setattr(anomaly_scorer, 'train', lambda *a, **k: pytest.fail('infer must not train'))
+    assert compute_gnn_scores(G, df, scored, features, mode='infer') == pytest.approx(trained)
+    assert weights_version(weights) == version
+
+
+def test_deadline_stops_training_without_saving(weights):
+    G, df, scored, features = _scored()
+    with pytest.raises(TimeoutError):
+        compute_gnn_scores(G, df, scored, features, mode='train', deadline=time.time() - 1)
+    assert weights_version(weights) is None
+
+
+def test_concurrent_saves_leave_one_complete_file(weights):
+    models = [GraphSAGE(in_ch=IN_CHANNELS) for _ in range(8)]
+    threads = [threading.Thread(target=save_model, args=(m, weights)) for m in models]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert os.listdir(os.path.dirname(weights)) == ['graphsage.pt']
+    assert load_model(weights) is not None
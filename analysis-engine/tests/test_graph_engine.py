@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from conftest import frame, random_frame
+from graph_engine import build_graph, extend_graph, graph_from_codes
+
+
+def test_edges_aggregate_transactions():
+    df = frame([('t1', 'B', 'A', 10.0, 2), ('t2', 'A', 'B', 5.0, 1), ('t3', 'A', 'B', 7.0, 0),
+                ('t4', 'C', 'A', 1.0, 3)])
+    G = build_graph(df)
+    assert G.accounts.tolist() == ['A', 'B', 'C']
+    assert G.number_of_edges() == 3
+    e = G.edge_id(0, 1)
+    assert G.edge_count[e] == 2 and G.edge_amount[e] == 12.0
+    # Transactions of an edge are contiguous and time-ordered
+    assert G.tx_id[G.edge_slice(e)].tolist() == ['t3', 't2']
+    assert G.edge_first_ts[e] < G.edge_last_ts[e]
+    assert G.has_edge('C', 'A') and not G.has_edge('A', 'C')
+    assert G.edge_id(2, 1) == -1
+
+
+def test_csr_and_csc_match_networkx_view():
+    G = build_graph(random_frame(2000, 150, seed=1))
+    nxg = G.to_networkx()
+    for i, acc in enumerate(G.accounts.tolist()):
+        assert sorted(G.accounts[G.successors(i)].tolist()) == sorted(nxg.successors(acc))
+        assert sorted(G.accounts[G.predecessors(i)].tolist()) == sorted(nxg.predecessors(acc))
+    assert G.out_degree.sum() == G.in_degree.sum() == nxg.number_of_edges()
+
+
+def test_edge_totals_match_groupby():
+    df = random_frame(3000, 80, seed=2)
+    G = build_graph(df)
+    expected = df.groupby(['sender_id', 'receiver_id'])['amount'].agg(['sum', 'count'])
+    got = pd.DataFrame({'sum': G.edge_amount, 'count': G.edge_count},
+                       index=pd.MultiIndex.from_arrays([G.accounts[G.edge_src], G.accounts[G.edge_dst]]))
+    pd.testing.assert_frame_equal(got.sort_index(), expected.sort_index(), check_names=False, check_dtype=False)
+
+
+def _same_graph(G, H):
+    assert G.accounts.tolist() == H.accounts.tolist()
+    for col in ('tx_src', 'tx_dst', 'tx_amount', 'tx_ts', 'tx_id', 'tx_ptr', 'out_ptr', 'in_ptr', 'in_edges'):
+        np.testing.assert_array_equal(getattr(G, col), getattr(H, col), err_msg=col)
+
+
+def test_categorical_ids_give_the_same_graph():
+    df = random_frame(1000, 60, seed=3)
+    cat = df.astype({'sender_id': 'category', 'receiver_id': 'category'})
+    _same_graph(build_graph(df), build_graph(cat))
+
+
+def test_extend_graph_equals_full_build():
+    df = random_frame(1500, 90, seed=4)
+    head, tail = df.iloc[:900], df.iloc[900:]
+    G, _, _ = extend_graph(None, head)
+    H, remap, rows = extend_graph(G, tail)
+    _same_graph(H, build_graph(df))
+    assert H.accounts[remap].tolist() == G.accounts.tolist()
+    assert sorted(H.tx_id[rows].tolist()) == sorted(tail['transaction_id'])
+
+
+def test_repeated_appends_with_tied_timestamps():
+    # Whole hours between few accounts: many transfers share (sender, receiver, timestamp)
+    df = random_frame(1200, 8, hours=30, seed=6)
+    df['timestamp'] = df['timestamp'].dt.floor('h')
+    G = None
+    for lo in range(0, len(df), 173):
+        G, _, _ = extend_graph(G, df.iloc[lo:lo + 173])
+    _same_graph(G, build_graph(df))
+
+
+def test_graph_from_codes_equals_build_graph():
+    df = random_frame(800, 40, seed=5)
+    names = np.array(sorted(set(df['sender_id']) | set(df['receiver_id']) | {'UNUSED'}), dtype=object)
+    code = {n: i for i, n in enumerate(names)}
+    G = graph_from_codes(names, df['sender_id'].map(code).to_numpy(), df['receiver_id'].map(code).to_numpy(),
+                         df['amount'].to_numpy(), df['timestamp'].values.astype('datetime64[ns]').view('int64'),
+                         df['transaction_id'].to_numpy(dtype=object))
+    _same_graph(G, build_graph(df))
+
+
+def test_empty_frame():
+    G = build_graph(frame([]))
+    assert G.number_of_nodes() == 0 and G.number_of_edges() == 0
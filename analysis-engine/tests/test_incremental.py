@@ -0,0 +1,76 @@
+import io
+import pandas as pd
+
+from conftest import GENERATED, random_frame, write_csv
+from incremental import Stream, StreamRegistry
+from ingest import read_transactions
+from pipeline import analyze_file
+
+
+def _strip(out):
+    return {**out, 'summary': {**out['summary'], 'processing_time_seconds': 0}}
+
+
+def _batches(df, size):
+    return [df.iloc[lo:lo + size] for lo in range(0, len(df), size)]
+
+
+def test_snapshot_matches_full_analysis(generated):
+    # The cycle file's ring closes across batch boundaries
+    for name in GENERATED[:3]:
+        path = str(generated / name)
+        df = read_transactions(path, name).sample(frac=1, random_state=0)
+        stream = Stream()
+        for batch in _batches(df, 37):
+            stream.append(batch)
+        full, _ = analyze_file(path, name)
+        assert _strip(stream.snapshot()) == _strip(full)
+
+
+def test_snapshot_after_each_append(tmp_path):
+    df = random_frame(1200, 90, seed=13)
+    df['timestamp'] = df['timestamp'].dt.floor('s')
+    stream, seen = Stream(), 0
+    for batch in _batches(df, 400):
+        stream.append(batch)
+        seen += len(batch)
+        full, _ = analyze_file(write_csv(df.iloc[:seen], tmp_path / f'{seen}.csv'))
+        assert _strip(stream.snapshot()) == _strip(full)
+
+
+def test_duplicates_are_skipped_and_counted():
+    df = random_frame(300, 20, seed=14)
+    stream = Stream()
+    first = stream.append(df.iloc[:200])
+    assert first['appended'] == 200 and first['duplicates'] == 0 and first['batches'] == 1
+    again = stream.append(pd.concat([df.iloc[150:], df.iloc[250:]]))
+    assert again == {**again, 'received': 200, 'appended': 100, 'duplicates': 100, 'total_transactions': 300}
+    snap = stream.snapshot()
+    assert stream.snapshot() is snap   # reused until the next append
+    assert stream.append(df.iloc[:10])['appended'] == 0 and stream.snapshot() is snap
+
+
+def test_empty_stream_snapshot():
+    assert Stream().snapshot()['summary']['total_accounts_analyzed'] == 0
+
+
+def test_registry():
+    reg = StreamRegistry()
+    assert reg.get('a') is None
+    s = reg.get('a', create=True)
+    assert reg.get('a') is s and reg.drop('a') is s and reg.get('a') is None
+
+
+def test_stream_endpoints(client, tmp_path):
+    df = random_frame(400, 30, seed=15)
+    df['timestamp'] = df['timestamp'].dt.floor('s')
+    for k, batch in enumerate(_batches(df, 250)):
+        body = open(write_csv(batch, tmp_path / f'{k}.csv'), 'rb').read()
+        res = client.post('/streams/feed/transactions', files={'file': ('b.csv', io.BytesIO(body), 'text/csv')})
+        assert res.status_code == 200 and res.json()['stream_id'] == 'feed'
+    assert res.json()['total_transactions'] == 400
+    snap = client.get('/streams/feed/snapshot').json()
+    full = client.post('/analyze', files={'file': ('all.csv', open(write_csv(df, tmp_path / 'all.csv'), 'rb'))}).json()
+    assert snap['suspicious_accounts'] == full['suspicious_accounts']
+    assert client.delete('/streams/feed').json()['deleted']
+    assert client.get('/streams/feed/snapshot').status_code == 404
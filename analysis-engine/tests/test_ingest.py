@@ -0,0 +1,127 @@
+import asyncio, hashlib, io, os
+import pandas as pd
+import pyarrow as pa, pyarrow.ipc, pyarrow.parquet
+import pytest
+
+import ingest
+from conftest import random_frame, write_csv
+from ingest import IngestError, read_transactions, read_upload, sniff_format, spool_upload
+
+
+def _expected(df):
+    return df.astype({'transaction_id': str, 'sender_id': str, 'receiver_id': str})
+
+
+def _same(got, df):
+    assert list(got.columns) == ingest.REQUIRED
+    assert isinstance(got['sender_id'].dtype, pd.CategoricalDtype)
+    assert str(got['timestamp'].dtype) == 'datetime64[ns]'
+    pd.testing.assert_frame_equal(got.astype({'sender_id': str, 'receiver_id': str}), _expected(df),
+                                  check_dtype=False)
+
+
+def test_csv_in_chunks_keeps_every_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'CHUNK_ROWS', 333)
+    df = random_frame(2000, 300, seed=1)
+    df['timestamp'] = df['timestamp'].dt.floor('s')
+    got = read_transactions(write_csv(df, tmp_path / 'tx.csv'), 'tx.csv')
+    _same(got, df)
+    # Categories from different chunks are unioned, not widened to object
+    assert set(got['sender_id'].cat.categories) == set(df['sender_id'])
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow', 'arrow_stream'])
+def test_arrow_formats(tmp_path, monkeypatch, fmt):
+    monkeypatch.setattr(ingest, 'CHUNK_ROWS', 250)
+    df = random_frame(1000, 50, seed=2).assign(extra=1)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = str(tmp_path / 'tx.bin')
+    if fmt == 'parquet':
+        pa.parquet.write_table(table, path, row_group_size=250)
+    else:
+        writer = pa.ipc.new_file if fmt == 'arrow' else pa.ipc.new_stream
+        with writer(path, table.schema) as w:
+            for batch in table.to_batches(max_chunksize=250):
+                w.write_batch(batch)
+    assert sniff_format(path) == fmt
+    _same(read_transactions(path), df.drop(columns='extra'))
+
+
+def test_mixed_timestamp_formats_and_timezones(tmp_path):
+    path = tmp_path / 'tx.csv'
+    path.write_text('transaction_id,sender_id,receiver_id,amount,timestamp\n'
+                    't1,A,B,10,2024-01-01 10:00:00\n'
+                    't2,B,C,10,2024-01-02T11:30:00\n'
+                    't3,C,A,10,01/03/2024 12:00\n')
+    got = read_transactions(str(path))
+    assert got['timestamp'].tolist() == [pd.Timestamp('2024-01-01 10:00'), pd.Timestamp('2024-01-02 11:30'),
+                                         pd.Timestamp('2024-01-03 12:00')]
+    path.write_text('transaction_id,sender_id,receiver_id,amount,timestamp\nt1,A,B,10,2024-01-01T10:00:00+02:00\n')
+    assert read_transactions(str(path))['timestamp'].tolist() == [pd.Timestamp('2024-01-01 08:00')]
+
+
+def test_mixed_utc_offsets(tmp_path, client):
+    path = tmp_path / 'tx.csv'
+    path.write_text('transaction_id,sender_id,receiver_id,amount,timestamp\n'
+                    't1,A,B,10,2024-01-01T10:00:00+02:00\n'
+                    't2,B,C,10,2024-01-01T10:00:00Z\n'
+                    't3,C,A,10,2024-01-01T10:00:00-05:30\n'
+                    't4,A,C,10,2024-01-02 09:00:00\n'
+                    't5,C,B,10,not a date\n')
+    with pytest.raises(IngestError) as e:
+        read_transactions(str(path))
+    assert [(r['row'], r['column']) for r in e.value.errors] == [(5, 'timestamp')]
+    res = client.post('/analyze', files={'file': ('tx.csv', open(path, 'rb'), 'text/csv')})
+    assert res.status_code == 422 and res.json()['rows'][0]['row'] == 5
+    path.write_text('\n'.join(path.read_text().splitlines()[:-1]) + '\n')
+    assert read_transactions(str(path))['timestamp'].tolist() == [
+        pd.Timestamp('2024-01-01 08:00'), pd.Timestamp('2024-01-01 10:00'), pd.Timestamp('2024-01-01 15:30'),
+        pd.Timestamp('2024-01-02 09:00')]
+
+
+def test_malformed_rows_are_reported(tmp_path):
+    path = tmp_path / 'tx.csv'
+    path.write_text('transaction_id,sender_id,receiver_id,amount,timestamp\n'
+                    't1,A,B,10,2024-01-01\n'
+                    't2,,B,abc,2024-01-01\n'
+                    't3,A,B,10,not a date\n')
+    with pytest.raises(IngestError) as e:
+        read_transactions(str(path))
+    assert sorted((r['row'], r['column']) for r in e.value.errors) == [
+        (2, 'amount'), (2, 'sender_id'), (3, 'timestamp')]
+    assert e.value.to_dict()['rows'] == e.value.errors
+
+
+def test_missing_columns(tmp_path):
+    path = tmp_path / 'tx.csv'
+    path.write_text('transaction_id,sender_id,amount\nt1,A,10\n')
+    with pytest.raises(IngestError, match='receiver_id, timestamp'):
+        read_transactions(str(path))
+
+
+def test_empty_file_has_the_required_columns(tmp_path):
+    path = tmp_path / 'tx.csv'
+    path.write_text(','.join(ingest.REQUIRED) + '\n')
+    got = read_transactions(str(path))
+    assert list(got.columns) == ingest.REQUIRED and len(got) == 0
+
+
+class _Upload:
+    def __init__(self, data, filename):
+        self._body, self.filename = io.BytesIO(data), filename
+
+    async def read(self, n):
+        return self._body.read(n)
+
+
+def test_upload_is_spooled_hashed_and_removed(tmp_path):
+    df = random_frame(50, 10, seed=3)
+    df['timestamp'] = df['timestamp'].dt.floor('s')
+    data = open(write_csv(df, tmp_path / 'tx.csv'), 'rb').read()
+    h = hashlib.sha256()
+    path = asyncio.run(spool_upload(_Upload(data, 'tx.csv'), chunk=7, hasher=h))
+    try:
+        assert open(path, 'rb').read() == data and h.hexdigest() == hashlib.sha256(data).hexdigest()
+    finally:
+        os.unlink(path)
+    _same(asyncio.run(read_upload(_Upload(data, 'tx.csv'))), df)
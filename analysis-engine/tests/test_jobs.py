@@ -0,0 +1,119 @@
+import asyncio, io, json, os, threading, time
+import pytest
+
+from conftest import random_frame, write_csv
+from jobs import JobManager, JobQueueFull
+
+
+def _upload(path, name='tx.csv'):
+    return {'file': (name, open(path, 'rb'), 'text/csv')}
+
+
+def _wait(client, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f'/jobs/{job_id}').json()
+        if status['status'] in ('done', 'failed', 'cancelled'):
+            return status
+        time.sleep(0.05)
+    pytest.fail(f'job {job_id} still {status["status"]}')
+
+
+@pytest.fixture(scope='module')
+def upload(tmp_path_factory):
+    return write_csv(random_frame(1500, 100, seed=11), tmp_path_factory.mktemp('jobs') / 'tx.csv')
+
+
+def test_job_result_matches_analyze(client, upload):
+    job = client.post('/jobs', files=_upload(upload)).json()
+    assert job['status'] == 'queued'
+    status = _wait(client, job['job_id'])
+    assert status['status'] == 'done'
+    assert all(s['status'] == 'done' for s in status['stages'].values())
+    assert status['stages']['ingest']['counts'] == {'rows': 1500}
+    result = client.get(f'/jobs/{job["job_id"]}/result').json()
+    direct = client.post('/analyze', files=_upload(upload)).json()
+    for out in (result, direct):
+        out['summary'].pop('processing_time_seconds')
+    assert result == direct
+
+
+def test_events_replay_progress_then_the_result(client, upload):
+    job_id = client.post('/jobs', files=_upload(upload)).json()['job_id']
+    events = [json.loads(line) for line in client.get(f'/jobs/{job_id}/events').iter_lines() if line]
+    stages = [e['stage'] for e in events if e['event'] == 'stage']
+    assert stages[0] == 'ingest' and stages.index('graph') < stages.index('cycles') < stages.index('scoring')
+    partial = [e for e in events if 'suspicious_accounts' in e]
+    assert partial and all(e['provisional'] for e in partial[:-1]) and not partial[-1]['provisional']
+    assert events[-1]['event'] == 'done' and events[-1]['result']['summary']['total_accounts_analyzed'] == 100
+
+
+def test_malformed_upload_fails_the_job(client, tmp_path):
+    path = tmp_path / 'bad.csv'
+    path.write_text('transaction_id,sender_id,receiver_id,amount,timestamp\nt1,A,B,abc,2024-01-01\n')
+    job_id = client.post('/jobs', files=_upload(path)).json()['job_id']
+    assert _wait(client, job_id)['status'] == 'failed'
+    res = client.get(f'/jobs/{job_id}/result')
+    assert res.status_code == 422 and res.json()['rows'][0]['column'] == 'amount'
+
+
+def test_unknown_job(client):
+    assert client.get('/jobs/nope').status_code == 404
+    assert client.delete('/jobs/nope').status_code == 404
+
+
+class _Upload:
+    def __init__(self, data, filename='tx.csv'):
+        self._body, self.filename = io.BytesIO(data), filename
+
+    async def read(self, n):
+        return self._body.read(n)
+
+
+def test_queue_bound_and_cancelling_queued_jobs(upload):
+    async def scenario():
+        manager = JobManager(workers=0, queue_size=1)   # nothing drains the queue
+        await manager.start()
+        data = open(upload, 'rb').read()
+        job = await manager.submit(_Upload(data))
+        with pytest.raises(JobQueueFull):
+            await manager.submit(_Upload(data))
+        path = job.path
+        assert manager.cancel(job.id).status == 'cancelled'
+        assert not os.path.exists(path)
+        job.run()   # a cancelled job never starts
+        assert job.started_at is None and job.result is None
+        # A finished job is dropped on a second cancel
+        manager.cancel(job.id)
+        assert manager.get(job.id) is None
+        await manager.stop()
+    asyncio.run(scenario())
+
+
+def test_cancelling_a_running_job(upload, monkeypatch):
+    import jobs, pipeline
+    monkeypatch.setattr(pipeline, 'CANCEL_POLL', 0.01)
+    started, release = threading.Event(), threading.Event()
+    k = [s.name for s in pipeline.STAGES].index('cycles')
+    def stuck(r):
+        started.set()
+        release.wait(5)
+        return {'accounts': {}, 'rings': []}
+    stages = list(pipeline.STAGES)
+    stages[k] = stages[k]._replace(fn=stuck)
+    monkeypatch.setattr(pipeline, 'STAGES', stages)
+
+    async def scenario():
+        manager = JobManager(workers=1, queue_size=1)
+        await manager.start()
+        job = await manager.submit(_Upload(open(upload, 'rb').read()))
+        await asyncio.to_thread(started.wait, 5)
+        assert manager.cancel(job.id).status == 'cancelling'
+        while job.status not in jobs.TERMINAL:
+            await asyncio.sleep(0.01)
+        release.set()
+        await manager.stop()
+        return job
+    job = asyncio.run(scenario())
+    assert job.status == 'cancelled' and job.result is None and job.path is None
+    assert job.events[-1] == {'event': 'cancelled'}
@@ -0,0 +1,85 @@
+import threading, time
+import pytest
+
+import pipeline
+from conftest import random_frame, write_csv
+from pipeline import PipelineCancelled, Stage, analyze_file, run_pipeline, run_stages
+
+
+def _stage(name, deps=(), fn=None, log=None):
+    def run(r):
+        if log is not None:
+            log.append(('start', name))
+        out = fn(r) if fn else name
+        if log is not None:
+            log.append(('end', name))
+        return out
+    return Stage(name, deps, run)
+
+
+def test_stages_run_after_their_dependencies():
+    log = []
+    stages = [_stage('c', ('a', 'b'), lambda r: r['a'] + r['b'], log), _stage('a', (), None, log),
+              _stage('b', ('a',), lambda r: r['a'] * 2, log)]
+    seen = []
+    r = run_stages(stages, {}, on_stage=lambda name, result, secs: seen.append((name, result)))
+    assert r == {'a': 'a', 'b': 'aa', 'c': 'aaa'}
+    assert seen == [('a', 'a'), ('b', 'aa'), ('c', 'aaa')]
+    assert log.index(('end', 'a')) < log.index(('start', 'b')) < log.index(('end', 'b')) < log.index(('start', 'c'))
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(3, timeout=5)
+    stages = [_stage(n, ('root',), lambda r: barrier.wait() is not None) for n in 'xyz']
+    # Each stage waits for the other two, so this only finishes if all three run at once
+    assert run_stages(stages, {'root': 1}, concurrency=3).keys() == {'root', 'x', 'y', 'z'}
+
+
+def test_inputs_are_not_recomputed():
+    stages = [_stage('a', (), lambda r: pytest.fail('a was given')), _stage('b', ('a',), lambda r: r['a'] + 1)]
+    assert run_stages(stages, {'a': 1})['b'] == 2
+
+
+def test_failure_propagates_and_skips_dependents():
+    ran = []
+    def boom(r):
+        raise ValueError('detector failed')
+    stages = [_stage('a', (), boom), _stage('b', ('a',), lambda r: ran.append('b'))]
+    with pytest.raises(ValueError, match='detector failed'):
+        run_stages(stages, {})
+    assert ran == []
+
+
+def test_unsatisfiable_dependencies():
+    with pytest.raises(RuntimeError, match='missing'):
+        run_stages([_stage('missing', ('nowhere',))], {})
+
+
+def test_cancel_stops_between_stages(monkeypatch):
+    monkeypatch.setattr(pipeline, 'CANCEL_POLL', 0.01)
+    cancel, ran = threading.Event(), []
+    def slow(r):
+        cancel.set()
+        time.sleep(0.1)
+    stages = [_stage('a', (), slow), _stage('b', ('a',), lambda r: ran.append('b'))]
+    t = time.time()
+    with pytest.raises(PipelineCancelled):
+        run_stages(stages, {}, cancel=cancel)
+    assert time.time() - t < 0.1 and ran == []
+
+
+def test_concurrent_pipeline_matches_sequential(tmp_path):
+    df = random_frame(1500, 120, seed=4)
+    path = write_csv(df, tmp_path / 'tx.csv')
+    one, _ = analyze_file(path, concurrency=1)
+    four, r = analyze_file(path, concurrency=4)
+    for out in (one, four):
+        out['summary'].pop('processing_time_seconds')
+    assert one == four
+    assert set(r) == {'df'} | {s.name for s in pipeline.STAGES}
+
+
+def test_run_pipeline_reports_every_stage():
+    seen = []
+    run_pipeline(random_frame(300, 30, seed=5), on_stage=lambda name, result, secs: seen.append(name))
+    assert sorted(seen) == sorted(s.name for s in pipeline.STAGES)
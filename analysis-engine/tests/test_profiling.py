@@ -0,0 +1,71 @@
+import contextvars, io, time
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+from conftest import random_frame, write_csv
+from profiling import Metrics, Span, profiled, span
+
+
+def test_spans_aggregate_by_name_across_threads():
+    def work(k):
+        with span('stage', items=k):
+            time.sleep(0.01)
+    with profiled() as prof:
+        with ThreadPoolExecutor(2) as pool:
+            for k in range(4):
+                pool.submit(contextvars.copy_context().run, work, k)
+    rec = prof.to_dict()['spans']['stage']
+    assert rec['calls'] == 4 and rec['items'] == 6 and rec['wall_seconds'] >= 0.04
+    assert rec['cpu_seconds'] < rec['wall_seconds']   # sleeping costs no CPU
+
+
+def test_spans_outside_a_profile_only_feed_metrics():
+    def outside():
+        with span('outside'):
+            pass
+    with profiled() as prof:
+        with ThreadPoolExecutor(1) as pool:   # no copied context: not this request's work
+            pool.submit(outside).result()
+        with span('inside'):
+            pass
+    assert set(prof.to_dict()['spans']) == {'inside'}
+    assert 'outside' in profiling.METRICS.hist
+
+
+def test_metrics_histogram():
+    m = Metrics(buckets=(0.1, 1.0))
+    for wall in (0.05, 0.5, 5.0):
+        s = Span('x', items=2)
+        s.wall = wall
+        m.observe(s)
+    text = m.render()
+    assert 'mulenet_span_seconds_bucket{span="x",le="0.1"} 1' in text
+    assert 'mulenet_span_seconds_bucket{span="x",le="1.0"} 2' in text
+    assert 'mulenet_span_seconds_bucket{span="x",le="+Inf"} 3' in text
+    assert 'mulenet_span_seconds_sum{span="x"} 5.550000' in text
+    assert 'mulenet_span_items_total{span="x"} 6' in text
+
+
+def test_sampler_writes_folded_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    def busy():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+    with profiled(sample=True, name='run') as prof:
+        with span('busy'):
+            busy()
+    assert prof.path == str(tmp_path / 'run.folded')
+    lines = open(prof.path).read().splitlines()
+    assert lines and any('busy (test_profiling.py' in line for line in lines)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+
+def test_analyze_timings_and_metrics_endpoint(client, tmp_path):
+    body = open(write_csv(random_frame(300, 30, seed=17), tmp_path / 'tx.csv'), 'rb').read()
+    out = client.post('/analyze?timings=true', files={'file': ('tx.csv', io.BytesIO(body), 'text/csv')}).json()
+    spans = out['timings']['spans']
+    assert {'ingest', 'graph', 'cycles', 'scoring', 'output'} <= set(spans)
+    assert spans['ingest']['items'] == 300
+    metrics = client.get('/metrics').text
+    assert 'mulenet_span_seconds_count{span="cycles"}' in metrics and 'mulenet_process_peak_rss_bytes' in metrics
@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import frame
+from detectors.cycle_detector import detect_cycles
+from graph_engine import build_graph
+from ring_consolidation import consolidate_rings, ring_counts
+
+
+def _cycle(members, start, prefix, amount=1000):
+    n = len(members)
+    return [(f'{prefix}{i}', members[i], members[(i + 1) % n], amount - i, start + i) for i in range(n)]
+
+
+def _rings(rows, merge):
+    df = frame(rows)
+    G = build_graph(df)
+    return G, consolidate_rings(G, detect_cycles(G, df, workers=1), merge=merge)
+
+
+# Two cycles sharing the A→B transfer, a third sharing only account A, and an unrelated one
+ROWS = (_cycle(['A', 'B', 'C'], 0, 'x') + _cycle(['A', 'B', 'D'], 100, 'y') + _cycle(['A', 'E', 'F'], 200, 'z')
+        + _cycle(['P', 'Q', 'R'], 300, 'w'))
+
+
+def _members(result):
+    return sorted(sorted(r['member_accounts']) for r in result['rings'])
+
+
+def test_edge_sharing_cycles_merge():
+    G, result = _rings(ROWS, 'edges')
+    assert _members(result) == [['A', 'B', 'C', 'D'], ['A', 'E', 'F'], ['P', 'Q', 'R']]
+    net = next(r for r in result['rings'] if r['cycle_count'] == 2)
+    assert net['pattern_type'] == 'cycle_network'
+    assert sorted(map(tuple, net['edges'])) == [('A', 'B'), ('B', 'C'), ('B', 'D'), ('C', 'A'), ('D', 'A')]
+    assert net['total_flow'] == pytest.approx(sum(G.edge_amount[G.edge_id(G.index[s], G.index[d])]
+                                                  for s, d in net['edges']))
+    assert net['span_hours'] == 102
+    # A links two rings that share no transfer: the super-node case
+    assert dict(zip(G.accounts.tolist(), ring_counts(G, result).tolist()))['A'] == 2
+    assert len(result['index']['A']) == 2 and len(result['index']['B']) == 1
+
+
+def test_account_sharing_and_off():
+    _, accounts = _rings(ROWS, 'accounts')
+    assert _members(accounts) == [['A', 'B', 'C', 'D', 'E', 'F'], ['P', 'Q', 'R']]
+    _, off = _rings(ROWS, 'off')
+    assert len(off['rings']) == 4 and all(r['pattern_type'] == 'cycle' for r in off['rings'])
+
+
+def test_ids_follow_first_transaction():
+    _, result = _rings(ROWS, 'edges')
+    assert [r['ring_id'] for r in result['rings']] == ['RING_001', 'RING_002', 'RING_003']
+    assert [r['first_ts'] for r in result['rings']] == sorted(r['first_ts'] for r in result['rings'])
+    # Input order does not matter
+    _, shuffled = _rings(list(reversed(ROWS)), 'edges')
+    assert shuffled == result
+
+
+def test_merging_is_transitive():
+    # X shares an edge with Y, Y with Z; X and Z share nothing
+    rows = _cycle(['A', 'B', 'C'], 0, 'x') + _cycle(['B', 'C', 'D'], 10, 'y') + _cycle(['D', 'B', 'E'], 20, 'z')
+    _, result = _rings(rows, 'edges')
+    assert _members(result) == [['A', 'B', 'C', 'D', 'E']] and result['rings'][0]['cycle_count'] >= 3
+
+
+def test_no_cycles():
+    _, result = _rings([('1', 'A', 'B', 10, 0)], 'edges')
+    assert result == {'rings': [], 'index': {}}
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+import baseline
+from conftest import GENERATED, frame
+from detectors.benford_detector import benford_analysis
+from detectors.cycle_detector import detect_cycles
+from detectors.shell_detector import detect_shells
+from detectors.smurfing_detector import detect_smurfing
+from false_positive import apply_whitelist, whitelist_mask
+from graph_engine import build_graph
+from ingest import read_transactions
+from ring_consolidation import consolidate_rings
+from scoring import BIT, compute_scores, score_matrix
+
+# A hub joining two otherwise separate three-cycles
+HUB = frame([('1', 'H', 'A', 100, 0), ('2', 'A', 'B', 99, 1), ('3', 'B', 'H', 98, 2),
+             ('4', 'H', 'C', 100, 10), ('5', 'C', 'D', 99, 11), ('6', 'D', 'H', 98, 12)])
+
+
+def _detect(df):
+    G = build_graph(df)
+    return G, (detect_cycles(G, df, workers=1), detect_smurfing(G, df), detect_shells(G, df),
+               benford_analysis(G, df), apply_whitelist(G, df))
+
+
+def _compare(df, merge):
+    G, found = _detect(df)
+    rings = consolidate_rings(G, found[0], merge=merge)
+    got = compute_scores(G, df, *found, rings=rings)
+    ref = baseline.compute_scores(G.accounts.tolist(), df, *found, ring_ids=rings['index'])
+    assert got.keys() == ref.keys()
+    for acc, r in got.items():
+        assert sorted(r['detected_patterns']) == sorted(ref[acc]['detected_patterns'])
+        assert {k: v for k, v in r.items() if k not in ('detected_patterns', 'evidence')} == \
+            {k: v for k, v in ref[acc].items() if k != 'detected_patterns'}
+    scores = [r['suspicion_score'] for r in got.values()]
+    assert scores == sorted(scores, reverse=True)
+    return got
+
+
+@pytest.mark.parametrize('name', GENERATED)
+def test_matches_original_scoring(generated, name):
+    _compare(read_transactions(str(generated / name), name), 'off')
+
+
+def test_super_node_links_separate_rings():
+    got = _compare(HUB, 'edges')
+    assert 'super_node' in got['H']['detected_patterns']
+    assert not any('super_node' in r['detected_patterns'] for a, r in got.items() if a != 'H')
+    # Joined on shared accounts the hub is in one ring only
+    assert 'super_node' not in _compare(HUB, 'accounts')['H']['detected_patterns']
+
+
+def test_patterns_are_listed_in_canonical_order():
+    got = _compare(HUB, 'edges')['H']['detected_patterns']
+    assert got == sorted(got, key=list(BIT).index)
+
+
+def test_score_matrix_columns():
+    G, found = _detect(HUB)
+    rings = consolidate_rings(G, found[0])
+    m = score_matrix(G, *found, rings)
+    h = G.index['H']
+    assert m['ring_count'][h] == 2 and m['cycles'][h] == sum(found[0]['accounts']['H']['scores'])
+    assert m['bits'][h] & BIT['cycle_length_3'] and not m['bits'][h] & BIT['fan_in']
+    assert not m['whitelisted'].any()
+
+
+def test_whitelisted_accounts_are_never_flagged():
+    G, found = _detect(HUB)
+    assert 'H' not in compute_scores(G, HUB, *found[:4], whitelist={'H'})
+
+
+def test_whitelist_mask_merchant_and_payroll():
+    merchant = frame([(f'm{i}', f'C{i}', 'SHOP', 20 + i, i) for i in range(25)])
+    payroll = frame([(f'p{i}', 'CORP', f'E{i}', 3000, i) for i in range(12)])
+    G = build_graph(pd.concat([merchant, payroll], ignore_index=True))
+    mask = dict(zip(G.accounts.tolist(), whitelist_mask(G).tolist()))
+    assert {a for a, m in mask.items() if m} == {'SHOP', 'CORP'}
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from conftest import GENERATED, random_frame
+from graph_engine import build_graph
+from ingest import read_transactions
+from pipeline import run_pipeline
+from output_builder import build_output
+from sharding import analyze_sharded, merge_directory, plan_shards, run_shard_file, write_shards
+
+
+def _unsharded(df):
+    r = run_pipeline(df)
+    return build_output(r['lifecycle'], r['rings']['rings'], df, 0, total_accounts=len(r['graph']))
+
+
+def _strip(out):
+    return {**out, 'summary': {**out['summary'], 'processing_time_seconds': 0}}
+
+
+@pytest.fixture(scope='module')
+def combined(generated):
+    """All the generated files side by side (prefixed so they stay separate components), plus noise."""
+    parts = []
+    for k, name in enumerate(GENERATED):
+        df = read_transactions(str(generated / name), name)
+        parts.append(df.astype(str).assign(amount=df['amount'], timestamp=df['timestamp'],
+                                           sender_id=f'F{k}_' + df['sender_id'].astype(str),
+                                           receiver_id=f'F{k}_' + df['receiver_id'].astype(str)))
+    parts.append(random_frame(500, 400, seed=16, prefix='N'))
+    return pd.concat(parts, ignore_index=True)
+
+
+def test_plan_keeps_components_whole(combined):
+    G = build_graph(combined)
+    plan = plan_shards(G, shards=4)
+    rows = np.concatenate([s.rows for s in plan])
+    assert np.array_equal(np.sort(rows), np.arange(len(G.tx_src)))
+    adj = csr_matrix((np.ones(len(G.edge_src)), (G.edge_src, G.edge_dst)), shape=(len(G), len(G)))
+    _, labels = connected_components(adj, directed=True, connection='weak')
+    owner = {}
+    for s in plan:
+        for c in np.unique(labels[G.tx_src[s.rows]]).tolist():
+            assert owner.setdefault(c, s.id) == s.id
+    # The 10k stress file is over a quarter of the rows, so it runs alone
+    giants = [s for s in plan if s.giant]
+    assert len(giants) == 1 and len(plan) == 5
+    sizes = [len(s.rows) for s in plan if not s.giant]
+    assert max(sizes) - min(sizes) < 0.5 * max(sizes)
+
+
+@pytest.mark.parametrize('shards, workers', [(3, 1), (6, 2)])
+def test_sharded_equals_unsharded(combined, shards, workers):
+    out = analyze_sharded(combined, shards=shards, workers=workers, concurrency=1)
+    assert _strip(out) == _strip(_unsharded(combined))
+    assert out['fraud_rings'] and out['suspicious_accounts']
+
+
+def test_shard_files_round_trip(combined, tmp_path):
+    manifest = write_shards(combined, str(tmp_path), shards=3)
+    ids = [s['id'] for s in manifest['shards']]
+    for shard_id in ids[:-1]:
+        run_shard_file(str(tmp_path), shard_id, concurrency=1)
+    with pytest.raises(FileNotFoundError):
+        merge_directory(str(tmp_path))
+    run_shard_file(str(tmp_path), ids[-1], concurrency=1)
+    assert _strip(merge_directory(str(tmp_path))) == _strip(_unsharded(combined))
+
+
+def test_empty_frame():
+    out = analyze_sharded(random_frame(0, 1), shards=2)
+    assert out['suspicious_accounts'] == [] and out['summary']['total_accounts_analyzed'] == 0
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import baseline
+from conftest import frame, random_frame
+from detectors.shell_detector import detect_shells
+from graph_engine import build_graph
+
+
+def _velocity(df):
+    return {a: r for a, r in detect_shells(build_graph(df), df).items() if 'high_velocity' in r['patterns']}
+
+
+def test_forward_within_six_hours_inclusive():
+    assert 'M' in _velocity(frame([('r', 'A', 'M', 100, 0), ('s', 'M', 'B', 95, 6)]))
+    assert 'M' not in _velocity(frame([('r', 'A', 'M', 100, 0), ('s', 'M', 'B', 95, 6.001)]))
+    # Sending before receiving is not a pass-through
+    assert 'M' not in _velocity(frame([('r', 'A', 'M', 100, 5), ('s', 'M', 'B', 95, 4)]))
+    assert 'M' in _velocity(frame([('r', 'A', 'M', 100, 3), ('s', 'M', 'B', 95, 3)]))
+
+
+def test_busy_accounts_are_not_sampled():
+    # 600 receives and 600 sends, one pair 1h apart in the middle; the original only looked at the
+    # last 100 receives against the first 100 sends and missed it
+    rows = [(f'r{i}', f'S{i}', 'BUSY', 10, 1000 + i * 10) for i in range(600)]
+    rows += [(f's{i}', 'BUSY', f'R{i}', 10, i * 10 - 10000) for i in range(600)]
+    rows += [('late', 'BUSY', 'OUT', 10, 1000 + 300 * 10 + 1)]
+    found = _velocity(frame(rows))
+    ev = found['BUSY']['evidence']['high_velocity']
+    assert ev['matched_pairs'] == 1 and ev['examples'] == [
+        {'receive_tx': 'r300', 'send_tx': 'late', 'lag_seconds': 3600}]
+
+
+def test_evidence_summarises_lags():
+    rows = [('r1', 'A', 'M', 100, 0), ('s1', 'M', 'B', 90, 1), ('r2', 'C', 'M', 100, 10), ('s2', 'M', 'D', 90, 13)]
+    ev = _velocity(frame(rows))['M']['evidence']['high_velocity']
+    assert ev['matched_pairs'] == 2
+    assert ev['lag_seconds'] == {'min': 3600, 'p50': 7200.0, 'p90': 10080.0, 'max': 10800}
+
+
+def test_each_send_matches_its_latest_earlier_receive():
+    rows = [('r1', 'A', 'M', 100, 0), ('r2', 'C', 'M', 100, 8), ('s1', 'M', 'B', 90, 9)]
+    ev = _velocity(frame(rows))['M']['evidence']['high_velocity']
+    assert ev['examples'] == [{'receive_tx': 'r2', 'send_tx': 's1', 'lag_seconds': 3600}]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_baseline_on_random_graphs(seed):
+    df = random_frame(2500, 300, hours=2000, seed=seed)
+    got = set(_velocity(df))
+    assert got == baseline.high_velocity(df)
+    assert 0 < len(got) < 300
+
+
+def test_shell_account_needs_betweenness_few_txs_and_pass_through():
+    chain = frame([('1', 'O', 'S1', 100, 0), ('2', 'S1', 'S2', 98, 1), ('3', 'S2', 'X', 96, 2)])
+    G = build_graph(chain)
+    shells = detect_shells(G, chain)
+    assert {a for a, r in shells.items() if 'shell_account' in r['patterns']} == {'S1', 'S2'}
+    none = detect_shells(G, chain, betweenness=np.zeros(len(G)))
+    assert not any('shell_account' in r['patterns'] for r in none.values())
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import baseline
+from conftest import frame, random_frame
+from detectors.smurfing_detector import detect_smurfing
+from graph_engine import build_graph
+
+
+def _run(df):
+    return detect_smurfing(build_graph(df), df)
+
+
+def _fan_in(senders, hours, amount=500):
+    return frame([(f'f{i}', s, 'AGG', amount, h) for i, (s, h) in enumerate(zip(senders, hours))])
+
+
+def test_ten_distinct_senders_in_window():
+    found = _run(_fan_in([f'S{i}' for i in range(10)], range(10)))
+    assert found['AGG'] == {'patterns': ['fan_in'], 'scores': [20]}
+    assert 'AGG' not in _run(_fan_in([f'S{i}' for i in range(9)], range(9)))
+
+
+def test_repeat_senders_count_once():
+    assert 'AGG' not in _run(_fan_in([f'S{i % 9}' for i in range(30)], range(30)))
+
+
+def test_window_is_72_hours_inclusive():
+    senders = [f'S{i}' for i in range(10)]
+    assert 'AGG' in _run(_fan_in(senders, [0] + [72] * 9))
+    assert 'AGG' not in _run(_fan_in(senders, [0] + [72.01] * 9))
+
+
+def test_fan_out_and_structuring():
+    df = frame([(f'o{i}', 'HUB', f'R{i}', 9600, i) for i in range(12)])
+    assert _run(df)['HUB'] == {'patterns': ['fan_out', 'below_threshold_amounts'], 'scores': [20, 10]}
+    # Structuring needs an amount in [0.95 t, t) of some threshold t
+    edges = frame([('a', 'X', 'Y', 9500, 0), ('b', 'Z', 'W', 10000, 0), ('c', 'V', 'U', 9499.99, 0)])
+    assert set(_run(edges)) == {'X', 'Y'}
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_baseline_on_busy_random_graphs(seed):
+    # About half the accounts reach ten counterparties in some window
+    df = random_frame(3000, 60, hours=700, seed=seed)
+    df['amount'] = (df['amount'] % 11000).round(2)
+    got = _run(df)
+    ref = baseline.detect_smurfing(df)
+    assert {a: sorted(r['patterns']) for a, r in got.items()} == {a: sorted(r['patterns']) for a, r in ref.items()}
+    assert any('fan_in' in r['patterns'] for r in got.values())
+    assert any('fan_in' not in r['patterns'] for r in got.values())
@@ -0,0 +1,32 @@
+import startup
+from startup import Startup, timed_imports, warm_up
+
+
+def test_warm_up_calls_every_kernel():
+    kernels = warm_up()
+    assert set(kernels) == {'graph', 'account_index', 'features', 'fan_windows', 'velocity', 'benford',
+                            'cycles', 'betweenness'}
+    assert all(s >= 0 for s in kernels.values())
+
+
+def test_warmup_state_is_reported(monkeypatch):
+    import workers
+    monkeypatch.setattr(workers, 'prefork', lambda: 2)
+    s = Startup()
+    s._warm()
+    w = s.to_dict()['warmup']
+    assert w['state'] == 'done' and w['pool_workers'] == 2 and set(w['kernels']) >= {'graph', 'betweenness'}
+    monkeypatch.setattr(startup, 'warm_up', lambda: 1 / 0)
+    s._warm()
+    assert s.warmup['state'] == 'failed' and 'ZeroDivisionError' in s.warmup['error']
+
+
+def test_timed_imports_skip_loaded_modules():
+    assert timed_imports(('json',)) == {'json': 0.0}
+
+
+def test_health_reports_startup(client):
+    body = client.get('/health').json()
+    assert body['status'] == 'alive' and body['startup']['ready_seconds'] > 0
+    assert set(body['startup']['imports']) == set(startup.HEAVY)
+    assert body['startup']['warmup']['state'] == 'off'
@@ -0,0 +1,160 @@
+import io, os, threading, time
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import random_frame, write_csv
+from graph_engine import build_graph
+from pipeline import analyze_file
+from store import DAY_NS, TransactionStore, analyze_range, parse_time
+
+BASE_NS = pd.Timestamp('2024-01-01').value
+
+
+def _frame(seed=19, n=3000):
+    df = random_frame(n, 150, hours=24 * 6, seed=seed)   # six days
+    df['timestamp'] = df['timestamp'].dt.floor('s')
+    return df
+
+
+def _same(G, df):
+    H = build_graph(df)
+    assert G.accounts.tolist() == H.accounts.tolist()
+    for col in ('tx_src', 'tx_dst', 'tx_amount', 'tx_ts'):
+        np.testing.assert_array_equal(getattr(G, col), getattr(H, col), err_msg=col)
+    assert sorted(G.tx_id.tolist()) == sorted(H.tx_id.tolist())
+
+
+def test_append_partitions_by_day_and_skips_duplicates(tmp_path):
+    store, df = TransactionStore(str(tmp_path)), _frame()
+    first = store.append(pd.concat([df.iloc[:2000], df.iloc[:10]]))
+    assert first['appended'] == 2000 and first['duplicates'] == 10 and len(first['days']) == 6
+    second = store.append(df.iloc[1500:])
+    assert second['appended'] == 1000 and second['duplicates'] == 500
+    stats = store.stats()
+    assert stats['transactions'] == 3000 and stats['days'] == 6 and stats['parts'] == 12
+    assert stats['first_day'] == '2024-01-01' and stats['last_day'] == '2024-01-06'
+    _same(store.graph(), df)
+
+
+def test_compaction_keeps_rows_and_dedup(tmp_path):
+    store, df = TransactionStore(str(tmp_path)), _frame()
+    for lo in range(0, 3000, 600):
+        store.append(df.iloc[lo:lo + 600])
+    before = store.stats()['parts']
+    assert store.compact() == 6 and store.stats()['parts'] == 6 < before
+    for day in os.listdir(tmp_path):
+        if day.startswith('day='):
+            part = os.path.join(tmp_path, day, os.listdir(os.path.join(tmp_path, day))[0])
+            assert np.all(np.diff(np.load(os.path.join(part, 'ts.npy'))) >= 0)
+    _same(store.graph(), df)
+    assert store.append(df.iloc[:100])['duplicates'] == 100
+    # A fresh instance reads the same state back from disk
+    again = TransactionStore(str(tmp_path))
+    _same(again.graph(), df)
+    assert again.append(df.iloc[:5])['appended'] == 0
+
+
+def test_reads_during_a_merge_see_each_row_once(tmp_path, monkeypatch):
+    import store as store_module
+    store, df = TransactionStore(str(tmp_path)), _frame(n=600)
+    for lo in range(0, 600, 200):
+        store.append(df.iloc[lo:lo + 200])
+    write, seen = store_module._write_part, []
+
+    def write_then_read(path, cols, **kw):
+        out = write(path, cols, **kw)
+        # Another thread reads once the merged part is on disk but before the old parts are gone
+        reader = threading.Thread(target=lambda: seen.append(len(store.graph().tx_id)))
+        reader.start()
+        reader.join(5)
+        return out
+
+    monkeypatch.setattr(store_module, '_write_part', write_then_read)
+    assert store.compact() == 6
+    assert seen == [600] * 6
+    stats = store.stats()
+    assert stats['transactions'] == 600 and stats['parts'] == 6
+    assert not [p for day in os.listdir(tmp_path) if day.startswith('day=')
+                for p in os.listdir(os.path.join(tmp_path, day)) if p.endswith('.tmp')]
+
+
+def test_background_compactor(tmp_path, monkeypatch):
+    import store as store_module
+    monkeypatch.setattr(store_module, 'COMPACT_PARTS', 3)
+    store, df = TransactionStore(str(tmp_path)), _frame(n=300)
+    store.start_compactor(interval=60)
+    try:
+        for lo in range(0, 300, 100):
+            store.append(df.iloc[lo:lo + 100])   # the third append wakes the compactor
+        for _ in range(200):
+            if store.compactions:
+                break
+            time.sleep(0.01)
+    finally:
+        store.stop_compactor()
+    assert store.compactions == 6 and store.stats()['parts'] == 6
+    _same(store.graph(), df)
+
+
+@pytest.mark.parametrize('start, end', [(1, 3), (0.5, 2.25), (None, 2), (4, None), (7, 9)])
+def test_time_range_queries(tmp_path, start, end):
+    store, df = TransactionStore(str(tmp_path)), _frame()
+    store.append(df)
+    lo = None if start is None else BASE_NS + int(start * DAY_NS)
+    hi = None if end is None else BASE_NS + int(end * DAY_NS)
+    ts = df['timestamp'].values.astype('datetime64[ns]').view('int64')
+    keep = np.ones(len(df), dtype=bool)
+    if lo is not None:
+        keep &= ts >= lo
+    if hi is not None:
+        keep &= ts < hi
+    G = store.graph(lo, hi)
+    if not keep.any():
+        assert G is None
+    else:
+        _same(G, df[keep])
+
+
+def test_account_queries(tmp_path):
+    store, df = TransactionStore(str(tmp_path)), _frame()
+    store.append(df)
+    picked = ['A0003', 'A0077', 'NOT_STORED']
+    hi = BASE_NS + 3 * DAY_NS
+    want = df[(df['sender_id'].isin(picked) | df['receiver_id'].isin(picked)) &
+              (df['timestamp'].values.astype('datetime64[ns]').view('int64') < hi)]
+    _same(store.graph(None, hi, accounts=picked), want)
+    assert store.graph(accounts=['NOT_STORED']) is None
+
+
+def test_range_analysis_equals_uploading_the_rows(tmp_path):
+    store, df = TransactionStore(str(tmp_path / 'store')), _frame()
+    store.append(df)
+    lo, hi = BASE_NS + DAY_NS, BASE_NS + 4 * DAY_NS
+    out, _ = analyze_range(lo, hi, store=store)
+    ts = df['timestamp'].values.astype('datetime64[ns]').view('int64')
+    full, _ = analyze_file(write_csv(df[(ts >= lo) & (ts < hi)], tmp_path / 'part.csv'))
+    strip = lambda o: {**o, 'summary': {**o['summary'], 'processing_time_seconds': 0}}
+    assert strip(out) == strip(full)
+
+
+def test_parse_time():
+    assert parse_time(None) is None and parse_time('') is None
+    assert parse_time('2024-01-02') == BASE_NS + DAY_NS
+    assert parse_time('2024-01-01T02:00:00+02:00') == BASE_NS
+    with pytest.raises(ValueError):
+        parse_time('yesterday')
+
+
+def test_store_endpoints(client, tmp_path):
+    df = _frame(seed=20, n=500)
+    body = open(write_csv(df, tmp_path / 'tx.csv'), 'rb').read()
+    upload = lambda: {'file': ('tx.csv', io.BytesIO(body), 'text/csv')}
+    stored = client.post('/analyze?persist=true', files=upload()).json()['stored']
+    assert stored['appended'] + stored['duplicates'] == 500
+    assert client.post('/store/transactions', files=upload()).json()['appended'] == 0
+    assert client.get('/store').json()['transactions'] >= 500
+    res = client.post('/analyze?start=2024-01-02&end=2024-01-03')
+    assert res.status_code == 200 and res.json()['summary']['total_accounts_analyzed'] > 0
+    assert client.post('/analyze?start=2024-01-02', files=upload()).status_code == 400
+    assert client.post('/analyze?start=someday').status_code == 400
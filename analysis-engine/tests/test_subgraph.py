@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from conftest import frame, random_frame, write_csv
+from graph_engine import build_graph
+from subgraph import induced_edges, neighborhood
+
+
+def _hops(G, seeds, hops=2, budget=100):
+    nodes, dist, truncated = neighborhood(G, [G.index[s] for s in seeds], hops, budget)
+    return dict(zip(G.accounts[nodes].tolist(), dist.tolist())), truncated
+
+
+def _bfs(G, seeds, hops):
+    """Undirected shortest hop distances, one Python step at a time."""
+    nbrs = {}
+    for s, d in zip(G.edge_src.tolist(), G.edge_dst.tolist()):
+        nbrs.setdefault(s, set()).add(d)
+        nbrs.setdefault(d, set()).add(s)
+    dist, frontier = {s: 0 for s in seeds}, list(seeds)
+    for h in range(1, hops + 1):
+        frontier = [v for u in frontier for v in nbrs.get(u, ()) if v not in dist]
+        dist.update((v, h) for v in frontier)
+    return dist
+
+
+def test_hops_are_shortest_distances():
+    # The heavy path S→A→B must not give B hop 2 when S→B is a direct transfer
+    G = build_graph(frame([('1', 'S', 'A', 100, 0), ('2', 'S', 'B', 1, 1), ('3', 'A', 'B', 50, 2),
+                           ('4', 'B', 'C', 10, 3)]))
+    assert _hops(G, ['S']) == ({'S': 0, 'A': 1, 'B': 1, 'C': 2}, False)
+    assert _hops(G, ['S'], hops=1) == ({'S': 0, 'A': 1, 'B': 1}, False)
+    assert _hops(G, ['C'], hops=0) == ({'C': 0}, False)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_breadth_first_search(seed):
+    G = build_graph(random_frame(600, 200, seed=seed))
+    seeds = [0, 7]
+    nodes, dist, truncated = neighborhood(G, seeds, hops=3, budget=len(G))
+    assert dict(zip(nodes.tolist(), dist.tolist())) == _bfs(G, seeds, 3) and not truncated
+
+
+def test_budget_keeps_the_highest_flow_of_the_cut_hop():
+    rows = [(f'o{i}', 'HUB', f'R{i}', 100 * (i + 1), i) for i in range(10)]
+    rows += [('far', 'R0', 'FAR', 1e6, 20)]
+    G = build_graph(frame(rows))
+    got, truncated = _hops(G, ['HUB'], budget=4)
+    assert got == {'HUB': 0, 'R9': 1, 'R8': 1, 'R7': 1} and truncated
+    # Incoming transfers count the same as outgoing ones
+    assert _hops(G, ['FAR'], budget=3) == ({'FAR': 0, 'R0': 1, 'HUB': 2}, False)
+    # A full budget cuts the next hop off entirely
+    assert _hops(G, ['FAR'], hops=3, budget=3) == ({'FAR': 0, 'R0': 1, 'HUB': 2}, True)
+
+
+def test_induced_edges_stay_inside_and_are_capped():
+    G = build_graph(random_frame(500, 60, seed=3))
+    nodes, _, _ = neighborhood(G, [0], hops=1, budget=20)
+    edges, cut = induced_edges(G, nodes, limit=10 ** 6)
+    inside = set(nodes.tolist())
+    want = [e for e in range(len(G.edge_src)) if G.edge_src[e] in inside and G.edge_dst[e] in inside]
+    assert sorted(edges.tolist()) == want and not cut
+    assert np.all(np.diff(G.edge_amount[edges]) <= 0)
+    top, cut = induced_edges(G, nodes, limit=3)
+    assert top.tolist() == edges[:3].tolist() and cut == (len(edges) > 3)
+
+
+@pytest.fixture(scope='module')
+def analysis(client, tmp_path_factory):
+    ring = [('c1', 'RA', 'RB', 5000, 1), ('c2', 'RB', 'RC', 4900, 2), ('c3', 'RC', 'RA', 4800, 3)]
+    df = frame(ring + [('x1', 'RA', 'OUT', 70, 4), ('x2', 'IN', 'RB', 60, 5), ('x3', 'OUT', 'FAR', 50, 6)])
+    path = write_csv(df, tmp_path_factory.mktemp('subgraph') / 'ring.csv')
+    return client.post('/analyze', files={'file': ('ring.csv', open(path, 'rb'), 'text/csv')}).json()
+
+
+def test_account_subgraph_endpoint(client, analysis):
+    url = f'/analyses/{analysis["analysis_id"]}/accounts/RA/subgraph'
+    body = client.get(url, params={'hops': 1}).json()
+    assert body['account_id'] == 'RA' and body['hops'] == 1 and not body['truncated']
+    assert {n['account_id']: n['hop'] for n in body['nodes']} == {'RA': 0, 'RB': 1, 'RC': 1, 'OUT': 1}
+    ra = body['nodes'][0]
+    assert ra['ring_id'] != 'RING_NONE' and 'cycle_length_3' in ra['detected_patterns']
+    edge = next(e for e in body['edges'] if (e['source'], e['target']) == ('RA', 'RB'))
+    assert edge['total_amount'] == 5000 and edge['count'] == 1 and edge['span_hours'] == 0
+    assert {(e['source'], e['target']) for e in body['edges']} == {('RA', 'RB'), ('RC', 'RA'), ('RB', 'RC'),
+                                                                  ('RA', 'OUT')}
+    assert client.get(url, params={'hops': 1}).json() == body   # memoized
+    assert client.get(url, params={'hops': 2, 'budget': 2}).json()['truncated']
+    assert client.get(f'/analyses/{analysis["analysis_id"]}/accounts/NOBODY/subgraph').status_code == 404
+    assert client.get('/analyses/0123456789abcdef/accounts/RA/subgraph').status_code == 404
+
+
+def test_ring_subgraph_endpoint(client, analysis):
+    ring = analysis['fraud_rings'][0]
+    url = f'/analyses/{analysis["analysis_id"]}/rings/{ring["ring_id"]}/subgraph'
+    body = client.get(url).json()
+    assert sorted(n['account_id'] for n in body['nodes']) == sorted(ring['member_accounts'])
+    assert all(n['hop'] == 0 for n in body['nodes']) and len(body['edges']) == 3
+    wider = client.get(url, params={'hops': 1}).json()
+    assert {n['account_id'] for n in wider['nodes'] if n['hop'] == 1} == {'OUT', 'IN'}
+    assert client.get(f'/analyses/{analysis["analysis_id"]}/rings/RING_999/subgraph').status_code == 404
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+import benchmark
+from synthetic import generate, parse_size, write
+from ingest import read_transactions
+from pipeline import analyze_file
+
+
+def test_same_seed_same_data():
+    a, truth_a = generate(3000, seed=4)
+    b, truth_b = generate(3000, seed=4)
+    pd.testing.assert_frame_equal(a, b)
+    assert truth_a == truth_b
+    c, _ = generate(3000, seed=5)
+    assert not a['amount'].equals(c['amount'])
+
+
+def test_size_and_labels():
+    df, truth = generate(5000, seed=1, days=10)
+    assert abs(len(df) - 5000) < 250 and df['transaction_id'].is_unique
+    assert (df['sender_id'].astype(str) != df['receiver_id'].astype(str)).all()
+    span = df['timestamp'].max() - df['timestamp'].min()
+    assert span <= pd.Timedelta(days=10) + pd.Timedelta(hours=72)
+    accounts = set(df['sender_id'].astype(str)) | set(df['receiver_id'].astype(str))
+    for label, members in truth['labels'].items():
+        assert set(members) <= accounts, label
+    assert all(truth['labels'].get(label) for label in truth['positive_labels'])
+
+
+def test_parse_size():
+    assert [parse_size(s) for s in ('10k', '2.5m', '700', ' 1M ')] == [10_000, 2_500_000, 700, 1_000_000]
+
+
+@pytest.mark.parametrize('ext', ['csv', 'parquet'])
+def test_written_file_reads_back(tmp_path, ext):
+    df, truth = generate(2000, seed=2)
+    path = str(tmp_path / f'synth.{ext}')
+    write(df, truth, path)
+    back = read_transactions(path, path)
+    assert len(back) == len(df) and back['amount'].sum() == pytest.approx(df['amount'].sum())
+
+
+def test_engine_finds_the_planted_patterns(tmp_path):
+    df, truth = generate(10_000, seed=0)
+    path = str(tmp_path / 'synth.parquet')
+    write(df, truth, path)
+    out, _ = analyze_file(path)
+    quality = benchmark.score(out, truth)
+    assert quality['ring_recall'] == 1.0 and quality['score>=50']['precision'] == 1.0
+    assert quality['score>=0']['trap_false_positives'] == 0
+    flagged = {a['account_id'] for a in out['suspicious_accounts']}
+    labels = truth['labels']
+    assert set(labels['cycle'] + labels['smurf_aggregator']) <= flagged
+
+
+def test_compare_flags_regressions():
+    base = {'seconds': 10.0, 'peak_rss_mb': 500, 'spans': {'cycles': 4.0},
+            'quality': {'score>=0': {'precision': 0.9, 'recall': 0.9, 'trap_false_positives': 0},
+                        'ring_recall': 1.0}}
+    assert benchmark.compare(base, base) == []
+    worse = {**base, 'seconds': 16.0, 'spans': {'cycles': 4.2}, 'peak_rss_mb': 700,
+             'quality': {'score>=0': {'precision': 0.85, 'recall': 0.9, 'trap_false_positives': 2},
+                         'ring_recall': 0.8}}
+    problems = benchmark.compare(worse, base)
+    assert [p.split(':')[0] for p in problems] == ['total', 'peak RSS', 'score>=0 precision',
+                                                   'score>=0 trap false positives', 'ring_recall recall']
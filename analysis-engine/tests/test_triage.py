@@ -0,0 +1,137 @@
+import time
+import pandas as pd
+import pytest
+
+import pipeline, triage
+from cache import ResultCache
+from conftest import frame, random_frame, write_csv
+from detectors.cycle_detector import detect_cycles, cycle_candidates
+from detectors.shell_detector import shell_candidates
+from graph_engine import build_graph
+from ingest import read_transactions
+from pipeline import analyze_file
+from triage import analyze_budgeted
+
+
+@pytest.fixture(autouse=True)
+def no_gnn(monkeypatch):
+    # Keep the runs comparable whether or not torch is installed here
+    monkeypatch.setattr(pipeline, 'GNN_ENABLED', False)
+    monkeypatch.setattr(triage, 'COST', dict(triage.COST))
+
+
+@pytest.fixture(scope='module')
+def upload(tmp_path_factory):
+    # Random traffic plus a fan-in aggregator, which the cheap stages settle on their own
+    fan_in = frame([(f'F{i}', f'S{i}', 'AGG', 500, i) for i in range(12)])
+    df = pd.concat([random_frame(3000, 120, hours=500, seed=21), fan_in], ignore_index=True)
+    path = write_csv(df, tmp_path_factory.mktemp('triage') / 'tx.csv')
+    return read_transactions(str(path), 'tx.csv'), path
+
+
+def _plain(out):
+    accounts = [{k: v for k, v in a.items() if k != 'score_status'} for a in out['suspicious_accounts']]
+    return {**{k: v for k, v in out.items() if k != 'triage'}, 'suspicious_accounts': accounts,
+            'summary': {**out['summary'], 'processing_time_seconds': 0}}
+
+
+def test_large_budget_is_the_full_analysis(upload):
+    _, path = upload
+    out, _ = analyze_budgeted(str(path), 'tx.csv', budget=600)
+    full, _ = analyze_file(str(path), 'tx.csv')
+    assert _plain(out) == _plain(full)
+    t = out['triage']
+    assert t['complete'] and t['skipped'] == [] and t['approximated'] == [] and t['budget_seconds'] == 600
+    assert {n: s['status'] for n, s in t['stages'].items()} == {'cycles': 'full', 'shells': 'full', 'gnn': 'disabled'}
+    assert all(a['score_status'] == 'final' for a in out['suspicious_accounts'])
+
+
+def test_no_time_for_the_expensive_stages(upload):
+    df, path = upload
+    triage.COST.update(cycles=1e3, betweenness=1e3)
+    out, r = analyze_budgeted(str(path), 'tx.csv', budget=1)
+    t = out['triage']
+    assert not t['complete'] and t['skipped'] == ['cycles'] and t['approximated'] == ['shells']
+    assert t['stages']['cycles'] == {'status': 'skipped', 'reason': 'budget'}
+    assert t['stages']['shells']['betweenness'] is None
+    assert r['cycles'] == {'accounts': {}, 'rings': []} and out['fraud_rings'] == []
+    # Only accounts the skipped stages could still flag are provisional
+    G = build_graph(df)
+    open_ = set(G.accounts[cycle_candidates(G) | shell_candidates(r['features'])].tolist())
+    for a in out['suspicious_accounts']:
+        assert a['score_status'] == ('provisional' if a['account_id'] in open_ else 'final')
+    assert next(a for a in out['suspicious_accounts'] if a['account_id'] == 'AGG')['score_status'] == 'final'
+
+
+def test_shorter_ring_search_when_the_full_one_does_not_fit(upload):
+    df, path = upload
+    G = build_graph(df)
+    # Full search estimated at 3 s against 2.25 s after the reserve; up to length 4 is two thirds of it
+    triage.COST.update(cycles=3.0 / G.number_of_edges(), betweenness=1e3)
+    out, r = analyze_budgeted(str(path), 'tx.csv', budget=2.5)
+    cycles = out['triage']['stages']['cycles']
+    assert cycles['status'] == 'approximate' and cycles['max_len'] == 4
+    assert r['cycles']['rings'] == detect_cycles(G, df, max_len=4)['rings']
+    assert 'cycles' in out['triage']['approximated']
+
+
+def test_overrun_raises_the_estimate_and_replans(upload, monkeypatch):
+    _, path = upload
+    triage.COST.update(cycles=1e-12, betweenness=1e3)
+    plan, events = triage._cycle_plan, []
+
+    def slow(r, deadline):
+        # Like the real stages: work until the deadline, then stop
+        while time.time() < deadline:
+            time.sleep(0.01)
+        events.append(('stopped', time.time()))
+        raise TimeoutError
+
+    def once_slow(G, avail):
+        events.append(('plan', time.time()))
+        v = plan(G, avail)
+        return v._replace(fn=slow, scale=1.0) if v is not None and len(events) == 1 else v
+
+    monkeypatch.setattr(triage, '_cycle_plan', once_slow)
+    out, _ = analyze_budgeted(str(path), 'tx.csv', budget=1)
+    cycles = out['triage']['stages']['cycles']
+    assert cycles['timed_out'] == {'status': 'full'}
+    assert triage.COST['cycles'] > 1e-6
+    assert out['triage']['elapsed_seconds'] < 2
+    # The overrun variant had stopped before the stage was planned again
+    assert [e for e, _ in events] == ['plan', 'stopped', 'plan']
+    assert events[1][1] <= events[2][1]
+
+
+def test_budget_stops_the_ring_search(monkeypatch, tmp_path):
+    # A dense upload whose full ring search takes minutes, with its cost badly underestimated
+    df = random_frame(6000, 60, hours=72, seed=1)
+    path = write_csv(df, tmp_path / 'dense.csv')
+    triage.COST.update(cycles=1e-12, betweenness=1e3)
+    started = time.time()
+    out, _ = analyze_budgeted(str(path), 'dense.csv', budget=1)
+    assert time.time() - started < 3
+    assert out['triage']['stages']['cycles']['timed_out'] == {'status': 'full'}
+    assert 'cycles' in out['triage']['skipped'] + out['triage']['approximated']
+
+
+def test_complete_runs_are_cached(upload, tmp_path, monkeypatch):
+    _, path = upload
+    cache = ResultCache(memory_bytes=1 << 26, disk_bytes=0, directory=str(tmp_path))
+    monkeypatch.setattr(triage, 'CACHE', cache)
+    monkeypatch.setattr(pipeline, 'CACHE', cache)
+    first, _ = analyze_budgeted(str(path), 'tx.csv', budget=600, digest='d' * 64)
+    cache.flush()
+    again, r = analyze_budgeted(str(path), 'tx.csv', budget=0.01, digest='d' * 64)
+    assert r is None and _plain(again) == _plain(first)
+    assert all(s.get('cached') for n, s in again['triage']['stages'].items() if n != 'gnn')
+
+
+def test_budget_on_the_endpoint(client, upload):
+    _, path = upload
+    res = client.post('/analyze?budget=30', files={'file': ('tx.csv', open(path, 'rb'), 'text/csv')})
+    out = res.json()
+    assert res.status_code == 200 and out['triage']['budget_seconds'] == 30
+    assert all(a['score_status'] in ('final', 'provisional') for a in out['suspicious_accounts'])
+    res = client.post('/analyze?budget=30&shards=2', files={'file': ('tx.csv', open(path, 'rb'), 'text/csv')})
+    assert res.status_code == 400
@@ -0,0 +1,221 @@
+"""Time-budgeted triage: the best answer an upload allows within ``budget`` seconds."""
+import os, time
+from collections import namedtuple
+import numpy as np
+
+import centrality, pipeline
+from cache import CACHE
+from centrality import betweenness
+from detectors.cycle_detector import detect_cycles, cycle_candidates, MIN_LEN, MAX_LEN
+from detectors.shell_detector import detect_shells, shell_candidates
+from output_builder import build_output
+from pipeline import STAGES, CONCURRENCY, run_stages, stage_keys, output_key, _from_cache, _ingest, _gnn
+from profiling import span
+
+CHEAP = ('graph', 'index', 'features', 'smurfing', 'benford', 'whitelist')
+RESERVE = float(os.environ.get('TRIAGE_RESERVE', 0.1))   # share of the budget kept for scoring and output
+MAX_EPSILON = 0.3    # coarsest betweenness worth computing; shells go without it beyond this
+SAFETY = 0.8         # share of the remaining time an approximate variant is sized for
+ALPHA = 0.5          # weight of the newest run in the cost estimates
+
+# Seconds per graph edge, refined as runs complete: cycle enumeration, full
+# betweenness, the shell tests given betweenness (velocity pairs), the GNN
+COST = {'cycles': 1e-5, 'betweenness': 6e-4, 'velocity': 4e-6, 'gnn': 1e-4}
+# Most points the stage adds to one account's score; per estimated second, orders the stages
+VALUE = {'cycles': 50, 'shells': 15, 'gnn': 30}
+
+# fn(results, deadline) computes the variant; scale is its cost relative to the full one
+# (0: nothing to learn from it, e.g. a memoized result)
+Variant = namedtuple('Variant', ['status', 'detail', 'estimate', 'fn', 'scale'])
+
+
+def _bc_memoized(G):
+    return ('betweenness', centrality.MODE, centrality.EPSILON, centrality.DELTA, 0) in G.cache
+
+
+def _cycle_plan(G, avail):
+    """The deepest ring search that fits ``avail`` seconds, or None."""
+    full = COST['cycles'] * G.number_of_edges()
+    for max_len in range(MAX_LEN, MIN_LEN - 1, -1):
+        share = (max_len - MIN_LEN + 1) / (MAX_LEN - MIN_LEN + 1)
+        if full * share <= max(avail, 0):
+            run = lambda r, deadline, m=max_len: detect_cycles(r['graph'], r['df'], max_len=m, deadline=deadline)
+            return Variant('full' if max_len == MAX_LEN else 'approximate',
+                           {} if max_len == MAX_LEN else {'max_len': max_len}, full * share, run, share)
+    return None
+
+
+def _betweenness_plan(G, avail):
+    """Full betweenness if it fits (or is memoized), else the finest epsilon that fits, or None."""
+    full = 0.0 if _bc_memoized(G) else COST['betweenness'] * G.number_of_edges()
+    if full <= max(avail, 0):
+        return Variant('full', {}, full, lambda r, deadline: betweenness(r['graph'], deadline=deadline),
+                       1.0 if full else 0.0)
+    eps = centrality.EPSILON * (full / max(avail * SAFETY, 1e-9)) ** 0.5
+    if eps > MAX_EPSILON:
+        return None
+    scale = (centrality.EPSILON / eps) ** 2
+    return Variant('approximate', {'epsilon': round(eps, 4)}, full * scale,
+                   lambda r, deadline: betweenness(r['graph'], mode='approx', epsilon=eps, deadline=deadline),
+                   scale)
+
+
+def _gnn_plan(G, avail):
+    """The GNN if it fits; its features include the full betweenness."""
+    full = COST['gnn'] * G.number_of_edges()
+    if not _bc_memoized(G):
+        full += COST['betweenness'] * G.number_of_edges()
+
+    def run(r, deadline):
+        betweenness(r['graph'], deadline=deadline)
+        return _gnn(r, deadline)
+    return Variant('full', {}, full, run, 1.0 if _bc_memoized(G) else 0.0) if full <= max(avail, 0) else None
+
+
+def _learn(name, seconds, scale, edges, at_least=False):
+    """Fold an observed run (or, ``at_least``, a timed-out one) into the per-edge cost of ``name``."""
+    if scale > 0 and edges:
+        rate = seconds / scale / edges
+        COST[name] = max(COST[name], rate) if at_least else (1 - ALPHA) * COST[name] + ALPHA * rate
+
+
+def _expensive(name, cost, plan, r, deadline, reserve, report):
+    """Run one expensive stage in the best variant that fits the time left; records it in ``report``.
+
+    Each variant gets the deadline and stops itself there (TimeoutError), so
+    nothing keeps running past the budget; the cost estimate is then raised
+    and the stage planned again for whatever time is left.
+    """
+    G, timed_out = r['graph'], None
+    while True:
+        avail = deadline - time.perf_counter() - reserve
+        v = plan(G, avail)
+        if v is None:
+            report[name] = {'status': 'skipped', 'reason': 'timed_out' if timed_out else 'budget',
+                            **({'timed_out': timed_out} if timed_out else {})}
+            return None
+        t = time.perf_counter()
+        try:
+            result = v.fn(r, time.time() + avail)
+        except TimeoutError:
+            _learn(cost, time.perf_counter() - t, v.scale, G.number_of_edges(), at_least=True)
+            timed_out = {'status': v.status, **v.detail}
+            continue
+        seconds = time.perf_counter() - t
+        _learn(cost, seconds, v.scale, G.number_of_edges())
+        report[name] = {'status': v.status, **v.detail, 'seconds': round(seconds, 3),
+                        'estimate_seconds': round(v.estimate, 3),
+                        **({'timed_out': timed_out} if timed_out else {})}
+        return result
+
+
+def _shells(r, deadline, reserve, report):
+    """Betweenness in the best variant that fits, leaving time for the shell tests that always run after it."""
+    G = r['graph']
+    edges = G.number_of_edges()
+    bc = _expensive('shells', 'betweenness', _betweenness_plan, r, deadline,
+                    reserve + COST['velocity'] * edges, report)
+    if bc is None:
+        report['shells'] = {**report['shells'], 'status': 'approximate', 'betweenness': None}
+        bc = np.zeros(G.number_of_nodes())
+    t = time.perf_counter()
+    shells = detect_shells(G, r['df'], features=r['features'], index=r['index'], betweenness=bc)
+    _learn('velocity', time.perf_counter() - t, 1.0, edges)
+    return shells
+
+
+def analyze_budgeted(path, filename='', budget=5.0, digest=None, concurrency=CONCURRENCY):
+    """Like ``analyze_file`` but answers within about ``budget`` seconds; returns (output, stage results).
+
+    The output adds ``score_status`` (``final`` or ``provisional``) to every
+    account and a ``triage`` block: budget, elapsed time, each expensive
+    stage's status (``full``, ``approximate``, ``skipped`` or ``disabled``),
+    and the skipped and approximated stage names.
+    """
+    start, began = time.time(), time.perf_counter()
+    deadline, reserve = began + budget, budget * RESERVE
+    report = {}
+    keys = stage_keys(STAGES, digest) if digest is not None and CACHE is not None else None
+    if keys is not None:
+        out = CACHE.get(output_key(keys))
+        if out is not None:
+            report = {name: {'status': 'full', 'cached': True} for name in ('cycles', 'shells')}
+            report['gnn'] = {'status': 'full', 'cached': True} if pipeline.GNN_ENABLED else {'status': 'disabled'}
+            out = {**out, 'summary': {**out['summary'], 'processing_time_seconds': round(time.time() - start, 2)}}
+            return _label(out, None, report, budget, began), None
+
+    stages, computed = {s.name: s for s in STAGES}, []
+    if keys is not None:
+        stages = {n: _from_cache(s, keys[n], computed) if s.cached else s for n, s in stages.items()}
+    G = CACHE.get(keys['graph']) if keys is not None else None
+    inputs = {'graph': G, 'df': None} if G is not None else {'df': _ingest(path, filename)}
+    r = run_stages([stages[n] for n in CHEAP], inputs, concurrency)
+
+    todo = []
+    for name in ('cycles', 'shells'):
+        hit = CACHE.get(keys[name]) if keys is not None else None
+        if hit is not None:
+            r[name] = hit
+            report[name] = {'status': 'full', 'cached': True}
+        else:
+            todo.append(name)
+    G = r['graph']
+    cost = {'cycles': COST['cycles'], 'shells': 0.0 if _bc_memoized(G) else COST['betweenness']}
+    for name in sorted(todo, key=lambda n: -VALUE[n] / max(cost[n] * G.number_of_edges(), 1e-9)):
+        if name == 'cycles':
+            result = _expensive('cycles', 'cycles', _cycle_plan, r, deadline, reserve, report)
+        else:
+            result = _shells(r, deadline, reserve, report)
+        if result is not None:
+            r[name] = result
+            if report[name]['status'] == 'full' and keys is not None:
+                computed.append(name)
+    r.setdefault('cycles', {'accounts': {}, 'rings': []})
+
+    r = run_stages([stages['rings'], stages['scoring']], r, concurrency)
+    if pipeline._gnn_scorer() is None:
+        report['gnn'] = {'status': 'disabled'}
+        r['gnn'] = r['scoring']
+    else:
+        # On a copy: an abandoned GNN run must not rewrite the scores being returned
+        own = {**r, 'scoring': {k: {**v, 'detected_patterns': list(v['detected_patterns'])}
+                                for k, v in r['scoring'].items()}}
+        scored = _expensive('gnn', 'gnn', _gnn_plan, own, deadline, 0.0, report)
+        r['gnn'] = scored if scored is not None else r['scoring']
+    r = run_stages([stages['lifecycle']], r, concurrency)
+
+    with span('output', items=len(r['lifecycle'])):
+        out = build_output(r['lifecycle'], r['rings']['rings'], r['df'], time.time() - start,
+                           total_accounts=G.number_of_nodes())
+    if keys is not None:
+        for name in computed:
+            CACHE.put(keys[name], r[name])
+        if all(v['status'] in ('full', 'disabled') for v in report.values()):
+            CACHE.put(output_key(keys), out)
+    return _label(out, r, report, budget, began), r
+
+
+def _label(out, r, report, budget, began):
+    """``out`` with per-account ``score_status`` and the ``triage`` report."""
+    open_ = {n for n, v in report.items() if v['status'] in ('approximate', 'skipped')}
+    provisional = set()
+    if 'gnn' in open_:
+        provisional = None   # every score can still move
+    elif open_:
+        G = r['graph']
+        mask = np.zeros(G.number_of_nodes(), dtype=bool)
+        if 'cycles' in open_:
+            mask |= cycle_candidates(G)
+        if 'shells' in open_:
+            mask |= shell_candidates(r['features'])
+        provisional = set(G.accounts[mask].tolist())
+    accounts = [{**a, 'score_status': 'provisional' if provisional is None or a['account_id'] in provisional
+                 else 'final'} for a in out['suspicious_accounts']]
+    return {**out, 'suspicious_accounts': accounts, 'triage': {
+        'budget_seconds': budget,
+        'elapsed_seconds': round(time.perf_counter() - began, 3),
+        'complete': not open_,
+        'stages': report,
+        'skipped': sorted(n for n in open_ if report[n]['status'] == 'skipped'),
+        'approximated': sorted(n for n in open_ if report[n]['status'] == 'approximate'),
+    }}
@@ -0,0 +1,63 @@
+"""Shared, pre-forked process pool for the cycle and centrality engines and batch files."""
+import os, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+POOL_WORKERS = int(os.environ.get('ENGINE_POOL_WORKERS', os.cpu_count() or 1))
+
+_lock = threading.Lock()
+_shared = None   # (owner pid, executor); forked children see it but must not use it
+
+
+def _ready(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def worker_pool(workers=POOL_WORKERS):
+    """The shared pool, started on first use; it runs until ``shutdown()``."""
+    global _shared
+    with _lock:
+        if _shared is None or _shared[0] != os.getpid():
+            _shared = (os.getpid(), ProcessPoolExecutor(max_workers=workers))
+        return _shared[1]
+
+
+def prefork(workers=POOL_WORKERS):
+    """Start the shared pool and fork all its workers now; returns how many are running."""
+    pool = worker_pool(workers)
+    # The executor forks lazily, one worker per submit that finds none idle;
+    # tasks that overlap make it fork them all up front
+    return len(set(pool.map(_ready, [0.05] * workers)))
+
+
+def shared_pool():
+    """The pre-forked pool, or None if there is none in this process."""
+    shared = _shared
+    return shared[1] if shared is not None and shared[0] == os.getpid() else None
+
+
+@contextmanager
+def process_pool(workers):
+    """Executor for one parallel section: the shared pool when pre-forked, else a private one.
+
+    Callers cancel their own pending futures on exit; a private pool is
+    also shut down, the shared one keeps running.
+    """
+    pool = shared_pool()
+    if pool is not None:
+        yield pool
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield pool
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def shutdown():
+    global _shared
+    with _lock:
+        shared, _shared = _shared, None
+    if shared is not None and shared[0] == os.getpid():
+        shared[1].shutdown(cancel_futures=True)
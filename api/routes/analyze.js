@@ -10,9 +10,9 @@ const upload = multer({
     storage: multer.memoryStorage(),
     limits: { fileSize: 50 * 1024 * 1024 },
     fileFilter: (req, file, cb) => {
-        if (file.mimetype === 'text/csv' || file.originalname.endsWith('.csv'))
+        if (file.mimetype === 'text/csv' || /\.(csv|parquet|arrow|arrows|feather|ipc)$/.test(file.originalname))
             cb(null, true)
-        else cb(new Error('Only CSV files allowed'), false)
+        else cb(new Error('Only CSV, Parquet or Arrow files allowed'), false)
     }
 })
 
@@ -23,7 +23,7 @@ router.post('/analyze', upload.single('file'), async (req, res) => {
         const form = new FormData()
         form.append('file', req.file.buffer, {
             filename: req.file.originalname,
-            contentType: 'text/csv'
+            contentType: req.file.mimetype || 'application/octet-stream'
         })
 
         const pyRes = await axios.post(
@@ -43,14 +43,143 @@ router.post('/analyze', upload.single('file'), async (req, res) => {
             }
         })
 
-        res.json({ ...pyRes.data, analysis_id: analysis._id })
+        // analysis_id stays the stored record's id; the engine's own id is passed on beside it
+        res.json({ ...pyRes.data, analysis_id: analysis._id, engine_analysis_id: pyRes.data.analysis_id })
 
     } catch (err) {
         console.error('Analysis error:', err.message)
+        // Pass row-level validation errors from the engine straight through
+        if (err.response?.status === 422)
+            return res.status(422).json(err.response.data)
         res.status(500).json({ error: 'Analysis failed', message: err.message })
     }
 })
 
+// ── Async jobs: large files are queued in the engine instead of one long POST ──
+// engine job id → { recordId, at }. Only needed while the engine still keeps the job
+// (JOB_TTL_SECONDS), and capped so a burst of jobs cannot grow it without bound
+const jobAnalyses = new Map()
+const JOB_TTL_MS = Number(process.env.JOB_TTL_SECONDS || 3600) * 1000
+const JOB_RECORDS_MAX = 1000
+
+function rememberJob(jobId, recordId) {
+    jobAnalyses.set(jobId, { recordId, at: Date.now() })
+    // Insertion order is age order: drop from the front until fresh and under the cap
+    const cutoff = Date.now() - JOB_TTL_MS
+    for (const [id, entry] of jobAnalyses) {
+        if (entry.at >= cutoff && jobAnalyses.size <= JOB_RECORDS_MAX) break
+        jobAnalyses.delete(id)
+    }
+}
+
+router.post('/jobs', upload.single('file'), async (req, res) => {
+    try {
+        const form = new FormData()
+        form.append('file', req.file.buffer, {
+            filename: req.file.originalname,
+            contentType: req.file.mimetype || 'application/octet-stream'
+        })
+        const pyRes = await axios.post(`${process.env.PYTHON_SERVICE_URL}/jobs`, form, { headers: form.getHeaders() })
+        res.status(202).json(pyRes.data)
+    } catch (err) {
+        console.error('Job submit error:', err.message)
+        if (err.response) return res.status(err.response.status).json(err.response.data)
+        res.status(500).json({ error: 'Job submit failed', message: err.message })
+    }
+})
+
+router.get('/jobs/:id', async (req, res) => {
+    try {
+        const pyRes = await axios.get(`${process.env.PYTHON_SERVICE_URL}/jobs/${req.params.id}`)
+        res.json(pyRes.data)
+    } catch (err) {
+        if (err.response) return res.status(err.response.status).json(err.response.data)
+        res.status(500).json({ error: 'Job status failed', message: err.message })
+    }
+})
+
+router.get('/jobs/:id/events', async (req, res) => {
+    try {
+        const pyRes = await axios.get(`${process.env.PYTHON_SERVICE_URL}/jobs/${req.params.id}/events`,
+            { responseType: 'stream' })
+        res.setHeader('Content-Type', 'application/x-ndjson')
+        pyRes.data.pipe(res)
+        req.on('close', () => pyRes.data.destroy())
+    } catch (err) {
+        if (err.response) return res.status(err.response.status).end()
+        res.status(500).json({ error: 'Job stream failed', message: err.message })
+    }
+})
+
+router.get('/jobs/:id/result', async (req, res) => {
+    try {
+        const pyRes = await axios.get(`${process.env.PYTHON_SERVICE_URL}/jobs/${req.params.id}/result`,
+            { validateStatus: s => s < 500 })
+        if (pyRes.status !== 200) {
+            if (pyRes.status === 404) jobAnalyses.delete(req.params.id)   // expired in the engine
+            return res.status(pyRes.status).json(pyRes.data)
+        }
+
+        // Store each finished job once, like a synchronous /analyze
+        let recordId = jobAnalyses.get(req.params.id)?.recordId
+        if (!recordId) {
+            const status = await axios.get(`${process.env.PYTHON_SERVICE_URL}/jobs/${req.params.id}`)
+            const analysis = await Analysis.create({
+                filename: status.data.filename,
+                result: pyRes.data,
+                summary: {
+                    total_accounts: pyRes.data.summary.total_accounts_analyzed,
+                    suspicious_flagged: pyRes.data.summary.suspicious_accounts_flagged,
+                    rings_detected: pyRes.data.summary.fraud_rings_detected,
+                    processing_seconds: pyRes.data.summary.processing_time_seconds
+                }
+            })
+            recordId = analysis._id
+            rememberJob(req.params.id, recordId)
+        }
+        res.json({ ...pyRes.data, analysis_id: recordId, engine_analysis_id: pyRes.data.analysis_id })
+    } catch (err) {
+        console.error('Job result error:', err.message)
+        if (err.response) return res.status(err.response.status).json(err.response.data)
+        res.status(500).json({ error: 'Job result failed', message: err.message })
+    }
+})
+
+router.delete('/jobs/:id', async (req, res) => {
+    try {
+        const pyRes = await axios.delete(`${process.env.PYTHON_SERVICE_URL}/jobs/${req.params.id}`)
+        jobAnalyses.delete(req.params.id)
+        res.json(pyRes.data)
+    } catch (err) {
+        if (err.response) return res.status(err.response.status).json(err.response.data)
+        res.status(500).json({ error: 'Job cancel failed', message: err.message })
+    }
+})
+
+// ── Engine analyses: pages and subgraphs by engine_analysis_id (not the Mongo analysis_id) ──
+const ANALYSIS_PATHS = ['/analyses/:id/accounts', '/analyses/:id/rings',
+    '/analyses/:id/accounts/:account/subgraph', '/analyses/:id/rings/:ring/subgraph']
+
+router.get(ANALYSIS_PATHS, async (req, res) => {
+    try {
+        // Stream the body through: pages may be NDJSON, Arrow or Parquet
+        const pyRes = await axios.get(`${process.env.PYTHON_SERVICE_URL}${req.path}`, {
+            params: req.query,
+            headers: req.headers.accept ? { Accept: req.headers.accept } : {},
+            responseType: 'stream',
+            validateStatus: () => true
+        })
+        res.status(pyRes.status)
+        for (const h of ['content-type', 'x-analysis-id', 'x-total-count', 'x-row-count', 'x-next-cursor'])
+            if (pyRes.headers[h]) res.setHeader(h, pyRes.headers[h])
+        pyRes.data.pipe(res)
+        req.on('close', () => pyRes.data.destroy())
+    } catch (err) {
+        console.error('Analysis proxy error:', err.message)
+        res.status(500).json({ error: 'Analysis request failed', message: err.message })
+    }
+})
+
 router.get('/history', async (req, res) => {
     try {
         const history = await Analysis.find({})
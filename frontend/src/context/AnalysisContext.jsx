@@ -7,12 +7,14 @@ export function AnalysisProvider({ children }) {
     const [rawTxns, setRawTxns] = useState([])
     const [selectedNode, setSelectedNode] = useState(null)
     const [analysisId, setAnalysisId] = useState(null)
+    const [engineAnalysisId, setEngineAnalysisId] = useState(null)
 
     const loadAnalysis = (data, txns) => {
         setResult(data)
         setRawTxns(txns || [])
         setSelectedNode(null)
         setAnalysisId(data?.analysis_id || null)
+        setEngineAnalysisId(data?.engine_analysis_id || null)
     }
 
     const clearAnalysis = () => {
@@ -20,11 +22,12 @@ export function AnalysisProvider({ children }) {
         setRawTxns([])
         setSelectedNode(null)
         setAnalysisId(null)
+        setEngineAnalysisId(null)
     }
 
     return (
         <AnalysisContext.Provider value={{
-            result, rawTxns, selectedNode, analysisId,
+            result, rawTxns, selectedNode, analysisId, engineAnalysisId,
             setSelectedNode, loadAnalysis, clearAnalysis,
         }}>
             {children}
@@ -0,0 +1,175 @@
+# test-data/benchmark.py — run: python benchmark.py --sizes 10k,100k,1m --update   (then --check)
+"""Scaling benchmark and local regression check for the analysis engine.
+
+For each size, a seeded synthetic dataset (synthetic.py, cached on disk)
+is analyzed in a fresh process so peak memory is that run's alone. Every
+stage's wall time comes from the engine's profiling spans, and the flagged
+accounts are scored against the planted ground truth. ``--update`` saves
+the results as the baseline and ``--check`` exits 1 on any regression
+beyond the tolerances below. Baselines are per machine.
+"""
+import argparse, json, multiprocessing, os, platform, sys, time
+
+from synthetic import generate, write, parse_size
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENGINE = os.path.join(HERE, '..', 'analysis-engine')
+DATA_DIR = os.path.join(HERE, 'synthetic')
+BASELINE = os.path.join(HERE, 'baselines', 'benchmark.json')
+
+THRESHOLDS = (0, 50)        # suspicion scores at which precision/recall are reported
+TRAP_LABELS = ('merchant', 'payroll', 'corporate', 'customer', 'employee')
+TIME_TOLERANCE = 0.5        # a time regresses when >50% slower than baseline ...
+TIME_SLACK = 0.5            # ... and more than this many seconds slower
+MEMORY_TOLERANCE = 0.25     # peak RSS: >25% and ...
+MEMORY_SLACK_MB = 64        # ... more than this many MB above baseline
+QUALITY_TOLERANCE = 0.02    # precision/recall may drop by at most this much
+
+
+def dataset(rows, seed, density, days, directory=DATA_DIR):
+    """Path of the synthetic dataset for these parameters, generated on first use."""
+    ext = 'parquet'
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        ext = 'csv'
+    path = os.path.join(directory, f'synth_{rows}_s{seed}_d{density:g}_t{days:g}.{ext}')
+    if not os.path.exists(path + '.truth.json'):
+        os.makedirs(directory, exist_ok=True)
+        t = time.perf_counter()
+        write(*generate(rows, seed, density, days), path)
+        print(f'  generated {path} in {time.perf_counter() - t:.1f}s')
+    return path
+
+
+def score(out, truth):
+    """Precision/recall per score threshold, planted-ring recall and trap false positives."""
+    labels = truth['labels']
+    positive = set().union(*(labels.get(l, []) for l in truth['positive_labels']))
+    traps = set().union(*(labels.get(l, []) for l in TRAP_LABELS))
+    quality = {}
+    for t in THRESHOLDS:
+        flagged = {a['account_id'] for a in out['suspicious_accounts'] if a['suspicion_score'] >= t}
+        tp = len(flagged & positive)
+        quality[f'score>={t}'] = {
+            'flagged': len(flagged),
+            'precision': round(tp / len(flagged), 4) if flagged else 1.0,
+            'recall': round(tp / len(positive), 4) if positive else 1.0,
+            'trap_false_positives': len(flagged & traps),
+        }
+    planted = {}
+    for acc in labels.get('cycle', []):
+        planted.setdefault(acc.rsplit('_M', 1)[0], set()).add(acc)
+    found = {frozenset(r['member_accounts']) for r in out['fraud_rings']}
+    quality['ring_recall'] = round(sum(frozenset(m) in found for m in planted.values()) / len(planted), 4) \
+        if planted else 1.0
+    return quality
+
+
+def run_one(path, concurrency):
+    """Analyze ``path`` in this (fresh) process; returns timings, peak RSS and quality."""
+    os.environ['RESULT_CACHE'] = '0'
+    sys.path.insert(0, ENGINE)
+    from pipeline import analyze_file
+    from profiling import profiled, peak_rss
+
+    t = time.perf_counter()
+    with profiled() as prof:
+        out, _ = analyze_file(path, os.path.basename(path), concurrency=concurrency)
+    seconds = time.perf_counter() - t
+    with open(path + '.truth.json') as f:
+        truth = json.load(f)
+    return {
+        'transactions': truth['params']['rows'],
+        'accounts': out['summary']['total_accounts_analyzed'],
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': round(peak_rss() / 2**20, 1),
+        'spans': {name: s['wall_seconds'] for name, s in sorted(prof.to_dict()['spans'].items())},
+        'quality': score(out, truth),
+    }
+
+
+def compare(run, base):
+    """Regression messages for one size (empty when within tolerance)."""
+    problems = []
+
+    def slower(name, cur, old):
+        if cur > old * (1 + TIME_TOLERANCE) and cur - old > TIME_SLACK:
+            problems.append(f'{name}: {old:.2f}s → {cur:.2f}s')
+
+    slower('total', run['seconds'], base['seconds'])
+    for name, old in base['spans'].items():
+        if name in run['spans']:
+            slower(name, run['spans'][name], old)
+    if run['peak_rss_mb'] > base['peak_rss_mb'] * (1 + MEMORY_TOLERANCE) and \
+            run['peak_rss_mb'] - base['peak_rss_mb'] > MEMORY_SLACK_MB:
+        problems.append(f'peak RSS: {base["peak_rss_mb"]:.0f}MB → {run["peak_rss_mb"]:.0f}MB')
+    for key, old in base['quality'].items():
+        cur = run['quality'].get(key)
+        if cur is None:
+            continue
+        if key == 'ring_recall':
+            old, cur = {'recall': old}, {'recall': cur}
+        for metric in ('precision', 'recall'):
+            if metric in old and cur[metric] < old[metric] - QUALITY_TOLERANCE:
+                problems.append(f'{key} {metric}: {old[metric]:.3f} → {cur[metric]:.3f}')
+        if old.get('trap_false_positives') is not None and cur['trap_false_positives'] > old['trap_false_positives']:
+            problems.append(f'{key} trap false positives: {old["trap_false_positives"]} → {cur["trap_false_positives"]}')
+    return problems
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--sizes', default='10k,100k', help='comma-separated, e.g. 10k,100k,1m,10m')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--density', type=float, default=5.0)
+    ap.add_argument('--days', type=float, default=30)
+    ap.add_argument('--concurrency', type=int, default=4)
+    ap.add_argument('--baseline', default=BASELINE)
+    ap.add_argument('--out', help='also write this run\'s results here')
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument('--update', action='store_true', help='save results as the baseline')
+    mode.add_argument('--check', action='store_true', help='exit 1 on regressions against the baseline')
+    args = ap.parse_args()
+
+    results = {'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                           'cpus': os.cpu_count()},
+               'params': {'seed': args.seed, 'density': args.density, 'days': args.days,
+                          'concurrency': args.concurrency},
+               'runs': {}}
+    ctx = multiprocessing.get_context('spawn')
+    for size in args.sizes.split(','):
+        print(f'{size}:')
+        path = dataset(parse_size(size), args.seed, args.density, args.days)
+        with ctx.Pool(1) as pool:
+            run = results['runs'][size] = pool.apply(run_one, (path, args.concurrency))
+        q = run['quality']
+        print(f'  {run["seconds"]:.2f}s, peak {run["peak_rss_mb"]:.0f}MB, ' + ', '.join(
+            f'{k}: P {v["precision"]:.3f} R {v["recall"]:.3f}' for k, v in q.items() if k != 'ring_recall')
+            + f', ring recall {q["ring_recall"]:.3f}')
+        slowest = sorted(run['spans'].items(), key=lambda kv: -kv[1])[:4]
+        print('  slowest: ' + ', '.join(f'{k} {v:.2f}s' for k, v in slowest))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.update:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f'Baseline saved to {args.baseline}')
+    elif args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['params'] != results['params']:
+            sys.exit(f'Baseline was recorded with {baseline["params"]}, not {results["params"]}')
+        failed = False
+        for size, run in results['runs'].items():
+            if size not in baseline['runs']:
+                print(f'{size}: no baseline')
+                continue
+            for problem in compare(run, baseline['runs'][size]):
+                print(f'REGRESSION {size} {problem}')
+                failed = True
+        print('Benchmark regressed' if failed else 'No regressions')
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,184 @@
+# test-data/synthetic.py — run: python synthetic.py --rows 1000000 --out synth_1m.parquet
+"""Seeded, scalable version of generate.py's test data.
+
+Plants the same patterns as the fixed test files (cycles, fan-in smurfing
+with cash-outs, shell chains, merchant and payroll traps, random noise) at
+any size from 10k to 10M+ rows, in proportion to ``rows``. Every
+non-noise account is labelled; ``POSITIVE`` labels are what the engine
+should flag. The same arguments always give the same file.
+"""
+import argparse, json
+import numpy as np
+import pandas as pd
+
+BASE = np.datetime64('2024-01-01T00:00:00', 'ns')
+HOUR_NS = 3_600_000_000_000
+
+# Share of rows per planted pattern; noise fills the rest
+FRAUD_SHARE = 0.01
+MERCHANT_SHARE = 0.15
+PAYROLL_SHARE = 0.06
+FRAUD_MIX = {'cycle': 0.25, 'smurfing': 0.6, 'shell': 0.15}
+POSITIVE = ('cycle', 'smurf_aggregator', 'smurf_source', 'shell')
+
+
+class _Builder:
+    """Accumulates accounts (with labels) and transaction columns as integer codes."""
+
+    def __init__(self):
+        self.names, self.labels = [], {}
+        self.src, self.dst, self.amount, self.hours = [], [], [], []
+
+    def accounts(self, names, label=None):
+        start = len(self.names)
+        self.names.extend(names)
+        if label:
+            self.labels.setdefault(label, []).extend(names)
+        return np.arange(start, start + len(names))
+
+    def add(self, src, dst, amount, hours):
+        self.src.append(np.asarray(src)); self.dst.append(np.asarray(dst))
+        self.amount.append(np.asarray(amount, dtype=np.float64)); self.hours.append(np.asarray(hours, dtype=np.float64))
+
+    @property
+    def rows(self):
+        return sum(len(a) for a in self.src)
+
+
+def _cycles(b, rng, budget, hours):
+    r = 0
+    while budget > 0:
+        size = int(rng.choice([3, 4, 5]))
+        nodes = b.accounts([f'RING{r}_M{i}' for i in range(size)], 'cycle')
+        start = rng.uniform(0, hours - 3 * size)
+        b.add(nodes, np.roll(nodes, -1), np.round(rng.uniform(30000, 100000) * 0.95 ** np.arange(size), 2),
+              start + 3 * np.arange(size))
+        budget -= size; r += 1
+
+
+def _smurfing(b, rng, budget, hours):
+    g = 0
+    while budget > 0:
+        n_src = int(rng.integers(12, 16))
+        agg = b.accounts([f'AGG_{g:05d}'], 'smurf_aggregator')
+        srcs = b.accounts([f'SMURF_SRC_{g}_{s:02d}' for s in range(n_src)], 'smurf_source')
+        outs = b.accounts([f'CASH_OUT_{g}_{o}' for o in range(3)], 'cash_out')
+        start = rng.uniform(0, hours - 60)
+        b.add(srcs, np.repeat(agg, n_src), np.round(rng.uniform(9000, 9999, n_src), 2),
+              start + rng.uniform(0, 48, n_src))
+        b.add(np.repeat(agg, 3), outs, np.round(rng.uniform(30000, 50000, 3), 2), start + rng.uniform(50, 60, 3))
+        budget -= n_src + 3; g += 1
+
+
+def _shells(b, rng, budget, hours):
+    c = 0
+    while budget > 0:
+        hops = int(rng.choice([3, 4, 5]))
+        origin = b.accounts([f'CHAIN{c}_H0'], 'shell_endpoint')
+        shells = b.accounts([f'CHAIN{c}_H{h}' for h in range(1, hops - 1)], 'shell')
+        cashout = b.accounts([f'CHAIN{c}_H{hops - 1}'], 'shell_endpoint')
+        nodes = np.concatenate((origin, shells, cashout))
+        start = rng.uniform(0, hours - 2 * hops)
+        b.add(nodes[:-1], nodes[1:], np.round(rng.uniform(200000, 500000) * 0.98 ** np.arange(1, hops), 2),
+              start + 2 * np.arange(hops - 1))
+        budget -= hops - 1; c += 1
+
+
+def _merchants(b, rng, budget, hours):
+    m = 0
+    while budget > 0:
+        n = int(min(budget, rng.integers(300, 501)))
+        merchant = b.accounts([f'LEGIT_MERCHANT_{m:05d}'], 'merchant')
+        custs = b.accounts([f'CUST_{m}_{c:04d}' for c in range(n)], 'customer')
+        b.add(custs, np.repeat(merchant, n), np.round(rng.uniform(100, 5000, n), 2), rng.uniform(0, hours, n))
+        budget -= n; m += 1
+
+
+def _payroll(b, rng, budget, hours):
+    p = 0
+    while budget > 0:
+        n = int(min(budget, rng.integers(200, 301)))
+        bank = b.accounts([f'CORP_BANK_{p}'], 'corporate')
+        corp = b.accounts([f'LEGIT_PAYROLL_{p:05d}'], 'payroll')
+        emps = b.accounts([f'EMP_{p}_{e:04d}' for e in range(n)], 'employee')
+        start = rng.uniform(0, hours - 49)
+        b.add(bank, corp, [5000000.0], [start])
+        b.add(np.repeat(corp, n), emps, np.full(n, 25000.0), start + rng.uniform(1, 48, n))
+        budget -= n + 1; p += 1
+
+
+def generate(rows=10_000, seed=0, density=5.0, days=30, fraud_share=FRAUD_SHARE,
+             merchant_share=MERCHANT_SHARE, payroll_share=PAYROLL_SHARE):
+    """Return (transactions DataFrame, ground truth dict) for about ``rows`` transactions.
+
+    ``density`` is the mean number of transactions per noise account and
+    ``days`` the time span. Ground truth lists every labelled account by
+    label; unlisted accounts are noise.
+    """
+    rng = np.random.default_rng(seed)
+    hours = days * 24.0
+    b = _Builder()
+    fraud = rows * fraud_share
+    _cycles(b, rng, fraud * FRAUD_MIX['cycle'], hours)
+    _smurfing(b, rng, fraud * FRAUD_MIX['smurfing'], hours)
+    _shells(b, rng, fraud * FRAUD_MIX['shell'], hours)
+    _merchants(b, rng, rows * merchant_share, hours)
+    _payroll(b, rng, rows * payroll_share, hours)
+
+    noise_rows = max(0, rows - b.rows)
+    n_noise = max(2, int(noise_rows * 2 / density))   # each transaction touches two accounts
+    noise = b.accounts([f'RAND_{i:07d}' for i in range(n_noise)])
+    src = rng.integers(0, n_noise, noise_rows)
+    dst = (src + rng.integers(1, n_noise, noise_rows)) % n_noise   # never a self-transfer
+    b.add(noise[src], noise[dst], np.round(rng.uniform(50, 20000, noise_rows), 2), rng.uniform(0, hours, noise_rows))
+
+    order = rng.permutation(b.rows)
+    names = np.asarray(b.names, dtype=object)
+    src, dst = np.concatenate(b.src)[order], np.concatenate(b.dst)[order]
+    df = pd.DataFrame({
+        'transaction_id': [f'TX_{i:08d}' for i in range(len(order))],
+        'sender_id': pd.Categorical.from_codes(src, categories=names),
+        'receiver_id': pd.Categorical.from_codes(dst, categories=names),
+        'amount': np.concatenate(b.amount)[order],
+        'timestamp': BASE + (np.concatenate(b.hours)[order] * HOUR_NS).astype('timedelta64[ns]'),
+    })
+    for col in ('sender_id', 'receiver_id'):
+        df[col] = df[col].cat.remove_unused_categories()
+    truth = {'params': {'rows': rows, 'seed': seed, 'density': density, 'days': days,
+                        'fraud_share': fraud_share, 'merchant_share': merchant_share,
+                        'payroll_share': payroll_share},
+             'positive_labels': list(POSITIVE),
+             'labels': b.labels}
+    return df, truth
+
+
+def write(df, truth, path):
+    """Write transactions (Parquet when the suffix says so, else CSV) and ``<path>.truth.json``."""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.assign(timestamp=df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')).to_csv(path, index=False)
+    with open(path + '.truth.json', 'w') as f:
+        json.dump(truth, f)
+
+
+def parse_size(text):
+    """'10k' → 10000, '2.5m' → 2500000."""
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--rows', default='10k', help='e.g. 10k, 1m, 10m')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--density', type=float, default=5.0, help='mean transactions per noise account')
+    ap.add_argument('--days', type=float, default=30)
+    ap.add_argument('--out', help='.csv or .parquet (default synth_<rows>.csv)')
+    args = ap.parse_args()
+    rows = parse_size(args.rows)
+    df, truth = generate(rows, args.seed, args.density, args.days)
+    out = args.out or f'synth_{args.rows}.csv'
+    write(df, truth, out)
+    print(f'{len(df)} transactions, {sum(map(len, truth["labels"].values()))} labelled accounts → {out}')